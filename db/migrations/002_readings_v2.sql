@@ -0,0 +1,18 @@
+BEGIN TRANSACTION;
+-- Clustered layout: rows are stored in (device_id, ts_ms) order inside the
+-- primary-key B-tree, so range scans need a single lookup and no extra index.
+CREATE TABLE IF NOT EXISTS readings_v2 (
+    device_id TEXT NOT NULL,
+    ts_ms INTEGER NOT NULL,
+    temp_c REAL NOT NULL,
+    humidity REAL NOT NULL,
+    rssi INTEGER,
+    PRIMARY KEY (device_id, ts_ms)
+) WITHOUT ROWID;
+
+-- Progress of long-running data migrations (see scripts/migrate_readings_v2.py).
+CREATE TABLE IF NOT EXISTS migration_state (
+    name TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+COMMIT;
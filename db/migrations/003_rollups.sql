@@ -0,0 +1,99 @@
+BEGIN TRANSACTION;
+-- Per-device aggregates of readings_v2, maintained at insert time by the
+-- readings_v2_rollup trigger. Rows stay after raw readings are archived.
+CREATE TABLE IF NOT EXISTS readings_1m (
+    device_id TEXT NOT NULL,
+    bucket_ms INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    temp_sum REAL NOT NULL,
+    temp_min REAL NOT NULL,
+    temp_max REAL NOT NULL,
+    temp_last REAL NOT NULL,
+    humidity_sum REAL NOT NULL,
+    humidity_min REAL NOT NULL,
+    humidity_max REAL NOT NULL,
+    humidity_last REAL NOT NULL,
+    last_ts_ms INTEGER NOT NULL,
+    PRIMARY KEY (device_id, bucket_ms)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS readings_1h (
+    device_id TEXT NOT NULL,
+    bucket_ms INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    temp_sum REAL NOT NULL,
+    temp_min REAL NOT NULL,
+    temp_max REAL NOT NULL,
+    temp_last REAL NOT NULL,
+    humidity_sum REAL NOT NULL,
+    humidity_min REAL NOT NULL,
+    humidity_max REAL NOT NULL,
+    humidity_last REAL NOT NULL,
+    last_ts_ms INTEGER NOT NULL,
+    PRIMARY KEY (device_id, bucket_ms)
+) WITHOUT ROWID;
+
+-- Backfill from rows already in readings_v2 (no-op on a fresh database).
+INSERT OR REPLACE INTO readings_1m
+WITH ranked AS (
+    SELECT device_id, ts_ms - ts_ms % 60000 AS bucket_ms, ts_ms, temp_c, humidity,
+           row_number() OVER (PARTITION BY device_id, ts_ms - ts_ms % 60000 ORDER BY ts_ms DESC) AS rn
+    FROM readings_v2
+)
+SELECT device_id, bucket_ms, COUNT(*), SUM(temp_c), MIN(temp_c), MAX(temp_c),
+       MAX(CASE WHEN rn = 1 THEN temp_c END),
+       SUM(humidity), MIN(humidity), MAX(humidity),
+       MAX(CASE WHEN rn = 1 THEN humidity END),
+       MAX(ts_ms)
+FROM ranked
+GROUP BY device_id, bucket_ms;
+
+INSERT OR REPLACE INTO readings_1h
+WITH ranked AS (
+    SELECT device_id, bucket_ms - bucket_ms % 3600000 AS hour_ms, readings_1m.*,
+           row_number() OVER (PARTITION BY device_id, bucket_ms - bucket_ms % 3600000 ORDER BY last_ts_ms DESC) AS rn
+    FROM readings_1m
+)
+SELECT device_id, hour_ms, SUM(count), SUM(temp_sum), MIN(temp_min), MAX(temp_max),
+       MAX(CASE WHEN rn = 1 THEN temp_last END),
+       SUM(humidity_sum), MIN(humidity_min), MAX(humidity_max),
+       MAX(CASE WHEN rn = 1 THEN humidity_last END),
+       MAX(last_ts_ms)
+FROM ranked
+GROUP BY device_id, hour_ms;
+
+CREATE TRIGGER IF NOT EXISTS readings_v2_rollup AFTER INSERT ON readings_v2
+BEGIN
+    INSERT INTO readings_1m
+    VALUES (NEW.device_id, NEW.ts_ms - NEW.ts_ms % 60000, 1,
+            NEW.temp_c, NEW.temp_c, NEW.temp_c, NEW.temp_c,
+            NEW.humidity, NEW.humidity, NEW.humidity, NEW.humidity, NEW.ts_ms)
+    ON CONFLICT(device_id, bucket_ms) DO UPDATE SET
+        count = count + 1,
+        temp_sum = temp_sum + excluded.temp_sum,
+        temp_min = min(temp_min, excluded.temp_min),
+        temp_max = max(temp_max, excluded.temp_max),
+        temp_last = CASE WHEN excluded.last_ts_ms >= last_ts_ms THEN excluded.temp_last ELSE temp_last END,
+        humidity_sum = humidity_sum + excluded.humidity_sum,
+        humidity_min = min(humidity_min, excluded.humidity_min),
+        humidity_max = max(humidity_max, excluded.humidity_max),
+        humidity_last = CASE WHEN excluded.last_ts_ms >= last_ts_ms THEN excluded.humidity_last ELSE humidity_last END,
+        last_ts_ms = max(last_ts_ms, excluded.last_ts_ms);
+
+    INSERT INTO readings_1h
+    VALUES (NEW.device_id, NEW.ts_ms - NEW.ts_ms % 3600000, 1,
+            NEW.temp_c, NEW.temp_c, NEW.temp_c, NEW.temp_c,
+            NEW.humidity, NEW.humidity, NEW.humidity, NEW.humidity, NEW.ts_ms)
+    ON CONFLICT(device_id, bucket_ms) DO UPDATE SET
+        count = count + 1,
+        temp_sum = temp_sum + excluded.temp_sum,
+        temp_min = min(temp_min, excluded.temp_min),
+        temp_max = max(temp_max, excluded.temp_max),
+        temp_last = CASE WHEN excluded.last_ts_ms >= last_ts_ms THEN excluded.temp_last ELSE temp_last END,
+        humidity_sum = humidity_sum + excluded.humidity_sum,
+        humidity_min = min(humidity_min, excluded.humidity_min),
+        humidity_max = max(humidity_max, excluded.humidity_max),
+        humidity_last = CASE WHEN excluded.last_ts_ms >= last_ts_ms THEN excluded.humidity_last ELSE humidity_last END,
+        last_ts_ms = max(last_ts_ms, excluded.last_ts_ms);
+END;
+COMMIT;
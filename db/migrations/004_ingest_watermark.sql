@@ -0,0 +1,26 @@
+BEGIN TRANSACTION;
+-- Per-device ingest watermark used to invalidate cached history responses.
+-- `version` changes on every stored reading, `max_ts_ms` is the newest
+-- timestamp seen, and `late_version` only changes when a reading lands
+-- behind `max_ts_ms` (out of order), i.e. inside time that may already be
+-- cached as closed.
+CREATE TABLE IF NOT EXISTS ingest_watermark (
+    device_id TEXT PRIMARY KEY,
+    version INTEGER NOT NULL,
+    max_ts_ms INTEGER NOT NULL,
+    late_version INTEGER NOT NULL DEFAULT 0
+) WITHOUT ROWID;
+
+INSERT OR IGNORE INTO ingest_watermark(device_id, version, max_ts_ms, late_version)
+SELECT device_id, 1, MAX(ts_ms), 0 FROM readings_v2 GROUP BY device_id;
+
+CREATE TRIGGER IF NOT EXISTS readings_v2_watermark AFTER INSERT ON readings_v2
+BEGIN
+    INSERT INTO ingest_watermark(device_id, version, max_ts_ms, late_version)
+    VALUES (NEW.device_id, 1, NEW.ts_ms, 0)
+    ON CONFLICT(device_id) DO UPDATE SET
+        version = version + 1,
+        late_version = late_version + (excluded.max_ts_ms < max_ts_ms),
+        max_ts_ms = max(max_ts_ms, excluded.max_ts_ms);
+END;
+COMMIT;
@@ -0,0 +1,9 @@
+BEGIN TRANSACTION;
+-- Per-device boundary of the archive written by the retention job
+-- (app/archive.py). Readings before archived_until_ms may live in
+-- compressed per-day segment files instead of readings_v2.
+CREATE TABLE IF NOT EXISTS archive_state (
+    device_id TEXT PRIMARY KEY,
+    archived_until_ms INTEGER NOT NULL
+) WITHOUT ROWID;
+COMMIT;
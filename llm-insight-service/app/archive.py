@@ -0,0 +1,315 @@
+import argparse
+import logging
+import os
+import sqlite3
+import struct
+import sys
+import threading
+import time
+import zlib
+from array import array
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from urllib.parse import quote
+
+from .storage import LAYOUT_V2, connect, detect_layout
+
+logger = logging.getLogger(__name__)
+
+DAY_MS = 86_400_000
+
+# Segment layout: header "SSA1" | uint32 row count, then four columns, each as
+# uint32 compressed length + zlib(little-endian array):
+#   ts_ms     int64, delta-encoded (first value absolute)
+#   temp_c    float64
+#   humidity  float64
+#   rssi      int32, RSSI_MISSING for NULL
+SEGMENT_MAGIC = b"SSA1"
+SEGMENT_SUFFIX = ".seg"
+_HEADER = struct.Struct("<4sI")
+_LENGTH = struct.Struct("<I")
+RSSI_MISSING = -(2**31)
+
+Row = Tuple[int, float, float, Optional[int]]
+
+
+def _column_bytes(column: array) -> bytes:
+    if sys.byteorder == "big":
+        column = array(column.typecode, column)
+        column.byteswap()
+    return zlib.compress(column.tobytes(), 6)
+
+
+def _column_from(typecode: str, payload: bytes) -> array:
+    column = array(typecode)
+    column.frombytes(zlib.decompress(payload))
+    if sys.byteorder == "big":
+        column.byteswap()
+    return column
+
+
+def encode_segment(rows: Sequence[Row]) -> bytes:
+    """Encode ``(ts_ms, temp_c, humidity, rssi)`` rows sorted by ``ts_ms``."""
+    deltas = array("q")
+    previous = 0
+    for ts_ms, _, _, _ in rows:
+        deltas.append(ts_ms - previous)
+        previous = ts_ms
+    columns = (
+        deltas,
+        array("d", (row[1] for row in rows)),
+        array("d", (row[2] for row in rows)),
+        array("i", (RSSI_MISSING if row[3] is None else row[3] for row in rows)),
+    )
+    parts = [_HEADER.pack(SEGMENT_MAGIC, len(rows))]
+    for column in columns:
+        payload = _column_bytes(column)
+        parts.append(_LENGTH.pack(len(payload)))
+        parts.append(payload)
+    return b"".join(parts)
+
+
+def decode_segment(data: bytes) -> List[Row]:
+    magic, count = _HEADER.unpack_from(data, 0)
+    if magic != SEGMENT_MAGIC:
+        raise ValueError("Not an archive segment")
+    offset = _HEADER.size
+    columns = []
+    for typecode in ("q", "d", "d", "i"):
+        (length,) = _LENGTH.unpack_from(data, offset)
+        offset += _LENGTH.size
+        columns.append(_column_from(typecode, data[offset : offset + length]))
+        offset += length
+    deltas, temps, humidities, rssis = columns
+    if not all(len(column) == count for column in columns):
+        raise ValueError("Corrupt archive segment")
+    rows: List[Row] = []
+    ts_ms = 0
+    for index in range(count):
+        ts_ms += deltas[index]
+        rssi = rssis[index]
+        rows.append((ts_ms, temps[index], humidities[index], None if rssi == RSSI_MISSING else rssi))
+    return rows
+
+
+def day_start(ts_ms: int) -> int:
+    return ts_ms - ts_ms % DAY_MS
+
+
+def segment_path(archive_dir: str, device_id: str, day_ms: int) -> Path:
+    day = datetime.fromtimestamp(day_ms / 1000, tz=timezone.utc).strftime("%Y-%m-%d")
+    name = quote(device_id, safe="")
+    if not name.strip("."):
+        # quote() leaves "." alone, so "." / ".." would name the archive dir or its parent.
+        if not name:
+            raise ValueError("device_id must not be empty")
+        name = name.replace(".", "%2E")
+    return Path(archive_dir) / name / f"{day}{SEGMENT_SUFFIX}"
+
+
+def read_segment(path: Path) -> List[Row]:
+    try:
+        data = path.read_bytes()
+    except FileNotFoundError:
+        return []
+    return decode_segment(data)
+
+
+def write_segment(path: Path, rows: Sequence[Row]) -> None:
+    """Write atomically: a crash leaves either the old or the new segment."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp, "wb") as handle:
+        handle.write(encode_segment(rows))
+        handle.flush()
+        os.fsync(handle.fileno())
+    os.replace(tmp, path)
+
+
+def merge_rows(archived: Iterable[Row], hot: Iterable[Row]) -> Iterator[Row]:
+    """Merge two ts-sorted row streams; on equal ``ts_ms`` the hot row wins."""
+    archived_iter = iter(archived)
+    hot_iter = iter(hot)
+    a = next(archived_iter, None)
+    h = next(hot_iter, None)
+    while a is not None or h is not None:
+        if h is None or (a is not None and a[0] < h[0]):
+            yield a  # type: ignore[misc]
+            a = next(archived_iter, None)
+            continue
+        if a is not None and a[0] == h[0]:
+            a = next(archived_iter, None)
+        yield h
+        h = next(hot_iter, None)
+
+
+def archived_until(conn: sqlite3.Connection, device_id: str) -> Optional[int]:
+    """Epoch ms before which ``device_id`` readings may live in segments; None if never archived."""
+    try:
+        row = conn.execute("SELECT archived_until_ms FROM archive_state WHERE device_id = ?", (device_id,)).fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return row[0] if row else None
+
+
+class RetentionJob:
+    """Moves readings older than ``retention_days`` into per-device, per-day segments.
+
+    For each device and UTC day before the cutoff, the day's rows are merged
+    into its segment file (written atomically), ``archive_state`` is advanced
+    and only then are exactly those rows deleted from ``readings_v2`` in
+    transactions of ``chunk_size`` keys. Rows that arrive late for an archived
+    day stay in the hot table, remain visible to the history reader and are
+    folded into the segment on the next run.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        archive_dir: str,
+        retention_days: int,
+        chunk_size: int = 5000,
+        interval_seconds: float = 3600.0,
+    ) -> None:
+        self.db_path = db_path
+        self.archive_dir = archive_dir
+        self.retention_days = retention_days
+        self.chunk_size = max(1, chunk_size)
+        self.interval = interval_seconds
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.runs = 0
+        self.segments_written = 0
+        self.rows_archived = 0
+        self.rows_deleted = 0
+        self.failures = 0
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="retention", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as exc:
+                with self._lock:
+                    self.failures += 1
+                logger.error("retention_failed", extra={"error": str(exc)})
+            self._stop.wait(self.interval)
+
+    def run_once(self, now_ms: Optional[int] = None) -> Dict[str, int]:
+        if now_ms is None:
+            now_ms = round(time.time() * 1000)
+        cutoff = day_start(now_ms - self.retention_days * DAY_MS)
+        conn = connect(self.db_path)
+        try:
+            if detect_layout(conn) != LAYOUT_V2 or not self._has_state_table(conn):
+                logger.warning("retention_skipped", extra={"reason": "readings_v2 or archive_state missing"})
+                return {"days": 0, "rows": 0}
+            days = rows = 0
+            device = ""
+            while not self._stop.is_set():
+                (device,) = conn.execute("SELECT MIN(device_id) FROM readings_v2 WHERE device_id > ?", (device,)).fetchone()
+                if device is None:
+                    break
+                while not self._stop.is_set():
+                    (oldest,) = conn.execute(
+                        "SELECT MIN(ts_ms) FROM readings_v2 WHERE device_id = ? AND ts_ms < ?", (device, cutoff)
+                    ).fetchone()
+                    if oldest is None:
+                        break
+                    rows += self._archive_day(conn, device, day_start(oldest))
+                    days += 1
+        finally:
+            conn.close()
+        with self._lock:
+            self.runs += 1
+        logger.info("retention_done", extra={"cutoff": cutoff, "days": days, "rows": rows})
+        return {"days": days, "rows": rows}
+
+    @staticmethod
+    def _has_state_table(conn: sqlite3.Connection) -> bool:
+        return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'archive_state'").fetchone() is not None
+
+    def _archive_day(self, conn: sqlite3.Connection, device_id: str, day_ms: int) -> int:
+        hot: List[Row] = conn.execute(
+            "SELECT ts_ms, temp_c, humidity, rssi FROM readings_v2 "
+            "WHERE device_id = ? AND ts_ms >= ? AND ts_ms < ? ORDER BY ts_ms",
+            (device_id, day_ms, day_ms + DAY_MS),
+        ).fetchall()
+        path = segment_path(self.archive_dir, device_id, day_ms)
+        write_segment(path, list(merge_rows(read_segment(path), hot)))
+        conn.execute(
+            "INSERT INTO archive_state(device_id, archived_until_ms) VALUES (?, ?) "
+            "ON CONFLICT(device_id) DO UPDATE SET archived_until_ms = max(archived_until_ms, excluded.archived_until_ms)",
+            (device_id, day_ms + DAY_MS),
+        )
+        deleted = 0
+        for start in range(0, len(hot), self.chunk_size):
+            keys = [(device_id, row[0]) for row in hot[start : start + self.chunk_size]]
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany("DELETE FROM readings_v2 WHERE device_id = ? AND ts_ms = ?", keys)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            deleted += len(keys)
+        with self._lock:
+            self.segments_written += 1
+            self.rows_archived += len(hot)
+            self.rows_deleted += deleted
+        return len(hot)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "retention_days": self.retention_days,
+                "runs": self.runs,
+                "segments_written": self.segments_written,
+                "rows_archived": self.rows_archived,
+                "rows_deleted": self.rows_deleted,
+                "failures": self.failures,
+            }
+
+
+__all__ = [
+    "DAY_MS",
+    "RetentionJob",
+    "archived_until",
+    "day_start",
+    "decode_segment",
+    "encode_segment",
+    "merge_rows",
+    "read_segment",
+    "segment_path",
+    "write_segment",
+]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Arsipkan readings lama ke segmen kolom terkompresi.")
+    parser.add_argument("--db", default="/data/siapsuhu.db", help="Lokasi file SQLite")
+    parser.add_argument("--archive-dir", default="/data/archive", help="Folder segmen arsip")
+    parser.add_argument("--days", type=int, required=True, help="Simpan N hari terakhir di tabel utama")
+    parser.add_argument("--chunk-size", type=int, default=5000, help="Baris yang dihapus per transaksi")
+    args = parser.parse_args()
+    result = RetentionJob(args.db, args.archive_dir, args.days, args.chunk_size).run_once()
+    print(f"{result['rows']} baris dari {result['days']} hari-device diarsipkan.")
+
+
+if __name__ == "__main__":
+    main()
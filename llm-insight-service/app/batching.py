@@ -0,0 +1,120 @@
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+BatchFn = Callable[[Sequence], Dict[str, Dict[str, str]]]
+
+
+class SummaryBatcher:
+    """Collect contexts for a short window and summarize them with one call.
+
+    ``submit`` returns a future resolved with the per-device result of the
+    batch call. A batch is flushed once ``max_items`` are queued or
+    ``window_ms`` after its first item arrived, whichever comes first. Items
+    missing from the reply fail their future so callers can fall back
+    individually.
+    """
+
+    def __init__(self, batch_fn: BatchFn, max_items: int, window_ms: int) -> None:
+        self._batch_fn = batch_fn
+        self.max_items = max(1, max_items)
+        self.window = window_ms / 1000.0
+        self._cond = threading.Condition()
+        self._queue: List[Tuple[object, Future]] = []
+        self._first_at = 0.0
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="llm-batcher", daemon=True)
+        self._thread.start()
+        self.batches = 0
+        self.items = 0
+        self.missing = 0
+
+    def submit(self, context) -> Future:
+        future: Future = Future()
+        with self._cond:
+            if self._stopping:
+                future.set_exception(RuntimeError("batcher stopped"))
+                return future
+            if not self._queue:
+                self._first_at = time.monotonic()
+            self._queue.append((context, future))
+            self._cond.notify()
+        return future
+
+    def stop(self, timeout: float = 5.0) -> None:
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        self._thread.join(timeout)
+
+    def stats(self) -> Dict[str, float]:
+        with self._cond:
+            return {
+                "queued": len(self._queue),
+                "batches": self.batches,
+                "items": self.items,
+                "missing": self.missing,
+                "avg_batch_size": self.items / self.batches if self.batches else 0.0,
+            }
+
+    def _take_batch(self) -> List[Tuple[object, Future]]:
+        """Pop up to ``max_items`` entries with distinct device ids (caller holds the lock)."""
+        batch: List[Tuple[object, Future]] = []
+        rest: List[Tuple[object, Future]] = []
+        seen = set()
+        for item in self._queue:
+            device_id = item[0].device_id
+            if len(batch) < self.max_items and device_id not in seen:
+                seen.add(device_id)
+                batch.append(item)
+            else:
+                rest.append(item)
+        self._queue = rest
+        if rest:
+            self._first_at = time.monotonic()
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._queue and not self._stopping:
+                    self._cond.wait()
+                while self._queue and not self._stopping and len(self._queue) < self.max_items:
+                    remaining = self._first_at + self.window - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                if not self._queue:
+                    return
+                batch = self._take_batch()
+            self._flush(batch)
+
+    def _flush(self, batch: List[Tuple[object, Future]]) -> None:
+        contexts = [context for context, _ in batch]
+        try:
+            results = self._batch_fn(contexts)
+        except Exception as exc:
+            logger.warning("llm_batch_failed", extra={"size": len(batch), "error": str(exc)})
+            for _, future in batch:
+                future.set_exception(exc)
+            return
+
+        missing = 0
+        for context, future in batch:
+            result = results.get(context.device_id)
+            if result is None:
+                missing += 1
+                future.set_exception(KeyError(context.device_id))
+            else:
+                future.set_result(result)
+        with self._cond:
+            self.batches += 1
+            self.items += len(batch)
+            self.missing += missing
+
+
+__all__ = ["SummaryBatcher"]
@@ -9,23 +9,72 @@ class Settings(BaseSettings):
     mqtt_keepalive: int = Field(60, alias="MQTT_KEEPALIVE")
     mqtt_client_id: str = Field("siap-suhu-llm", alias="MQTT_CLIENT_ID")
     telemetry_topic: str = Field("siapsuhu/telemetry/#", alias="MQTT_TELEMETRY_TOPIC")
+    telemetry_batch_topic: str = Field("siapsuhu/telemetry-batch/#", alias="MQTT_TELEMETRY_BATCH_TOPIC")
     insight_topic_prefix: str = Field("siapsuhu/insight", alias="MQTT_INSIGHT_TOPIC")
+    insight_topic_layout: str = Field("flat", alias="MQTT_INSIGHT_TOPIC_LAYOUT", regex="^(flat|level)$")
+    insight_latest_prefix: str = Field("siapsuhu/latest", alias="MQTT_INSIGHT_LATEST_TOPIC")
     mqtt_reconnect_initial: float = Field(1.0, alias="MQTT_RECONNECT_INITIAL")
     mqtt_reconnect_max: float = Field(30.0, alias="MQTT_RECONNECT_MAX")
+    worker_index: int = Field(0, alias="WORKER_INDEX")
+    worker_count: int = Field(1, alias="WORKER_COUNT")
 
     warn_threshold: float = Field(30.0, alias="INSIGHT_WARN_THRESHOLD")
     alert_threshold: float = Field(35.0, alias="INSIGHT_ALERT_THRESHOLD")
     alert_delta: float = Field(5.0, alias="INSIGHT_ALERT_DELTA")
+    alert_delta_seconds: float = Field(120.0, alias="INSIGHT_ALERT_DELTA_SECONDS")
+    # Optional per-device-group rules (JSON, see README); the thresholds above
+    # are the defaults for devices no group matches. Reloaded when it changes.
+    rules_path: str = Field("/data/rules.json", alias="RULES_PATH")
+    rules_reload_seconds: float = Field(5.0, alias="RULES_RELOAD_SECONDS")
     window_minutes: int = Field(15, alias="INSIGHT_WINDOW_MINUTES")
+    window_capacity: int = Field(360, alias="INSIGHT_WINDOW_CAPACITY")
 
     gemini_api_key: str = Field("", alias="GEMINI_API_KEY")
     gemini_model: str = Field("gemini-1.5-flash", alias="GEMINI_MODEL")
+    llm_timeout_seconds: float = Field(8.0, alias="LLM_TIMEOUT_SECONDS")
+    llm_breaker_failures: int = Field(5, alias="LLM_BREAKER_FAILURES")
+    llm_breaker_reset_seconds: float = Field(30.0, alias="LLM_BREAKER_RESET_SECONDS")
+    llm_breaker_half_open: int = Field(1, alias="LLM_BREAKER_HALF_OPEN_PROBES")
+    llm_batch_size: int = Field(1, alias="LLM_BATCH_SIZE")
+    llm_batch_window_ms: int = Field(300, alias="LLM_BATCH_WINDOW_MS")
+    llm_cache_size: int = Field(512, alias="LLM_CACHE_SIZE")
+    llm_cache_ttl: float = Field(300.0, alias="LLM_CACHE_TTL_SECONDS")
+    llm_cache_temp_step: float = Field(0.2, alias="LLM_CACHE_TEMP_STEP")
+    llm_cache_humidity_step: float = Field(2.0, alias="LLM_CACHE_HUMIDITY_STEP")
 
     db_path: str = Field("/data/siapsuhu.db", alias="DB_PATH")
+    db_writer_enabled: bool = Field(False, alias="DB_WRITER_ENABLED")
+    db_batch_size: int = Field(500, alias="DB_BATCH_SIZE")
+    db_flush_ms: int = Field(1000, alias="DB_FLUSH_MS")
+    db_buffer_size: int = Field(10000, alias="DB_BUFFER_SIZE")
+    db_put_timeout: float = Field(2.0, alias="DB_PUT_TIMEOUT_SECONDS")
+    history_pool_size: int = Field(4, alias="HISTORY_POOL_SIZE")
+    history_page_size: int = Field(1000, alias="HISTORY_PAGE_SIZE")
+    history_max_points: int = Field(5000, alias="HISTORY_MAX_POINTS")
+    history_cache_size: int = Field(256, alias="HISTORY_CACHE_SIZE")
+    history_cache_buckets: int = Field(100000, alias="HISTORY_CACHE_BUCKETS")
+    history_cache_max_bytes: int = Field(262144, alias="HISTORY_CACHE_MAX_BYTES")
+    archive_dir: str = Field("/data/archive", alias="ARCHIVE_DIR")
+    retention_days: int = Field(0, alias="RETENTION_DAYS")
+    retention_interval_seconds: float = Field(3600.0, alias="RETENTION_INTERVAL_SECONDS")
+    retention_chunk_size: int = Field(5000, alias="RETENTION_CHUNK_SIZE")
+    state_stripes: int = Field(64, alias="STATE_STRIPES")
+    state_max_devices: int = Field(100000, alias="STATE_MAX_DEVICES")
+    state_idle_ttl_seconds: float = Field(3600.0, alias="STATE_IDLE_TTL_SECONDS")
+    warm_start_enabled: bool = Field(True, alias="WARM_START_ENABLED")
+    warm_start_batch_size: int = Field(200, alias="WARM_START_BATCH_SIZE")
+    state_snapshot_path: str = Field("/data/engine-state.json.z", alias="STATE_SNAPSHOT_PATH")
+    state_snapshot_interval_seconds: float = Field(30.0, alias="STATE_SNAPSHOT_INTERVAL_SECONDS")
     publish_qos: int = Field(1, alias="MQTT_PUBLISH_QOS")
     publish_retain: bool = Field(False, alias="MQTT_PUBLISH_RETAIN")
 
     insight_alert_cooldown: int = Field(120, alias="INSIGHT_ALERT_COOLDOWN_SECONDS")
+    insight_temp_epsilon: float = Field(0.5, alias="INSIGHT_TEMP_EPSILON")
+    insight_avg_epsilon: float = Field(0.3, alias="INSIGHT_AVG_EPSILON")
+    insight_heartbeat_seconds: int = Field(300, alias="INSIGHT_HEARTBEAT_SECONDS")
+
+    llm_max_concurrency: int = Field(4, alias="LLM_MAX_CONCURRENCY")
+    llm_queue_size: int = Field(1000, alias="LLM_QUEUE_SIZE")
 
     class Config:
         env_file = ".env"
@@ -0,0 +1,245 @@
+import json
+import math
+import re
+import struct
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency check
+    orjson = None
+
+from .models import RSSI_MAX, RSSI_MIN, Reading, TelemetryMessage
+
+# Fixed timestamp layout emitted by the firmware and publish_dummy.py.
+_FIRMWARE_TS = re.compile(r"(\d{4})-(\d{2})-(\d{2})T(\d{2}):(\d{2}):(\d{2})(?:\.(\d{1,6}))?Z")
+
+Decoded = Tuple[str, Reading]
+
+# Binary batch layout (network byte order):
+#   header  "SSB1" | uint8 id_len | device_id (utf-8) | float64 base epoch seconds | uint16 count
+#   sample  uint32 offset_ms | int16 temp (0.01 °C) | uint16 humidity (0.01 %) | int8 rssi (127 = missing)
+BATCH_MAGIC = b"SSB1"
+_BATCH_HEADER = struct.Struct("!dH")
+_BATCH_SAMPLE = struct.Struct("!IhHb")
+RSSI_NONE = 127
+
+
+def loads(payload: bytes) -> Any:
+    """Decode JSON with orjson when installed, keeping stdlib ``json`` semantics.
+
+    orjson is stricter than ``json`` (no NaN/Infinity literals, 64-bit integers
+    only, no lone surrogates), so anything it refuses is retried with ``json``.
+    """
+    if orjson is not None:
+        try:
+            return orjson.loads(payload)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(payload.decode("utf-8"))
+
+
+def parse_firmware_ts(value: str) -> Optional[datetime]:
+    """Parse ``YYYY-MM-DDTHH:MM:SS[.ffffff]Z``; None for anything else."""
+    match = _FIRMWARE_TS.fullmatch(value)
+    if match is None:
+        return None
+    year, month, day, hour, minute, second, fraction = match.groups()
+    micros = int(fraction.ljust(6, "0")) if fraction else 0
+    try:
+        return datetime(int(year), int(month), int(day), int(hour), int(minute), int(second), micros, tzinfo=timezone.utc)
+    except ValueError:
+        return None
+
+
+def _decode_fast(data: Dict[str, Any]) -> Optional[Decoded]:
+    """Decode the common well-formed shape; None means "let pydantic decide".
+
+    Only exact types are accepted here (str, int/float but not bool, ...), so
+    every payload taken by this path is one ``TelemetryMessage`` accepts with
+    the same values. Coercions and error reporting stay with pydantic.
+    """
+    device_id = data.get("device_id")
+    ts = data.get("ts")
+    temp = data.get("temp_c")
+    humidity = data.get("humidity")
+    rssi = data.get("rssi")
+    fw = data.get("fw")
+    if type(device_id) is not str or type(ts) is not str:
+        return None
+    if type(temp) not in (float, int) or type(humidity) not in (float, int):
+        return None
+    if rssi is not None and (type(rssi) is not int or not RSSI_MIN <= rssi <= RSSI_MAX):
+        return None
+    if fw is not None and type(fw) is not str:
+        return None
+    device_id = device_id.strip()
+    if not device_id:
+        return None
+    parsed_ts = parse_firmware_ts(ts)
+    if parsed_ts is None:
+        return None
+    try:
+        temp, humidity = float(temp), float(humidity)
+    except OverflowError:
+        return None
+    if not (math.isfinite(temp) and math.isfinite(humidity)):
+        return None  # pydantic rejects it with a proper error
+    return device_id, Reading(ts=parsed_ts, temp_c=temp, humidity=humidity, rssi=rssi)
+
+
+def _number(value: Any) -> float:
+    if type(value) not in (float, int):
+        raise ValueError(f"Invalid number: {value!r}")
+    number = float(value)
+    if not math.isfinite(number):
+        raise ValueError(f"Invalid number: {value!r}")
+    return number
+
+
+def _parse_base_ts(value: Any) -> datetime:
+    if type(value) in (float, int):
+        return datetime.fromtimestamp(float(value), tz=timezone.utc)
+    if type(value) is str:
+        parsed = parse_firmware_ts(value)
+        if parsed is not None:
+            return parsed
+    raise ValueError(f"Invalid base_ts: {value!r}")
+
+
+def _decode_compact(data: Dict[str, Any]) -> List[Decoded]:
+    """``{"device_id", "base_ts", "samples": [[offset_ms, temp_c, humidity, rssi?], ...]}``."""
+    device_id = data.get("device_id")
+    if type(device_id) is not str or not device_id.strip():
+        raise ValueError("device_id is required")
+    device_id = device_id.strip()
+    base = _parse_base_ts(data.get("base_ts"))
+    samples = data["samples"]
+    if type(samples) is not list:
+        raise ValueError("samples must be a list")
+    decoded: List[Decoded] = []
+    for sample in samples:
+        if type(sample) is not list or len(sample) not in (3, 4):
+            raise ValueError(f"Invalid sample: {sample!r}")
+        rssi = sample[3] if len(sample) == 4 else None
+        if rssi is not None and (type(rssi) is not int or not RSSI_MIN <= rssi <= RSSI_MAX):
+            raise ValueError(f"Invalid rssi: {rssi!r}")
+        ts = base + timedelta(milliseconds=_number(sample[0]))
+        decoded.append((device_id, Reading(ts=ts, temp_c=_number(sample[1]), humidity=_number(sample[2]), rssi=rssi)))
+    return decoded
+
+
+def _decode_binary(payload: bytes) -> List[Decoded]:
+    offset = len(BATCH_MAGIC)
+    id_len = payload[offset]
+    offset += 1
+    device_id = payload[offset : offset + id_len].decode("utf-8").strip()
+    if not device_id:
+        raise ValueError("device_id is required")
+    offset += id_len
+    base_epoch, count = _BATCH_HEADER.unpack_from(payload, offset)
+    offset += _BATCH_HEADER.size
+    if len(payload) != offset + count * _BATCH_SAMPLE.size:
+        raise ValueError("Truncated binary batch")
+    base = datetime.fromtimestamp(base_epoch, tz=timezone.utc)
+    decoded: List[Decoded] = []
+    for offset_ms, temp, humidity, rssi in _BATCH_SAMPLE.iter_unpack(payload[offset:]):
+        if rssi != RSSI_NONE and not RSSI_MIN <= rssi <= RSSI_MAX:
+            raise ValueError(f"Invalid rssi: {rssi!r}")
+        reading = Reading(
+            ts=base + timedelta(milliseconds=offset_ms),
+            temp_c=temp / 100.0,
+            humidity=humidity / 100.0,
+            rssi=None if rssi == RSSI_NONE else rssi,
+        )
+        decoded.append((device_id, reading))
+    return decoded
+
+
+def encode_binary_batch(device_id: str, base_epoch: float, samples: List[Tuple[int, float, float, Optional[int]]]) -> bytes:
+    """Pack ``(offset_ms, temp_c, humidity, rssi)`` samples into the binary batch layout."""
+    raw_id = device_id.encode("utf-8")
+    parts = [BATCH_MAGIC, bytes([len(raw_id)]), raw_id, _BATCH_HEADER.pack(base_epoch, len(samples))]
+    for offset_ms, temp, humidity, rssi in samples:
+        parts.append(
+            _BATCH_SAMPLE.pack(offset_ms, round(temp * 100), round(humidity * 100), RSSI_NONE if rssi is None else rssi)
+        )
+    return b"".join(parts)
+
+
+def decode_with_pydantic(data: Any) -> Decoded:
+    telemetry = TelemetryMessage.parse_obj(data)
+    return telemetry.device_id, Reading(
+        ts=telemetry.ts,
+        temp_c=telemetry.temp_c,
+        humidity=telemetry.humidity,
+        rssi=telemetry.rssi,
+    )
+
+
+class TelemetryDecoder:
+    """Telemetry payload decoder with a pydantic-free fast path.
+
+    Raises the same way ``TelemetryMessage.parse_obj`` would for rejected
+    payloads; ``fast``/``fallback`` count which path handled each message.
+    """
+
+    def __init__(self) -> None:
+        self.fast = 0
+        self.fallback = 0
+        self.batches = 0
+        self.batch_samples = 0
+
+    def decode(self, payload: bytes) -> Decoded:
+        return self._decode_object(loads(payload))
+
+    def decode_many(self, payload: bytes) -> List[Decoded]:
+        """Decode a single reading or a batch, returned in timestamp order.
+
+        Accepted batch forms: a JSON array of telemetry objects, a compact JSON
+        object with ``base_ts`` + ``samples`` offsets, or the binary layout
+        starting with ``BATCH_MAGIC``. Any invalid sample rejects the batch.
+        """
+        if payload.startswith(BATCH_MAGIC):
+            decoded = _decode_binary(payload)
+        else:
+            data = loads(payload)
+            if type(data) is list:
+                decoded = [self._decode_object(item) for item in data]
+            elif type(data) is dict and "samples" in data:
+                decoded = _decode_compact(data)
+            else:
+                return [self._decode_object(data)]
+        self.batches += 1
+        self.batch_samples += len(decoded)
+        decoded.sort(key=lambda item: item[1].ts)
+        return decoded
+
+    def _decode_object(self, data: Any) -> Decoded:
+        if type(data) is dict:
+            decoded = _decode_fast(data)
+            if decoded is not None:
+                self.fast += 1
+                return decoded
+        self.fallback += 1
+        return decode_with_pydantic(data)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "fast": self.fast,
+            "fallback": self.fallback,
+            "batches": self.batches,
+            "batch_samples": self.batch_samples,
+            "orjson": orjson is not None,
+        }
+
+
+__all__ = [
+    "BATCH_MAGIC",
+    "TelemetryDecoder",
+    "decode_with_pydantic",
+    "encode_binary_batch",
+    "loads",
+    "parse_firmware_ts",
+]
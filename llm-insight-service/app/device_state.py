@@ -0,0 +1,156 @@
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Optional, TypeVar
+
+from .window import RollingWindow
+
+T = TypeVar("T")
+
+
+class DeviceState:
+    """Everything the engine keeps for one device, guarded by its stripe lock."""
+
+    __slots__ = ("window", "emitted", "last_alert", "seen")
+
+    def __init__(self, window: Optional[RollingWindow] = None, seen: float = 0.0) -> None:
+        self.window = window
+        self.seen = seen  # clock value of the last access, for idle eviction
+        # Last published insight (``emission.EmittedState``) and ALERT cooldown start.
+        self.emitted = None
+        self.last_alert: Optional[datetime] = None
+
+
+class _Stripe:
+    __slots__ = ("lock", "states", "acquired", "contended", "evicted_idle", "evicted_capacity")
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        # Least recently used first; every access moves a device to the end.
+        self.states: "OrderedDict[str, DeviceState]" = OrderedDict()
+        self.acquired = 0
+        self.contended = 0
+        self.evicted_idle = 0
+        self.evicted_capacity = 0
+
+
+class DeviceStateTable:
+    """Per-device state sharded over ``stripes`` independently locked dicts.
+
+    Readings for different devices only contend when they hash to the same
+    stripe, while everything about one device (window, statistics, emission
+    state) is read and updated under a single lock. Stripes use Python's
+    ``hash`` rather than the crc32 of ``Partition`` so that a worker owning
+    one residue class of crc32 still spreads its devices over all stripes.
+
+    The table is bounded: each stripe holds at most ``max_devices // stripes``
+    devices (least recently used is evicted first) and devices idle for
+    ``idle_ttl`` seconds are dropped. Eviction is amortized: every access
+    checks at most ``EXPIRE_BATCH`` of the stripe's oldest devices, so no call
+    ever sweeps the whole table. ``0`` disables either bound.
+    """
+
+    EXPIRE_BATCH = 2
+
+    def __init__(
+        self,
+        window_factory: Optional[Callable[[], RollingWindow]] = None,
+        stripes: int = 64,
+        max_devices: int = 0,
+        idle_ttl: float = 0.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.window_factory = window_factory
+        self._stripes: List[_Stripe] = [_Stripe() for _ in range(max(1, stripes))]
+        self.max_devices = max(0, max_devices)
+        self._stripe_cap = max(1, self.max_devices // len(self._stripes)) if self.max_devices else 0
+        self.idle_ttl = idle_ttl
+        self._clock = clock
+
+    def _stripe(self, device_id: str) -> _Stripe:
+        return self._stripes[hash(device_id) % len(self._stripes)]
+
+    @contextmanager
+    def locked(self, device_id: str) -> Iterator[DeviceState]:
+        """Hold the device's stripe lock and yield its state, creating it if needed."""
+        stripe = self._stripe(device_id)
+        if not stripe.lock.acquire(blocking=False):
+            stripe.lock.acquire()
+            stripe.contended += 1
+        try:
+            stripe.acquired += 1
+            now = self._clock()
+            states = stripe.states
+            state = states.get(device_id)
+            if state is not None:
+                state.seen = now
+                states.move_to_end(device_id)
+                self._expire(stripe, now)
+            else:
+                self._expire(stripe, now)
+                if self._stripe_cap and len(states) >= self._stripe_cap:
+                    states.popitem(last=False)
+                    stripe.evicted_capacity += 1
+                state = DeviceState(self.window_factory() if self.window_factory is not None else None, now)
+                states[device_id] = state
+            yield state
+        finally:
+            stripe.lock.release()
+
+    def _expire(self, stripe: _Stripe, now: float) -> None:
+        if not self.idle_ttl:
+            return
+        limit = now - self.idle_ttl
+        states = stripe.states
+        for _ in range(self.EXPIRE_BATCH):
+            if not states or next(iter(states.values())).seen > limit:
+                return
+            states.popitem(last=False)
+            stripe.evicted_idle += 1
+
+    def get(self, device_id: str) -> Optional[DeviceState]:
+        stripe = self._stripe(device_id)
+        with stripe.lock:
+            return stripe.states.get(device_id)
+
+    def collect(self, fn: Callable[[str, DeviceState], Optional[T]]) -> Dict[str, T]:
+        """Apply ``fn`` to every device under its stripe lock, one stripe at a time; None results are skipped."""
+        result: Dict[str, T] = {}
+        for stripe in self._stripes:
+            with stripe.lock:
+                for device_id, state in stripe.states.items():
+                    value = fn(device_id, state)
+                    if value is not None:
+                        result[device_id] = value
+        return result
+
+    def __contains__(self, device_id: object) -> bool:
+        return isinstance(device_id, str) and self.get(device_id) is not None
+
+    def __iter__(self) -> Iterator[str]:
+        devices: List[str] = []
+        for stripe in self._stripes:
+            with stripe.lock:
+                devices.extend(stripe.states)
+        return iter(devices)
+
+    def __len__(self) -> int:
+        return sum(len(stripe.states) for stripe in self._stripes)
+
+    def stats(self) -> Dict[str, int]:
+        sizes = [len(stripe.states) for stripe in self._stripes]
+        return {
+            "tracked": sum(sizes),
+            "stripes": len(sizes),
+            "largest_stripe": max(sizes),
+            "acquired": sum(stripe.acquired for stripe in self._stripes),
+            "contended": sum(stripe.contended for stripe in self._stripes),
+            "max_devices": self._stripe_cap * len(sizes),
+            "evicted_idle": sum(stripe.evicted_idle for stripe in self._stripes),
+            "evicted_capacity": sum(stripe.evicted_capacity for stripe in self._stripes),
+        }
+
+
+__all__ = ["DeviceState", "DeviceStateTable"]
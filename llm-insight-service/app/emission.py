@@ -0,0 +1,130 @@
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional
+
+from .device_state import DeviceState, DeviceStateTable
+from .window import from_epoch
+
+
+@dataclass
+class EmittedState:
+    level: str
+    temp_c: float
+    window_avg_c: float
+    ts: datetime
+
+
+def _export_emitted(device_id: str, state: DeviceState) -> Optional[list]:
+    emitted = state.emitted
+    if emitted is None:
+        return None
+    return [emitted.level, emitted.temp_c, emitted.window_avg_c, emitted.ts.timestamp()]
+
+
+class EmissionPolicy:
+    """Decide which readings deserve an insight.
+
+    OK/WARN insights are published on a level transition, when the temperature
+    or window average moved by at least the configured epsilon since the last
+    published insight, or as a periodic heartbeat. ALERT insights keep their
+    own per-device cooldown.
+
+    Per-device state lives in a ``DeviceStateTable``; pass the engine's table
+    so the window and the emission state of a device share one lock.
+    """
+
+    def __init__(
+        self,
+        temp_epsilon: float,
+        avg_epsilon: float,
+        heartbeat_seconds: int,
+        alert_cooldown_seconds: int,
+        table: Optional[DeviceStateTable] = None,
+    ) -> None:
+        self.temp_epsilon = temp_epsilon
+        self.avg_epsilon = avg_epsilon
+        self.heartbeat = timedelta(seconds=heartbeat_seconds)
+        self.alert_cooldown = timedelta(seconds=alert_cooldown_seconds)
+        self.table = table if table is not None else DeviceStateTable()
+        self._lock = threading.Lock()  # guards the counters only
+        self.counters: Dict[str, int] = {
+            "emitted_transition": 0,
+            "emitted_change": 0,
+            "emitted_heartbeat": 0,
+            "emitted_alert": 0,
+            "suppressed_unchanged": 0,
+            "suppressed_cooldown": 0,
+        }
+
+    def decide(self, device_id: str, level: str, temp_c: float, window_avg_c: float, ts: datetime) -> Optional[str]:
+        """Return the emission reason, or None when the insight should be suppressed."""
+        with self.table.locked(device_id) as state:
+            return self.decide_state(state, level, temp_c, window_avg_c, ts)
+
+    def decide_state(self, state: DeviceState, level: str, temp_c: float, window_avg_c: float, ts: datetime) -> Optional[str]:
+        """``decide`` for a state whose stripe lock the caller already holds."""
+        reason = self._decide(state, level, temp_c, window_avg_c, ts)
+        if reason is None:
+            counter = "suppressed_cooldown" if level == "ALERT" else "suppressed_unchanged"
+        else:
+            counter = f"emitted_{reason}"
+            state.emitted = EmittedState(level=level, temp_c=temp_c, window_avg_c=window_avg_c, ts=ts)
+        with self._lock:
+            self.counters[counter] += 1
+        return reason
+
+    def _decide(self, state: DeviceState, level: str, temp_c: float, window_avg_c: float, ts: datetime) -> Optional[str]:
+        if level == "ALERT":
+            if state.last_alert and ts - state.last_alert < self.alert_cooldown:
+                return None
+            state.last_alert = ts
+            return "alert"
+
+        if level == "OK":
+            state.last_alert = None
+
+        last = state.emitted
+        if last is None or last.level != level:
+            return "transition"
+        if abs(temp_c - last.temp_c) >= self.temp_epsilon or abs(window_avg_c - last.window_avg_c) >= self.avg_epsilon:
+            return "change"
+        if ts - last.ts >= self.heartbeat:
+            return "heartbeat"
+        return None
+
+    def export_state(self) -> Dict[str, Dict[str, list]]:
+        """Plain-data copy of the per-device emission state, for snapshots."""
+        return {
+            "last": self.table.collect(_export_emitted),
+            "last_alert": self.table.collect(
+                lambda device_id, state: state.last_alert.timestamp() if state.last_alert is not None else None
+            ),
+        }
+
+    def restore_state(self, state: Dict[str, Dict[str, list]], keep: Callable[[str], bool] = lambda device_id: True) -> int:
+        """Load a snapshot from ``export_state``; returns the number of devices restored."""
+        last = state.get("last", {})
+        last_alert = state.get("last_alert", {})
+        restored = 0
+        for device_id in set(last) | set(last_alert):
+            if not keep(device_id):
+                continue
+            with self.table.locked(device_id) as device:
+                if device_id in last:
+                    level, temp_c, avg_c, ts = last[device_id]
+                    device.emitted = EmittedState(level=level, temp_c=temp_c, window_avg_c=avg_c, ts=from_epoch(ts))
+                if device_id in last_alert:
+                    device.last_alert = from_epoch(last_alert[device_id])
+            restored += 1
+        return restored
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            stats = dict(self.counters)
+        stats["emitted"] = sum(value for key, value in stats.items() if key.startswith("emitted_"))
+        stats["suppressed"] = stats["suppressed_unchanged"] + stats["suppressed_cooldown"]
+        return stats
+
+
+__all__ = ["EmissionPolicy", "EmittedState"]
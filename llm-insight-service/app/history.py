@@ -0,0 +1,339 @@
+import csv
+import io
+import json
+import sqlite3
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from .archive import DAY_MS, archived_until, day_start, merge_rows, read_segment, segment_path
+from .models import parse_iso8601
+from .storage import LAYOUT_V2, ReadPool, detect_layout
+
+MINUTE = "1m"
+HOUR = "1h"
+
+BUCKET_MS = {MINUTE: 60_000, HOUR: 3_600_000}
+ROLLUP_TABLES = {MINUTE: "readings_1m", HOUR: "readings_1h"}
+
+RAW_FIELDS = ("device_id", "ts", "temp_c", "humidity", "rssi")
+BUCKET_FIELDS = (
+    "device_id",
+    "ts",
+    "count",
+    "temp_c",
+    "temp_min",
+    "temp_max",
+    "temp_last",
+    "humidity",
+    "humidity_min",
+    "humidity_max",
+    "humidity_last",
+)
+
+Point = Dict[str, Any]
+# (bucket_ms, count, temp_sum, temp_min, temp_max, temp_last,
+#  humidity_sum, humidity_min, humidity_max, humidity_last)
+Aggregate = Tuple[int, int, float, float, float, float, float, float, float, float]
+
+_ROLLUP_COLUMNS = (
+    "bucket_ms, count, temp_sum, temp_min, temp_max, temp_last, humidity_sum, humidity_min, humidity_max, humidity_last"
+)
+
+
+def format_ms(value: int) -> str:
+    return datetime.fromtimestamp(value / 1000, tz=timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+
+def parse_ms(value: str) -> int:
+    return round(parse_iso8601(value).timestamp() * 1000)
+
+
+def has_rollups(conn: sqlite3.Connection) -> bool:
+    if detect_layout(conn) != LAYOUT_V2:
+        return False
+    row = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'readings_1h'").fetchone()
+    return row is not None
+
+
+def rollup_point(row: Aggregate) -> Point:
+    bucket_ms, count, temp_sum, temp_min, temp_max, temp_last, humidity_sum, humidity_min, humidity_max, humidity_last = row
+    return {
+        "ts": format_ms(bucket_ms),
+        "temp_c": temp_sum / count,
+        "humidity": humidity_sum / count,
+        "temp_min": temp_min,
+        "temp_max": temp_max,
+        "temp_last": temp_last,
+        "humidity_min": humidity_min,
+        "humidity_max": humidity_max,
+        "humidity_last": humidity_last,
+        "count": count,
+    }
+
+
+def bucket_size(start_ms: int, end_ms: int, points: int) -> int:
+    """Bucket width giving at most about ``points`` buckets, rounded up to whole hours/minutes/seconds.
+
+    Rounding keeps epoch-aligned buckets on rollup boundaries so they can be
+    served from ``readings_1h``/``readings_1m`` instead of raw rows.
+    """
+    size = max(1000, -(-(end_ms - start_ms) // max(1, points)))
+    for unit in (BUCKET_MS[HOUR], BUCKET_MS[MINUTE], 1000):
+        if size >= unit:
+            return -(-size // unit) * unit
+    return size
+
+
+def _fold(rows: Iterable[Aggregate], bucket_ms: int) -> Iterator[Aggregate]:
+    """Merge time-ordered aggregates into ``bucket_ms`` wide buckets."""
+    acc: Optional[List[Any]] = None
+    for bucket, count, temp_sum, temp_min, temp_max, temp_last, hum_sum, hum_min, hum_max, hum_last in rows:
+        key = bucket - bucket % bucket_ms
+        if acc is not None and acc[0] == key:
+            acc[1] += count
+            acc[2] += temp_sum
+            acc[3] = min(acc[3], temp_min)
+            acc[4] = max(acc[4], temp_max)
+            acc[5] = temp_last
+            acc[6] += hum_sum
+            acc[7] = min(acc[7], hum_min)
+            acc[8] = max(acc[8], hum_max)
+            acc[9] = hum_last
+            continue
+        if acc is not None:
+            yield tuple(acc)  # type: ignore[misc]
+        acc = [key, count, temp_sum, temp_min, temp_max, temp_last, hum_sum, hum_min, hum_max, hum_last]
+    if acc is not None:
+        yield tuple(acc)  # type: ignore[misc]
+
+
+class HistoryReader:
+    """Streams history from a ``ReadPool`` with keyset pagination.
+
+    Rows are read in pages of ``page_size`` ordered by ``(device_id, ts)``;
+    each page is one short query on a pooled connection, so memory stays
+    constant regardless of the range and a slow client never pins a
+    connection (or an old WAL snapshot) between pages.
+    """
+
+    def __init__(self, pool: ReadPool, page_size: int = 1000, archive_dir: Optional[str] = None) -> None:
+        self.pool = pool
+        self.page_size = max(1, page_size)
+        self.archive_dir = archive_dir
+
+    def layout(self) -> Tuple[str, bool]:
+        with self.pool.connection() as conn:
+            return detect_layout(conn), has_rollups(conn)
+
+    def devices(self, layout: str, device_id: Optional[str], after_device: Optional[str]) -> Iterator[str]:
+        if device_id:
+            yield device_id
+            return
+        tables = ["readings_v2", "archive_state"] if layout == LAYOUT_V2 else ["readings"]
+        if after_device:
+            yield after_device
+        current = after_device or ""
+        while True:
+            # MIN() over the leading key column is a single index seek; fully
+            # archived devices are only listed in archive_state.
+            candidates = []
+            with self.pool.connection() as conn:
+                for table in tables:
+                    try:
+                        (found,) = conn.execute(f"SELECT MIN(device_id) FROM {table} WHERE device_id > ?", (current,)).fetchone()
+                    except sqlite3.OperationalError:
+                        continue
+                    if found is not None:
+                        candidates.append(found)
+            if not candidates:
+                return
+            current = min(candidates)
+            yield current
+
+    def raw_rows(
+        self, layout: str, device_id: str, start_ms: int, end_ms: int, after: Optional[str] = None
+    ) -> Iterator[Tuple[int, str, float, float, Optional[int]]]:
+        """Yield ``(ts_ms, ts, temp_c, humidity, rssi)`` for one device in ``[start_ms, end_ms)``."""
+        if layout == LAYOUT_V2:
+            sql = (
+                "SELECT ts_ms, temp_c, humidity, rssi FROM readings_v2 "
+                "WHERE device_id = ? AND ts_ms > ? AND ts_ms < ? ORDER BY ts_ms LIMIT ?"
+            )
+            cursor: Any = start_ms - 1
+            if after is not None:
+                cursor = max(cursor, parse_ms(after))
+            bound: Any = end_ms
+            until = self._archived_until(device_id)
+            if until is not None and cursor + 1 < until:
+                for row in self._archived_rows(device_id, cursor, min(end_ms, until)):
+                    yield row[0], format_ms(row[0]), row[1], row[2], row[3]
+                cursor = max(cursor, until - 1)
+                if cursor + 1 >= end_ms:
+                    return
+        else:
+            sql = (
+                "SELECT ts, temp_c, humidity, rssi FROM readings "
+                "WHERE device_id = ? AND ts > ? AND ts < ? ORDER BY ts LIMIT ?"
+            )
+            cursor = format_ms(start_ms - 1)
+            if after is not None:
+                cursor = max(cursor, after)
+            bound = format_ms(end_ms)
+        while True:
+            with self.pool.connection() as conn:
+                page = conn.execute(sql, (device_id, cursor, bound, self.page_size)).fetchall()
+            for ts, temp, humidity, rssi in page:
+                if layout == LAYOUT_V2:
+                    yield ts, format_ms(ts), temp, humidity, rssi
+                else:
+                    yield parse_ms(ts), ts, temp, humidity, rssi
+            if len(page) < self.page_size:
+                return
+            cursor = page[-1][0]
+
+    def _archived_until(self, device_id: str) -> Optional[int]:
+        if self.archive_dir is None:
+            return None
+        with self.pool.connection() as conn:
+            return archived_until(conn, device_id)
+
+    def _archived_rows(self, device_id: str, after_ms: int, stop_ms: int) -> Iterator[Tuple[int, float, float, Optional[int]]]:
+        """Rows in ``(after_ms, stop_ms)`` from day segments merged with any late rows still in the hot table."""
+        day = day_start(after_ms + 1)
+        while day < stop_ms:
+            archived = read_segment(segment_path(self.archive_dir, device_id, day))  # type: ignore[arg-type]
+            with self.pool.connection() as conn:
+                hot = conn.execute(
+                    "SELECT ts_ms, temp_c, humidity, rssi FROM readings_v2 "
+                    "WHERE device_id = ? AND ts_ms > ? AND ts_ms < ? ORDER BY ts_ms",
+                    (device_id, max(after_ms, day - 1), min(stop_ms, day + DAY_MS)),
+                ).fetchall()
+            for row in merge_rows(archived, hot):
+                if after_ms < row[0] < stop_ms:
+                    yield row
+            day += DAY_MS
+
+    def rollup_rows(self, resolution: str, device_id: str, start_ms: int, end_ms: int) -> Iterator[Aggregate]:
+        bucket = BUCKET_MS[resolution]
+        sql = (
+            f"SELECT {_ROLLUP_COLUMNS} FROM {ROLLUP_TABLES[resolution]} "
+            "WHERE device_id = ? AND bucket_ms > ? AND bucket_ms < ? ORDER BY bucket_ms LIMIT ?"
+        )
+        cursor = start_ms - start_ms % bucket - 1
+        while True:
+            with self.pool.connection() as conn:
+                page = conn.execute(sql, (device_id, cursor, end_ms, self.page_size)).fetchall()
+            yield from page
+            if len(page) < self.page_size:
+                return
+            cursor = page[-1][0]
+
+    def stream(
+        self,
+        device_id: Optional[str],
+        start_ms: int,
+        end_ms: int,
+        bucket: Optional[int] = None,
+        after: Optional[str] = None,
+        after_device: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[Point]:
+        """Yield raw rows, or epoch-aligned buckets of ``bucket`` ms per device when given.
+
+        ``after_device``/``after`` resume strictly after the last row of a
+        previous response (keyset pagination); ``limit`` caps the rows returned.
+        Bucket edges follow the source resolution (minute or hour rollups when
+        the bucket width allows it).
+        """
+        layout, rollups = self.layout()
+        if bucket is not None:
+            start_ms -= start_ms % bucket
+        emitted = 0
+        for index, device in enumerate(self.devices(layout, device_id, after_device)):
+            resume = after if index == 0 and (device_id or after_device) else None
+            for point in self._device_points(layout, rollups, device, start_ms, end_ms, bucket, resume):
+                if limit is not None and emitted >= limit:
+                    return
+                emitted += 1
+                yield point
+
+    def buckets(self, device_id: str, start_ms: int, end_ms: int, width: int) -> Iterator[Point]:
+        """Buckets of ``width`` ms for one device; ``start_ms`` must be aligned to ``width``."""
+        layout, rollups = self.layout()
+        return self._device_points(layout, rollups, device_id, start_ms, end_ms, width, None)
+
+    def _device_points(
+        self,
+        layout: str,
+        rollups: bool,
+        device_id: str,
+        start_ms: int,
+        end_ms: int,
+        bucket: Optional[int],
+        after: Optional[str],
+    ) -> Iterator[Point]:
+        if bucket is None:
+            for _, ts, temp, humidity, rssi in self.raw_rows(layout, device_id, start_ms, end_ms, after):
+                yield {"device_id": device_id, "ts": ts, "temp_c": temp, "humidity": humidity, "rssi": rssi}
+            return
+        if after is not None:
+            start_ms = max(start_ms, parse_ms(after) + bucket)
+            start_ms -= start_ms % bucket
+        source: Iterable[Aggregate]
+        if rollups and bucket % BUCKET_MS[HOUR] == 0:
+            source = self.rollup_rows(HOUR, device_id, start_ms, end_ms)
+        elif rollups and bucket % BUCKET_MS[MINUTE] == 0:
+            source = self.rollup_rows(MINUTE, device_id, start_ms, end_ms)
+        else:
+            source = (
+                (ts_ms, 1, temp, temp, temp, temp, humidity, humidity, humidity, humidity)
+                for ts_ms, _, temp, humidity, _ in self.raw_rows(layout, device_id, start_ms, end_ms)
+            )
+        for row in _fold(source, bucket):
+            point = rollup_point(row)
+            point["device_id"] = device_id
+            yield point
+
+
+def encode_ndjson(points: Iterable[Point], chunk_rows: int = 500) -> Iterator[bytes]:
+    """Serialize points as NDJSON, one chunk per ``chunk_rows`` lines."""
+    lines: List[str] = []
+    for point in points:
+        lines.append(json.dumps(point, separators=(",", ":")))
+        if len(lines) >= chunk_rows:
+            yield ("\n".join(lines) + "\n").encode("utf-8")
+            lines = []
+    if lines:
+        yield ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def encode_csv(points: Iterable[Point], fields: Sequence[str], chunk_rows: int = 500) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=list(fields), extrasaction="ignore", lineterminator="\n")
+    writer.writeheader()
+    rows = 0
+    for point in points:
+        writer.writerow(point)
+        rows += 1
+        if rows >= chunk_rows:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+            rows = 0
+    yield buffer.getvalue().encode("utf-8")
+
+
+__all__ = [
+    "BUCKET_FIELDS",
+    "BUCKET_MS",
+    "HOUR",
+    "HistoryReader",
+    "MINUTE",
+    "RAW_FIELDS",
+    "bucket_size",
+    "encode_csv",
+    "encode_ndjson",
+    "format_ms",
+    "has_rollups",
+    "parse_ms",
+]
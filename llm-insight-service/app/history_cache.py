@@ -0,0 +1,157 @@
+import hashlib
+import sqlite3
+import threading
+from typing import Dict, Hashable, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from .cache import TTLCache
+from .history import HistoryReader, Point, parse_ms
+
+# Marks a closed bucket that holds no readings (TTLCache uses None for "absent").
+EMPTY_BUCKET: Point = {}
+
+
+class Watermark(NamedTuple):
+    version: int
+    max_ts_ms: int
+    late_version: int
+
+
+class HistoryCache:
+    """Response and bucket cache for ``/history`` invalidated by ingest watermarks.
+
+    The watermark comes from the ``ingest_watermark`` table, which a trigger on
+    ``readings_v2`` bumps for every stored reading regardless of the writer.
+    Responses are cached as encoded bodies under their normalized parameters
+    and are only served while the ETag derived from the watermark matches.
+    Buckets that end at or before ``max_ts_ms`` are closed: in-order data can
+    no longer reach them, so they are cached without expiry under the device's
+    ``late_version`` and only the open tail is recomputed.
+    """
+
+    def __init__(self, reader: HistoryReader, max_responses: int, max_buckets: int, max_response_bytes: int) -> None:
+        self.reader = reader
+        self.max_response_bytes = max_response_bytes
+        self._responses: TTLCache[Tuple[str, bytes]] = TTLCache(max_responses, float("inf"))
+        self._buckets: TTLCache[Point] = TTLCache(max_buckets, float("inf"))
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.bypassed = 0
+        self.bucket_hits = 0
+        self.bucket_misses = 0
+
+    def watermark(self, device_id: str) -> Optional[Watermark]:
+        """Current watermark; None when the database has no watermark table yet."""
+        try:
+            with self.reader.pool.connection() as conn:
+                row = conn.execute(
+                    "SELECT version, max_ts_ms, late_version FROM ingest_watermark WHERE device_id = ?", (device_id,)
+                ).fetchone()
+        except sqlite3.OperationalError:
+            with self._lock:
+                self.bypassed += 1
+            return None
+        if row is None:
+            return Watermark(0, -1, 0)
+        return Watermark(*row)
+
+    @staticmethod
+    def etag(key: Hashable, watermark: Watermark, end_ms: int) -> str:
+        digest = hashlib.blake2b(repr(key).encode("utf-8"), digest_size=8).hexdigest()
+        if end_ms <= watermark.max_ts_ms + 1:
+            # Range fully behind the watermark: only late readings can change it.
+            return f'"{digest}-c{watermark.late_version}"'
+        return f'"{digest}-{watermark.version}"'
+
+    def not_modified_for(self, if_none_match: Optional[str], etag: str) -> bool:
+        if not if_none_match:
+            return False
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        if etag in tags or "*" in tags:
+            with self._lock:
+                self.not_modified += 1
+            return True
+        return False
+
+    def get(self, key: Hashable, etag: str) -> Optional[bytes]:
+        entry = self._responses.get(key)
+        with self._lock:
+            if entry is not None and entry[0] == etag:
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return None
+
+    def tee(self, key: Hashable, etag: str, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        """Pass ``chunks`` through, storing the body once complete if it fits ``max_response_bytes``."""
+        parts: Optional[List[bytes]] = []
+        size = 0
+        for chunk in chunks:
+            if parts is not None:
+                size += len(chunk)
+                if size > self.max_response_bytes:
+                    parts = None
+                else:
+                    parts.append(chunk)
+            yield chunk
+        if parts is not None:
+            self._responses.put(key, (etag, b"".join(parts)))
+
+    def buckets(self, device_id: str, start_ms: int, end_ms: int, width: int, watermark: Watermark) -> List[Point]:
+        """Buckets for ``[start_ms, end_ms)`` reusing cached closed buckets; ``start_ms`` aligned to ``width``."""
+        points: List[Point] = []
+        tail = start_ms
+        while tail < end_ms and self._closed(tail, width, watermark):
+            cached = self._buckets.get(self._bucket_key(device_id, width, tail, watermark))
+            if cached is None:
+                break
+            if cached is not EMPTY_BUCKET:
+                points.append(cached)
+            tail += width
+        hits = (tail - start_ms) // width
+        if tail < end_ms:
+            computed = list(self.reader.buckets(device_id, tail, end_ms, width))
+            points.extend(computed)
+            by_start = {parse_ms(point["ts"]): point for point in computed}
+            self._store_closed(device_id, tail, end_ms, width, watermark, by_start)
+        with self._lock:
+            self.bucket_hits += hits
+            self.bucket_misses += -(-(end_ms - tail) // width)
+        return points
+
+    def _store_closed(
+        self, device_id: str, start_ms: int, end_ms: int, width: int, watermark: Watermark, by_start: Dict[int, Point]
+    ) -> None:
+        bucket = start_ms
+        while bucket < end_ms and self._closed(bucket, width, watermark):
+            self._buckets.put(self._bucket_key(device_id, width, bucket, watermark), by_start.get(bucket, EMPTY_BUCKET))
+            bucket += width
+
+    @staticmethod
+    def _closed(bucket_start: int, width: int, watermark: Watermark) -> bool:
+        return bucket_start + width <= watermark.max_ts_ms + 1
+
+    @staticmethod
+    def _bucket_key(device_id: str, width: int, bucket_start: int, watermark: Watermark) -> Hashable:
+        return device_id, width, bucket_start, watermark.late_version
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            bucket_lookups = self.bucket_hits + self.bucket_misses
+            return {
+                "responses": self._responses.stats()["entries"],
+                "buckets": self._buckets.stats()["entries"],
+                "hits": self.hits,
+                "misses": self.misses,
+                "not_modified": self.not_modified,
+                "bypassed": self.bypassed,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "bucket_hits": self.bucket_hits,
+                "bucket_misses": self.bucket_misses,
+                "bucket_hit_rate": self.bucket_hits / bucket_lookups if bucket_lookups else 0.0,
+            }
+
+
+__all__ = ["EMPTY_BUCKET", "HistoryCache", "Watermark"]
@@ -1,13 +1,20 @@
 import json
 import logging
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from dataclasses import dataclass
-from typing import Dict
+from typing import Dict, Hashable, List, Optional, Sequence
 
 try:
     import google.generativeai as genai
 except ImportError:  # pragma: no cover - optional dependency check
     genai = None
 
+from .batching import SummaryBatcher
+from .breaker import CircuitBreaker, CircuitOpenError, LatencyTracker
+from .cache import TTLCache
+
 logger = logging.getLogger(__name__)
 
 
@@ -19,13 +26,41 @@ class InsightContext:
     window_avg_c: float
     reason: str
     humidity: float
+    window_min_c: Optional[float] = None
+    window_max_c: Optional[float] = None
+    window_std_c: Optional[float] = None
+    rise_c: Optional[float] = None
+
+
+def _quantize(value: Optional[float], step: float) -> Optional[int]:
+    if value is None:
+        return None
+    return round(value / step)
 
 
 class InsightSummarizer:
-    def __init__(self, api_key: str, model: str) -> None:
+    def __init__(
+        self,
+        api_key: str,
+        model: str,
+        cache_size: int = 0,
+        cache_ttl: float = 300.0,
+        cache_temp_step: float = 0.2,
+        cache_humidity_step: float = 2.0,
+        batch_size: int = 1,
+        batch_window_ms: int = 300,
+        timeout_seconds: float = 8.0,
+        max_concurrency: int = 4,
+        breaker_failures: int = 5,
+        breaker_reset_seconds: float = 30.0,
+        breaker_half_open: int = 1,
+    ) -> None:
         self.model_id = model
         self.enabled = bool(api_key)
         self._model = None
+        self._cache: Optional[TTLCache[Dict[str, str]]] = TTLCache(cache_size, cache_ttl) if cache_size > 0 else None
+        self._cache_temp_step = cache_temp_step
+        self._cache_humidity_step = cache_humidity_step
         if self.enabled and genai is not None:
             try:
                 genai.configure(api_key=api_key)
@@ -33,35 +68,160 @@ class InsightSummarizer:
             except Exception as exc:  # pragma: no cover - runtime configuration error
                 logger.warning("gemini_init_failed", extra={"error": str(exc)})
                 self.enabled = False
+        self._batcher: Optional[SummaryBatcher] = None
+        if batch_size > 1:
+            self._batcher = SummaryBatcher(self._generate_batch, batch_size, batch_window_ms)
+        # generate_content has no deadline of its own, so calls run on a
+        # dedicated pool and the caller stops waiting after timeout_seconds.
+        self.timeout_seconds = timeout_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_concurrency), thread_name_prefix="gemini-call")
+        self._breaker = CircuitBreaker(breaker_failures, breaker_reset_seconds, breaker_half_open)
+        self._latency = LatencyTracker()
+        self.timeouts = 0
+
+    def close(self) -> None:
+        if self._batcher is not None:
+            self._batcher.stop()
+        self._executor.shutdown(wait=False, cancel_futures=True)
 
     def summarize(self, context: InsightContext) -> Dict[str, str]:
         fallback = self._fallback(context)
         if not self.enabled or self._model is None:
             return fallback
 
-        prompt = (
-            "Anda adalah asisten IoT yang ringkas. "
-            "Gunakan Bahasa Indonesia formal singkat maksimal 2 kalimat. "
-            "Buat JSON dengan kunci summary dan recommendation. "
-            "summary merangkum kondisi suhu & kelembapan, recommendation berikan aksi singkat.\n"
+        try:
+            if self._cache is None:
+                data = self._guarded_call(context)
+            else:
+                data = self._cache.get_or_load(self.cache_key(context), lambda: self._guarded_call(context))
+        except CircuitOpenError:
+            return fallback
+        except FutureTimeoutError:
+            logger.warning("gemini_summarization_timeout", extra={"timeout": self.timeout_seconds})
+            return fallback
+        except Exception as exc:  # pragma: no cover - network/runtime error path
+            logger.warning("gemini_summarization_failed", extra={"error": str(exc)})
+            return fallback
+        summary = str(data.get("summary") or fallback["summary"])
+        recommendation = str(data.get("recommendation") or fallback["recommendation"])
+        return {"summary": summary, "recommendation": recommendation}
+
+    def cache_key(self, context: InsightContext) -> Hashable:
+        """Contexts mapping to the same key produce an equivalent prompt."""
+        temp_step = self._cache_temp_step
+        return (
+            context.level,
+            context.reason,
+            _quantize(context.temp_c, temp_step),
+            _quantize(context.window_avg_c, temp_step),
+            _quantize(context.window_min_c, temp_step),
+            _quantize(context.window_max_c, temp_step),
+            _quantize(context.humidity, self._cache_humidity_step),
+        )
+
+    def cache_stats(self) -> Dict[str, float]:
+        return self._cache.stats() if self._cache is not None else {}
+
+    def batch_stats(self) -> Dict[str, float]:
+        return self._batcher.stats() if self._batcher is not None else {}
+
+    def call_stats(self) -> Dict[str, object]:
+        return {
+            "breaker": self._breaker.stats(),
+            "latency": self._latency.percentiles(),
+            "timeouts": self.timeouts,
+        }
+
+    def _guarded_call(self, context: InsightContext) -> Dict[str, str]:
+        """Run one upstream call within the latency budget, feeding the breaker."""
+        if not self._breaker.allow():
+            raise CircuitOpenError("gemini circuit open")
+        started = time.monotonic()
+        future: Future
+        if self._batcher is not None:
+            future = self._batcher.submit(context)
+        else:
+            future = self._executor.submit(self._generate, context)
+        try:
+            data = future.result(timeout=self.timeout_seconds)
+        except FutureTimeoutError:
+            self.timeouts += 1
+            self._latency.record(time.monotonic() - started)
+            self._breaker.record_failure()
+            raise
+        except KeyError:
+            # Item missing from an otherwise healthy batch reply: the upstream
+            # call worked, and a half-open probe must still close the breaker.
+            self._latency.record(time.monotonic() - started)
+            self._breaker.record_success()
+            raise
+        except Exception:
+            self._latency.record(time.monotonic() - started)
+            self._breaker.record_failure()
+            raise
+        self._latency.record(time.monotonic() - started)
+        self._breaker.record_success()
+        return data
+
+    @staticmethod
+    def _context_lines(context: InsightContext) -> str:
+        lines = (
             f"Level: {context.level}\n"
             f"Suhu saat ini: {context.temp_c:.2f}°C\n"
             f"Rata-rata 15 menit: {context.window_avg_c:.2f}°C\n"
             f"Kelembapan: {context.humidity:.2f}%\n"
-            f"Alasan: {context.reason}\n"
-            "Jawaban wajib berupa JSON valid."
         )
+        if context.window_min_c is not None and context.window_max_c is not None:
+            lines += f"Rentang 15 menit: {context.window_min_c:.2f}°C - {context.window_max_c:.2f}°C\n"
+        return lines + f"Alasan: {context.reason}\n"
 
-        try:
-            response = self._model.generate_content(prompt)
-            text = self._extract_text(response)
-            data = json.loads(text)
-            summary = str(data.get("summary") or fallback["summary"])
-            recommendation = str(data.get("recommendation") or fallback["recommendation"])
-            return {"summary": summary, "recommendation": recommendation}
-        except Exception as exc:  # pragma: no cover - network/runtime error path
-            logger.warning("gemini_summarization_failed", extra={"error": str(exc)})
-            return fallback
+    def _build_prompt(self, context: InsightContext) -> str:
+        return (
+            "Anda adalah asisten IoT yang ringkas. "
+            "Gunakan Bahasa Indonesia formal singkat maksimal 2 kalimat. "
+            "Buat JSON dengan kunci summary dan recommendation. "
+            "summary merangkum kondisi suhu & kelembapan, recommendation berikan aksi singkat.\n"
+            + self._context_lines(context)
+            + "Jawaban wajib berupa JSON valid."
+        )
+
+    def _build_batch_prompt(self, contexts: Sequence[InsightContext]) -> str:
+        sections: List[str] = []
+        for context in contexts:
+            sections.append(f"device_id: {context.device_id}\n" + self._context_lines(context))
+        return (
+            "Anda adalah asisten IoT yang ringkas. "
+            "Gunakan Bahasa Indonesia formal singkat maksimal 2 kalimat per perangkat. "
+            "Untuk setiap perangkat di bawah, buat objek JSON dengan kunci device_id, summary dan recommendation. "
+            "summary merangkum kondisi suhu & kelembapan, recommendation berikan aksi singkat.\n\n"
+            + "\n".join(sections)
+            + "\nJawaban wajib berupa JSON array valid dengan satu objek per device_id."
+        )
+
+    def _generate(self, context: InsightContext) -> Dict[str, str]:
+        """Call Gemini once; raises on any transport or parsing failure."""
+        response = self._model.generate_content(self._build_prompt(context))
+        data = json.loads(self._extract_text(response))
+        if not isinstance(data, dict):
+            raise ValueError("Gemini response is not a JSON object")
+        return data
+
+    def _generate_batch(self, contexts: Sequence[InsightContext]) -> Dict[str, Dict[str, str]]:
+        """Summarize several devices with one call; malformed items are left out."""
+        response = self._model.generate_content(self._build_batch_prompt(contexts))
+        data = json.loads(self._extract_text(response))
+        if not isinstance(data, list):
+            raise ValueError("Gemini batch response is not a JSON array")
+        wanted = {context.device_id for context in contexts}
+        results: Dict[str, Dict[str, str]] = {}
+        for item in data:
+            if not isinstance(item, dict):
+                continue
+            device_id = item.get("device_id")
+            if device_id not in wanted or not isinstance(item.get("summary"), str) or not item["summary"]:
+                continue
+            results[device_id] = item
+        return results
 
     @staticmethod
     def _extract_text(response) -> str:
@@ -1,25 +1,57 @@
 import asyncio
 import logging
+import sqlite3
 from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from itertools import islice
+from typing import Iterable, Iterator, Optional
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Header, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
 
+from .archive import RetentionJob
 from .config import Settings
+from .history import BUCKET_FIELDS, BUCKET_MS, MINUTE, RAW_FIELDS, HistoryReader, Point, bucket_size, encode_csv, encode_ndjson, parse_ms
+from .history_cache import HistoryCache
 from .service import InsightEngine
+from .storage import ReadPool
 
 logging.basicConfig(level=logging.INFO, format="%(message)s")
 
 settings = Settings()
 engine = InsightEngine(settings)
+read_pool = ReadPool(settings.db_path, settings.history_pool_size)
+history_reader = HistoryReader(read_pool, settings.history_page_size, settings.archive_dir)
+history_cache: Optional[HistoryCache] = None
+if settings.history_cache_size > 0:
+    history_cache = HistoryCache(
+        history_reader, settings.history_cache_size, settings.history_cache_buckets, settings.history_cache_max_bytes
+    )
+retention: Optional[RetentionJob] = None
+if settings.retention_days > 0 and settings.worker_index == 0:
+    retention = RetentionJob(
+        settings.db_path,
+        settings.archive_dir,
+        settings.retention_days,
+        settings.retention_chunk_size,
+        settings.retention_interval_seconds,
+    )
+
+DEFAULT_HISTORY_SPAN_MS = int(timedelta(hours=24).total_seconds() * 1000)
 
 
 @asynccontextmanager
 async def lifespan(_: FastAPI):
     await asyncio.to_thread(engine.start)
+    if retention is not None:
+        retention.start()
     try:
         yield
     finally:
+        if retention is not None:
+            await asyncio.to_thread(retention.stop)
         await asyncio.to_thread(engine.stop)
+        read_pool.close()
 
 
 app = FastAPI(
@@ -33,3 +65,96 @@ app = FastAPI(
 @app.get("/healthz")
 async def healthz():
     return {"status": "ok"}
+
+
+@app.get("/metrics")
+async def metrics():
+    stats = {**engine.stats(), "history_pool": read_pool.stats()}
+    if history_cache is not None:
+        stats["history_cache"] = history_cache.stats()
+    if retention is not None:
+        stats["retention"] = retention.stats()
+    return stats
+
+
+def _encode(rows: Iterable[Point], format: str, bucketed: bool) -> Iterator[bytes]:
+    if format == "csv":
+        return encode_csv(rows, BUCKET_FIELDS if bucketed else RAW_FIELDS)
+    return encode_ndjson(rows)
+
+
+@app.get("/history")
+def history(
+    device_id: Optional[str] = None,
+    start: Optional[str] = Query(None, alias="from"),
+    end: Optional[str] = Query(None, alias="to"),
+    points: Optional[int] = Query(None, ge=1),
+    after: Optional[str] = None,
+    after_device: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1),
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    if_none_match: Optional[str] = Header(None),
+):
+    try:
+        end_ms = parse_ms(end) if end else round(datetime.now(timezone.utc).timestamp() * 1000)
+        if start:
+            start_ms = parse_ms(start)
+        else:
+            # Rounded to the rollup minute, so default requests share a cache key until it rolls over.
+            start_ms = end_ms - DEFAULT_HISTORY_SPAN_MS
+            start_ms -= start_ms % BUCKET_MS[MINUTE]
+        if after:
+            parse_ms(after)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=f"Timestamp tidak valid: {exc}") from exc
+    if start_ms >= end_ms:
+        raise HTTPException(status_code=400, detail="Parameter from harus lebih awal dari to")
+    if points is not None and points > settings.history_max_points:
+        raise HTTPException(status_code=400, detail=f"points maksimal {settings.history_max_points}")
+
+    width = bucket_size(start_ms, end_ms, points) if points else None
+    if width is not None:
+        # Whole buckets only, so repeated polls within one bucket share a cache key.
+        start_ms -= start_ms % width
+        end_ms = -(-end_ms // width) * width
+
+    try:
+        # Opens (or checks out) a pooled connection up front so a missing
+        # database or an exhausted pool is reported before streaming starts.
+        history_reader.layout()
+        watermark = history_cache.watermark(device_id) if history_cache is not None and device_id else None
+    except (sqlite3.Error, TimeoutError) as exc:
+        raise HTTPException(status_code=503, detail=str(exc)) from exc
+
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    headers = {}
+    if width is not None:
+        headers["X-History-Bucket-Ms"] = str(width)
+    if watermark is None:
+        rows = history_reader.stream(device_id, start_ms, end_ms, width, after, after_device, limit)
+        return StreamingResponse(_encode(rows, format, width is not None), media_type=media_type, headers=headers)
+
+    if width is None:
+        # Nothing exists past the watermark, so later end bounds share one key.
+        end_ms = max(start_ms, min(end_ms, watermark.max_ts_ms + 1))
+    key = (device_id, start_ms, end_ms, width, after, limit, format)
+    etag = history_cache.etag(key, watermark, end_ms)
+    headers["ETag"] = etag
+    if history_cache.not_modified_for(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    body = history_cache.get(key, etag)
+    if body is not None:
+        return Response(body, media_type=media_type, headers=headers)
+
+    if width is None:
+        rows = history_reader.stream(device_id, start_ms, end_ms, None, after, None, limit)
+    else:
+        first = start_ms
+        if after:
+            first = max(first, parse_ms(after) + width)
+            first -= first % width
+        rows = iter(history_cache.buckets(device_id, first, end_ms, width, watermark) if first < end_ms else [])
+        if limit is not None:
+            rows = islice(rows, limit)
+    chunks = history_cache.tee(key, etag, _encode(rows, format, width is not None))
+    return StreamingResponse(chunks, media_type=media_type, headers=headers)
@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+import math
+from dataclasses import dataclass
 from datetime import datetime, timezone
 from typing import Optional
 
@@ -16,6 +18,19 @@ def parse_iso8601(value: str) -> datetime:
     return dt.astimezone(timezone.utc)
 
 
+@dataclass
+class Reading:
+    ts: datetime
+    temp_c: float
+    humidity: float
+    rssi: Optional[int]
+
+
+# Plausible RSSI in dBm; anything else is a firmware bug, not a reading.
+RSSI_MIN = -200
+RSSI_MAX = 0
+
+
 class TelemetryMessage(BaseModel):
     device_id: str = Field(..., alias="device_id")
     ts: datetime = Field(..., alias="ts")
@@ -31,6 +46,19 @@ class TelemetryMessage(BaseModel):
             raise ValueError("device_id is required")
         return value
 
+    @validator("temp_c", "humidity")
+    def validate_finite(cls, value):  # type: ignore[override]
+        # One NaN/inf sample would poison the window's running sums until it empties.
+        if not math.isfinite(value):
+            raise ValueError("must be a finite number")
+        return value
+
+    @validator("rssi")
+    def validate_rssi(cls, value):  # type: ignore[override]
+        if value is not None and not RSSI_MIN <= value <= RSSI_MAX:
+            raise ValueError(f"rssi must be between {RSSI_MIN} and {RSSI_MAX}")
+        return value
+
     @validator("ts", pre=True)
     def validate_ts(cls, value):  # type: ignore[override]
         if isinstance(value, datetime):
@@ -54,6 +82,10 @@ class InsightMessage(BaseModel):
     last_temp_c: float
     window_avg_c: float
     recommendation: Optional[str] = None
+    window_min_c: Optional[float] = None
+    window_max_c: Optional[float] = None
+    window_std_c: Optional[float] = None
+    rise_c: Optional[float] = None
 
     @validator("device_id")
     def validate_device_id(cls, value):  # type: ignore[override]
@@ -0,0 +1,62 @@
+import zlib
+from typing import Iterable, Optional, Tuple
+
+
+class Partition:
+    """Device-hash partition of the telemetry stream for multi-worker deployments.
+
+    Worker ``index`` of ``count`` owns every device whose ``crc32(device_id)``
+    modulo ``count`` equals ``index``. The hash is stable across processes
+    and restarts (unlike ``hash()``), so all readings of a device land on the
+    same worker and per-device ordering, windows and cooldowns stay local.
+
+    This is fan-out with local filtering: every worker subscribes to the
+    whole stream and drops foreign devices by topic before decoding, so the
+    broker delivers each message N times and only decode and processing are
+    divided. A ``$share/...`` group would split the receive cost, but brokers
+    balance it per message, which scatters a device across workers; explicit
+    per-partition topics would need publishers to know the hash and
+    ``WORKER_COUNT``, which firmware does not.
+    """
+
+    def __init__(self, index: int, count: int, topic_filters: Iterable[str] = ()) -> None:
+        if count < 1 or not 0 <= index < count:
+            raise ValueError(f"Invalid partition {index}/{count}")
+        self.index = index
+        self.count = count
+        # "siapsuhu/telemetry/#" -> "siapsuhu/telemetry/"; filters without a
+        # trailing wildcard carry no device segment and are not pre-filtered.
+        self._prefixes: Tuple[str, ...] = tuple(
+            topic[:-1] for topic in topic_filters if topic.endswith("/#")
+        )
+        self.skipped = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.count > 1
+
+    def owns(self, device_id: str) -> bool:
+        return self.count == 1 or zlib.crc32(device_id.encode("utf-8")) % self.count == self.index
+
+    def topic_device(self, topic: str) -> Optional[str]:
+        for prefix in self._prefixes:
+            if topic.startswith(prefix):
+                device_id = topic[len(prefix) :].split("/", 1)[0]
+                return device_id or None
+        return None
+
+    def skip_topic(self, topic: str) -> bool:
+        """True when ``topic`` names a device owned by another worker (checked before decoding)."""
+        if self.count == 1:
+            return False
+        device_id = self.topic_device(topic)
+        if device_id is None or self.owns(device_id):
+            return False
+        self.skipped += 1
+        return True
+
+    def stats(self):
+        return {"index": self.index, "count": self.count, "skipped": self.skipped}
+
+
+__all__ = ["Partition"]
@@ -0,0 +1,295 @@
+import json
+import logging
+import operator
+import os
+import re
+import threading
+import time
+from fnmatch import translate
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Reading metrics are passed to compiled rules as one tuple in this order.
+METRICS = ("current", "avg", "min", "max", "rise", "rise_seconds", "humidity")
+_METRIC_INDEX = {name: index for index, name in enumerate(METRICS)}
+Metrics = Tuple[float, float, float, float, float, float, Optional[float]]
+
+_OPERATORS: Dict[str, Callable[[Any, Any], bool]] = {
+    "gt": operator.gt,
+    "gte": operator.ge,
+    "lt": operator.lt,
+    "lte": operator.le,
+}
+SEVERITY = {"OK": 0, "WARN": 1, "ALERT": 2}
+OK_REASON = "Suhu dalam rentang aman."
+
+
+class RuleConfigError(ValueError):
+    pass
+
+
+class Rule:
+    """One compiled rule: ``matches(metrics)`` is a chain of closures, no lookups by name."""
+
+    __slots__ = ("level", "name", "matches", "_reason")
+
+    def __init__(self, level: str, name: str, matches: Callable[[Metrics], bool], reason: str) -> None:
+        self.level = level
+        self.name = name
+        self.matches = matches
+        self._reason = reason
+
+    def reason(self, metrics: Metrics) -> str:
+        # Only rendered for readings that are actually published.
+        try:
+            return self._reason.format(**dict(zip(METRICS, metrics)))
+        except (TypeError, ValueError):  # e.g. a humidity placeholder while humidity is null
+            return f"Aturan {self.name} terpenuhi."
+
+
+OK_RULE = Rule("OK", "ok", lambda metrics: True, OK_REASON)
+
+
+def _condition(metric: str, op: str, value: float) -> Callable[[Metrics], bool]:
+    index = _METRIC_INDEX[metric]
+    compare = _OPERATORS[op]
+    if metric == "humidity":
+        # Firmware without a humidity sensor sends null; such rules never match.
+        return lambda metrics: metrics[index] is not None and compare(metrics[index], value)
+    return lambda metrics: compare(metrics[index], value)
+
+
+def _all_of(conditions: Sequence[Callable[[Metrics], bool]]) -> Callable[[Metrics], bool]:
+    if len(conditions) == 1:
+        return conditions[0]
+    if len(conditions) == 2:
+        first, second = conditions
+        return lambda metrics: first(metrics) and second(metrics)
+    head, rest = conditions[0], _all_of(conditions[1:])
+    return lambda metrics: head(metrics) and rest(metrics)
+
+
+def compile_rule(spec: Dict[str, Any], where: str) -> Rule:
+    if not isinstance(spec, dict):
+        raise RuleConfigError(f"{where}: aturan harus berupa objek")
+    level = str(spec.get("level", "")).upper()
+    if level not in ("WARN", "ALERT"):
+        raise RuleConfigError(f"{where}: level harus WARN atau ALERT")
+    when = spec.get("when")
+    if not isinstance(when, dict) or not when:
+        raise RuleConfigError(f"{where}: when wajib berisi minimal satu kondisi")
+    conditions = []
+    for metric, bounds in when.items():
+        if metric not in _METRIC_INDEX or metric == "rise_seconds":
+            raise RuleConfigError(f"{where}: metrik {metric!r} tidak dikenal")
+        if not isinstance(bounds, dict) or not bounds:
+            raise RuleConfigError(f"{where}: kondisi {metric!r} harus berupa objek seperti {{\"gte\": 35}}")
+        for op, value in bounds.items():
+            if op not in _OPERATORS or isinstance(value, bool) or not isinstance(value, (int, float)):
+                raise RuleConfigError(f"{where}: kondisi {metric} {op} {value!r} tidak valid")
+            conditions.append(_condition(metric, op, float(value)))
+    reason = str(spec.get("reason") or "") or f"Aturan {spec.get('name') or where} terpenuhi (suhu {{current:.1f}}°C)."
+    try:
+        reason.format(**{name: 0.0 for name in METRICS})
+    except Exception as exc:  # any template error, e.g. "{current[0]}" or "{current.x}"
+        raise RuleConfigError(f"{where}: reason tidak valid: {exc}") from exc
+    return Rule(level, str(spec.get("name") or where), _all_of(conditions), reason)
+
+
+class RuleSet:
+    """Rules of one device group, most severe first; ``evaluate`` is O(rules)."""
+
+    __slots__ = ("name", "rules")
+
+    def __init__(self, name: str, rules: Sequence[Rule]) -> None:
+        self.name = name
+        # Stable sort keeps the configured order within a severity.
+        self.rules = tuple(sorted(rules, key=lambda rule: -SEVERITY[rule.level]))
+
+    def evaluate(self, metrics: Metrics) -> Rule:
+        for rule in self.rules:
+            if rule.matches(metrics):
+                return rule
+        return OK_RULE
+
+
+def default_rule_specs(warn_threshold: float, alert_threshold: float, alert_delta: float) -> List[Dict[str, Any]]:
+    """The historical global rules, as configuration."""
+    return [
+        {
+            "name": "alert-threshold",
+            "level": "ALERT",
+            "when": {"current": {"gte": alert_threshold}},
+            "reason": f"Suhu {{current:.1f}}°C melebihi ambang ALERT {alert_threshold:.1f}°C.",
+        },
+        {
+            "name": "alert-rise",
+            "level": "ALERT",
+            "when": {"rise": {"gte": alert_delta}},
+            "reason": f"Suhu naik {{rise:.1f}}°C dalam {{rise_seconds:.0f}} detik, melampaui batas kenaikan {alert_delta:.1f}°C.",
+        },
+        {
+            "name": "warn-threshold",
+            "level": "WARN",
+            "when": {"current": {"gte": warn_threshold}},
+            "reason": f"Suhu {{current:.1f}}°C melebihi ambang WARN {warn_threshold:.1f}°C.",
+        },
+    ]
+
+
+@lru_cache(maxsize=16)
+def default_rule_set(warn_threshold: float, alert_threshold: float, alert_delta: float) -> RuleSet:
+    specs = default_rule_specs(warn_threshold, alert_threshold, alert_delta)
+    return RuleSet("default", [compile_rule(spec, spec["name"]) for spec in specs])
+
+
+class CompiledRules:
+    """A parsed rule file: device groups resolved by exact id, then glob, in file order.
+
+    Resolution results are cached per device id, so the glob patterns are
+    matched once per device and configuration rather than once per reading.
+    """
+
+    def __init__(self, document: Dict[str, Any], defaults: RuleSet, cache_size: int = 100_000) -> None:
+        if not isinstance(document, dict):
+            raise RuleConfigError("konfigurasi aturan harus berupa objek JSON")
+        self.default = defaults
+        if "default" in document:
+            self.default = RuleSet("default", self._compile_rules(document["default"], "default"))
+        self._exact: Dict[str, RuleSet] = {}
+        self._globs: List[Tuple[Callable[[str], Any], RuleSet]] = []
+        groups = document.get("groups", [])
+        if not isinstance(groups, list):
+            raise RuleConfigError("groups harus berupa daftar")
+        for position, group in enumerate(groups):
+            name = str(group.get("name") or f"groups[{position}]") if isinstance(group, dict) else ""
+            if not name or not isinstance(group.get("devices"), list) or not group["devices"]:
+                raise RuleConfigError(f"groups[{position}]: devices wajib berisi id atau pola glob")
+            rule_set = RuleSet(name, self._compile_rules(group, name))
+            for pattern in group["devices"]:
+                pattern = str(pattern)
+                if any(char in pattern for char in "*?["):
+                    self._globs.append((re.compile(translate(pattern)).match, rule_set))
+                else:
+                    self._exact.setdefault(pattern, rule_set)
+        self.groups = len(groups)
+        self.resolve = lru_cache(maxsize=cache_size)(self._resolve)
+
+    @staticmethod
+    def _compile_rules(group: Any, where: str) -> List[Rule]:
+        rules = group.get("rules") if isinstance(group, dict) else None
+        if not isinstance(rules, list):
+            raise RuleConfigError(f"{where}: rules harus berupa daftar")
+        return [compile_rule(spec, f"{where}.rules[{index}]") for index, spec in enumerate(rules)]
+
+    def _resolve(self, device_id: str) -> RuleSet:
+        rule_set = self._exact.get(device_id)
+        if rule_set is not None:
+            return rule_set
+        for match, rule_set in self._globs:
+            if match(device_id):
+                return rule_set
+        return self.default
+
+
+class RuleBook:
+    """Per-device-group rules loaded from ``path`` and reloaded when the file changes.
+
+    Without a file the historical global thresholds apply. The file is
+    checked at most every ``reload_seconds`` from the reading path itself;
+    a reload swaps in a freshly compiled ``CompiledRules`` (with an empty
+    resolution cache) in one assignment, so readers never lock. A file that
+    fails to load is logged, the previous rules stay active and the file is
+    tried again at the next check.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        defaults: RuleSet,
+        reload_seconds: float = 5.0,
+        cache_size: int = 100_000,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.path = path
+        self.defaults = defaults
+        self.reload_seconds = reload_seconds
+        self.cache_size = cache_size
+        self._clock = clock
+        self._reload_lock = threading.Lock()
+        self._version: Optional[Tuple[int, int]] = None
+        self._next_check = 0.0
+        self.reloads = 0
+        self.reload_failed = 0
+        self._rules = CompiledRules({}, defaults, cache_size)
+        self.reload()
+
+    def for_device(self, device_id: str) -> RuleSet:
+        if self.reload_seconds > 0 and self._clock() >= self._next_check:
+            self.reload()
+        return self._rules.resolve(device_id)
+
+    def reload(self) -> bool:
+        """Recompile if the file changed since the last load; True when new rules were installed."""
+        if not self._reload_lock.acquire(blocking=False):
+            return False
+        try:
+            self._next_check = self._clock() + self.reload_seconds
+            try:
+                stat = os.stat(self.path) if self.path else None
+            except FileNotFoundError:
+                stat = None
+            except OSError as exc:
+                self.reload_failed += 1
+                logger.error("rules_reload_failed", extra={"path": self.path, "error": str(exc)})
+                return False
+            version = (stat.st_mtime_ns, stat.st_size) if stat is not None else None
+            if version == self._version:
+                return False
+            try:
+                document: Dict[str, Any] = {}
+                if version is not None:
+                    with open(self.path, "r", encoding="utf-8") as handle:
+                        document = json.load(handle)
+                rules = CompiledRules(document, self.defaults, self.cache_size)
+            except Exception as exc:
+                # Runs on the MQTT thread: never let a bad file escape into paho.
+                # The version is not recorded, so the file is retried next check.
+                self.reload_failed += 1
+                logger.error("rules_reload_failed", extra={"path": self.path, "error": str(exc)})
+                return False
+            self._version = version
+            self._rules = rules
+            self.reloads += 1
+            logger.info("rules_loaded", extra={"path": self.path if version is not None else None, "groups": rules.groups})
+            return True
+        finally:
+            self._reload_lock.release()
+
+    def stats(self) -> Dict[str, object]:
+        cache = self._rules.resolve.cache_info()
+        return {
+            "path": self.path if self._version is not None else None,
+            "groups": self._rules.groups,
+            "reloads": self.reloads,
+            "reload_failed": self.reload_failed,
+            "resolve_cache_hits": cache.hits,
+            "resolve_cache_misses": cache.misses,
+            "resolve_cache_size": cache.currsize,
+        }
+
+
+__all__ = [
+    "CompiledRules",
+    "METRICS",
+    "OK_RULE",
+    "Rule",
+    "RuleBook",
+    "RuleConfigError",
+    "RuleSet",
+    "compile_rule",
+    "default_rule_set",
+    "default_rule_specs",
+]
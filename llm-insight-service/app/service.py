@@ -1,28 +1,31 @@
-import json
 import logging
+import sqlite3
 import threading
 import time
-from collections import defaultdict, deque
-from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
-from typing import Deque, Dict, Optional, Tuple
+from pathlib import Path
+from typing import Dict, Optional, Tuple
 
 import paho.mqtt.client as mqtt
 
 from .config import Settings
+from .emission import EmissionPolicy
 from .llm import InsightContext, InsightSummarizer
-from .models import InsightMessage, TelemetryMessage
+from .decoder import TelemetryDecoder
+from .device_state import DeviceStateTable
+from .models import InsightMessage, Reading
+from .partition import Partition
+from .rules import RuleBook, default_rule_set
+from .storage import ReadingWriter
+from .warmstart import StateSnapshotter, encode_snapshot, read_snapshot, recent_samples, snapshot_samples
+from .window import APPENDED, DUPLICATE, REORDERED, STALE, RollingWindow
+from .workers import DeviceWorkerPool
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
-
-@dataclass
-class Reading:
-    ts: datetime
-    temp_c: float
-    humidity: float
-    rssi: Optional[int]
+LAYOUT_FLAT = "flat"
+LAYOUT_LEVEL = "level"
 
 
 def determine_level(
@@ -31,32 +34,38 @@ def determine_level(
     warn_threshold: float,
     alert_threshold: float,
     alert_delta: float,
+    delta_horizon: float = 120.0,
 ) -> Tuple[str, str]:
-    """Return level and rule-based reason."""
-    temp = current.temp_c
-
-    if temp >= alert_threshold:
-        return "ALERT", f"Suhu {temp:.1f}°C melebihi ambang ALERT {alert_threshold:.1f}°C."
+    """Return level and rule-based reason under the global default rules.
 
+    ``previous`` is the baseline for the delta rule; the engine passes the
+    lowest reading inside the delta horizon so gradual rises are caught too.
+    The engine itself evaluates per-device-group rules from ``RuleBook``.
+    """
+    rise = rise_seconds = 0.0
     if previous is not None:
-        delta_temp = temp - previous.temp_c
-        delta_seconds = (current.ts - previous.ts).total_seconds()
-        if delta_temp >= alert_delta and delta_seconds <= 120:
-            return (
-                "ALERT",
-                f"Suhu naik {delta_temp:.1f}°C dalam {int(delta_seconds)} detik, melampaui batas kenaikan {alert_delta:.1f}°C.",
-            )
-
-    if temp >= warn_threshold:
-        return "WARN", f"Suhu {temp:.1f}°C melebihi ambang WARN {warn_threshold:.1f}°C."
-
-    return "OK", "Suhu dalam rentang aman."
+        rise_seconds = (current.ts - previous.ts).total_seconds()
+        if rise_seconds <= delta_horizon:
+            rise = current.temp_c - previous.temp_c
+    temp = current.temp_c
+    metrics = (temp, temp, temp, temp, rise, rise_seconds, current.humidity)
+    # default_rule_set is an lru_cache keyed by the thresholds: compiled once, not per call.
+    rule = default_rule_set(warn_threshold, alert_threshold, alert_delta).evaluate(metrics)
+    return rule.level, rule.reason(metrics)
 
 
 class InsightEngine:
     def __init__(self, settings: Settings) -> None:
         self.settings = settings
-        self._client = mqtt.Client(client_id=settings.mqtt_client_id, clean_session=True)
+        self._partition = Partition(
+            settings.worker_index, settings.worker_count, (settings.telemetry_topic, settings.telemetry_batch_topic)
+        )
+        client_id = settings.mqtt_client_id
+        if self._partition.enabled:
+            # The broker drops an existing session when a second client
+            # connects with the same id, so every worker needs its own.
+            client_id = f"{client_id}-{settings.worker_index}"
+        self._client = mqtt.Client(client_id=client_id, clean_session=True)
         if settings.mqtt_user:
             self._client.username_pw_set(settings.mqtt_user, settings.mqtt_pass)
         self._client.on_connect = self._on_connect
@@ -64,12 +73,80 @@ class InsightEngine:
         self._client.on_disconnect = self._on_disconnect
         self._client.reconnect_delay_set(min_delay=self.settings.mqtt_reconnect_initial, max_delay=self.settings.mqtt_reconnect_max)
         self._client.enable_logger()
-        self._buffers: Dict[str, Deque[Reading]] = defaultdict(deque)
-        self._lock = threading.Lock()
-        self._summarizer = InsightSummarizer(settings.gemini_api_key, settings.gemini_model)
-        self._last_alert: Dict[str, datetime] = {}
+        self._states = DeviceStateTable(
+            self._new_window,
+            stripes=settings.state_stripes,
+            max_devices=settings.state_max_devices,
+            idle_ttl=settings.state_idle_ttl_seconds,
+        )
+        self._counter_lock = threading.Lock()
+        self._summarizer = InsightSummarizer(
+            settings.gemini_api_key,
+            settings.gemini_model,
+            cache_size=settings.llm_cache_size,
+            cache_ttl=settings.llm_cache_ttl,
+            cache_temp_step=settings.llm_cache_temp_step,
+            cache_humidity_step=settings.llm_cache_humidity_step,
+            batch_size=settings.llm_batch_size,
+            batch_window_ms=settings.llm_batch_window_ms,
+            timeout_seconds=settings.llm_timeout_seconds,
+            max_concurrency=settings.llm_max_concurrency,
+            breaker_failures=settings.llm_breaker_failures,
+            breaker_reset_seconds=settings.llm_breaker_reset_seconds,
+            breaker_half_open=settings.llm_breaker_half_open,
+        )
+        self._emission = EmissionPolicy(
+            temp_epsilon=settings.insight_temp_epsilon,
+            avg_epsilon=settings.insight_avg_epsilon,
+            heartbeat_seconds=settings.insight_heartbeat_seconds,
+            alert_cooldown_seconds=settings.insight_alert_cooldown,
+            table=self._states,
+        )
+        self._rules = RuleBook(
+            settings.rules_path,
+            default_rule_set(settings.warn_threshold, settings.alert_threshold, settings.alert_delta),
+            reload_seconds=settings.rules_reload_seconds,
+            cache_size=settings.state_max_devices or 100_000,
+        )
+        self._decoder = TelemetryDecoder()
+        self._writer: Optional[ReadingWriter] = None
+        if settings.db_writer_enabled:
+            self._writer = ReadingWriter(
+                settings.db_path,
+                batch_size=settings.db_batch_size,
+                flush_ms=settings.db_flush_ms,
+                buffer_size=settings.db_buffer_size,
+                put_timeout=settings.db_put_timeout,
+            )
+        self._ingest_counters: Dict[str, int] = {DUPLICATE: 0, REORDERED: 0, STALE: 0, "foreign": 0, "mismatched": 0, "failed": 0}
+        self._workers = DeviceWorkerPool(settings.llm_max_concurrency, settings.llm_queue_size)
+        self._snapshot_path = settings.state_snapshot_path
+        if self._snapshot_path and self._partition.enabled:
+            self._snapshot_path = f"{self._snapshot_path}.{settings.worker_index}"
+        self._snapshotter: Optional[StateSnapshotter] = None
+        if self._snapshot_path and settings.state_snapshot_interval_seconds > 0:
+            self._snapshotter = StateSnapshotter(
+                self._snapshot_path, settings.state_snapshot_interval_seconds, self._encode_state
+            )
+        self._warm_start: Dict[str, float] = {}
+
+    def _new_window(self) -> RollingWindow:
+        return RollingWindow(
+            span=timedelta(minutes=self.settings.window_minutes),
+            delta_horizon=timedelta(seconds=self.settings.alert_delta_seconds),
+            capacity=self.settings.window_capacity,
+        )
 
     def start(self) -> None:
+        # Restore state before subscribing so the first readings after a
+        # deploy already see full windows and running cooldowns.
+        if self.settings.warm_start_enabled:
+            self.warm_start()
+        if self._snapshotter is not None:
+            self._snapshotter.start()
+        if self._writer is not None:
+            self._writer.start()
+        self._workers.start()
         delay = self.settings.mqtt_reconnect_initial
         while True:
             try:
@@ -91,11 +168,87 @@ class InsightEngine:
             self._client.disconnect()
         except Exception:  # pragma: no cover - shutdown path
             pass
+        self._workers.stop()
+        self._summarizer.close()
+        if self._writer is not None:
+            self._writer.stop()
+        if self._snapshotter is not None:
+            self._snapshotter.stop()
+
+    def warm_start(self, now: Optional[float] = None) -> Dict[str, float]:
+        """Refill windows and emission state from the last snapshot and SQLite.
+
+        The snapshot restores cooldowns and the windows as they were at save
+        time; readings stored in SQLite during the last window span are then
+        merged in (duplicates are skipped), which also covers the gap between
+        the last snapshot and the restart.
+        """
+        started = time.perf_counter()
+        if now is None:
+            now = time.time()
+        horizon = now - self.settings.window_minutes * 60
+        owns = self._partition.owns
+        result = {"snapshot_devices": 0, "emission_devices": 0, "db_devices": 0, "db_rows": 0}
+        snapshot = read_snapshot(self._snapshot_path) if self._snapshot_path else None
+        if snapshot is not None:
+            for device_id, columns in snapshot.get("windows", {}).items():
+                samples = snapshot_samples(columns)
+                if not owns(device_id) or not samples or samples[-1][0] < horizon:
+                    continue
+                with self._states.locked(device_id) as state:
+                    for sample in samples:
+                        state.window.add_epoch(*sample)
+                result["snapshot_devices"] += 1
+            result["emission_devices"] = self._emission.restore_state(snapshot.get("emission", {}), keep=owns)
+        if Path(self.settings.db_path).exists():
+            try:
+                for device_id, samples in recent_samples(
+                    self.settings.db_path, int(horizon * 1000), self.settings.warm_start_batch_size, keep=owns
+                ):
+                    with self._states.locked(device_id) as state:
+                        for sample in samples:
+                            state.window.add_epoch(*sample)
+                    result["db_devices"] += 1
+                    result["db_rows"] += len(samples)
+            except sqlite3.Error as exc:
+                logger.warning("warm_start_db_failed", extra={"error": str(exc)})
+        result["duration_ms"] = round((time.perf_counter() - started) * 1000, 3)
+        self._warm_start = result
+        logger.info("warm_start_done", extra=result)
+        return result
+
+    def _encode_state(self) -> bytes:
+        windows = self._states.collect(lambda device_id, state: state.window.samples())
+        return encode_snapshot(windows, self._emission.export_state(), time.time())
+
+    def stats(self) -> Dict[str, Dict[str, object]]:
+        return {
+            "decoder": self._decoder.stats(),
+            "ingest": self._ingest_stats(),
+            "device_state": self._states.stats(),
+            "sqlite_writer": self._writer.stats() if self._writer is not None else {},
+            "llm_queue": self._workers.stats(),
+            "emission": self._emission.stats(),
+            "rules": self._rules.stats(),
+            "llm_cache": self._summarizer.cache_stats(),
+            "llm_batch": self._summarizer.batch_stats(),
+            "llm_calls": self._summarizer.call_stats(),
+            "partition": self._partition.stats(),
+            "warm_start": dict(self._warm_start),
+            "state_snapshot": self._snapshotter.stats() if self._snapshotter is not None else {},
+        }
+
+    def _ingest_stats(self) -> Dict[str, int]:
+        with self._counter_lock:
+            return dict(self._ingest_counters)
 
     def _on_connect(self, client, userdata, flags, rc):
         if rc == 0:
-            logger.info("mqtt_connected", extra={"topic": self.settings.telemetry_topic})
-            client.subscribe(self.settings.telemetry_topic, qos=1)
+            logger.info(
+                "mqtt_connected",
+                extra={"topic": self.settings.telemetry_topic, "batch_topic": self.settings.telemetry_batch_topic},
+            )
+            client.subscribe([(self.settings.telemetry_topic, 1), (self.settings.telemetry_batch_topic, 1)])
         else:  # pragma: no cover - connection error path
             logger.error("mqtt_connect_error", extra={"rc": rc})
 
@@ -103,104 +256,142 @@ class InsightEngine:
         logger.warning("mqtt_disconnected", extra={"rc": rc})
 
     def _on_message(self, client, userdata, message):
+        # Every worker receives the whole stream; foreign devices are dropped
+        # from the topic alone so their payloads are never decoded here.
+        if self._partition.enabled and self._partition.skip_topic(message.topic):
+            return
         try:
-            payload = message.payload.decode("utf-8")
-            data = json.loads(payload)
-            telemetry = TelemetryMessage.parse_obj(data)
+            decoded = self._decoder.decode_many(message.payload)
         except Exception as exc:
             logger.warning("telemetry_parse_failed", extra={"error": str(exc)})
             return
 
-        reading = Reading(
-            ts=telemetry.ts,
-            temp_c=telemetry.temp_c,
-            humidity=telemetry.humidity,
-            rssi=telemetry.rssi,
-        )
-
-        with self._lock:
-            window = self._buffers[telemetry.device_id]
-            self._prune_old(window, reading.ts)
-            previous = window[-1] if window else None
-            window.append(reading)
-
-        level, reason = determine_level(
-            current=reading,
-            previous=previous,
-            warn_threshold=self.settings.warn_threshold,
-            alert_threshold=self.settings.alert_threshold,
-            alert_delta=self.settings.alert_delta,
-        )
-
-        window_avg = self._compute_average(window)
-        if not self._should_emit(level, telemetry.device_id, reading.ts):
+        for device_id, reading in decoded:
+            if not self._partition.owns(device_id):
+                self._drop_foreign(message.topic, device_id)
+                continue
+            try:
+                self._process_reading(device_id, reading)
+            except Exception as exc:
+                # paho re-raises callback errors and stops its network loop,
+                # so one bad reading must not end ingest for every device.
+                with self._counter_lock:
+                    self._ingest_counters["failed"] += 1
+                logger.exception("telemetry_process_failed", extra={"device": device_id, "error": str(exc)})
+
+    def _drop_foreign(self, topic: str, device_id: str) -> None:
+        # The topic named a device this worker owns, so the worker owning
+        # device_id skipped the message unread: no worker processes it.
+        mismatched = self._partition.topic_device(topic) is not None
+        with self._counter_lock:
+            self._ingest_counters["foreign"] += 1
+            if mismatched:
+                self._ingest_counters["mismatched"] += 1
+        if mismatched:
+            logger.warning("telemetry_topic_mismatch", extra={"topic": topic, "device_id": device_id})
+
+    def _process_reading(self, device_id: str, reading: Reading) -> None:
+        # Window update, rule evaluation and the emission decision are one
+        # critical section per device, so concurrent readings for the same
+        # device can neither see a half-updated window nor both pass a cooldown.
+        rules = self._rules.for_device(device_id)
+        with self._states.locked(device_id) as state:
+            window = state.window
+            outcome = window.add(reading)
+            if outcome == APPENDED:
+                # The window's rise is already limited to the delta horizon.
+                stats = window.stats()
+                metrics = (reading.temp_c, stats.avg_c, stats.min_c, stats.max_c, stats.rise_c, stats.rise_seconds, reading.humidity)
+                rule = rules.evaluate(metrics)
+                level = rule.level
+                emit = self._emission.decide_state(state, level, reading.temp_c, stats.avg_c, reading.ts) is not None
+
+        if outcome != APPENDED:
+            with self._counter_lock:
+                self._ingest_counters[outcome] += 1
+        if self._writer is not None and outcome != DUPLICATE:
+            self._writer.write(device_id, reading)
+        if outcome != APPENDED:
+            # QoS 1 redeliveries and late samples update the window at most;
+            # rules only run for a genuinely new latest reading.
+            return
+        if not emit:
             return
 
-        llm_result = self._summarizer.summarize(
-            InsightContext(
-                device_id=telemetry.device_id,
-                level=level,
-                temp_c=reading.temp_c,
-                window_avg_c=window_avg,
-                reason=reason,
-                humidity=reading.humidity,
-            )
+        window_avg = stats.avg_c
+        context = InsightContext(
+            device_id=device_id,
+            level=level,
+            temp_c=reading.temp_c,
+            window_avg_c=window_avg,
+            reason=rule.reason(metrics),
+            humidity=reading.humidity,
+            window_min_c=stats.min_c,
+            window_max_c=stats.max_c,
+            window_std_c=stats.std_c,
+            rise_c=stats.rise_c,
         )
-
+        # The LLM round-trip runs on the worker pool so the paho network thread
+        # keeps reading telemetry and sending keepalives meanwhile.
+        if not self._workers.submit(device_id, lambda: self._summarize_and_publish(context)):
+            logger.warning("insight_queue_full", extra={"device": device_id, "level": level})
+            # The fallback still takes the device's lane: published inline it
+            # could overtake (and in retained mode be overwritten by) an
+            # insight queued earlier for the same device.
+            fallback = InsightSummarizer._fallback(context)
+            self._workers.submit(device_id, lambda: self._publish_context(context, fallback), force=True)
+
+    def _summarize_and_publish(self, context: InsightContext) -> None:
+        self._publish_context(context, self._summarizer.summarize(context))
+
+    def _publish_context(self, context: InsightContext, llm_result: Dict[str, str]) -> None:
         insight = InsightMessage(
-            device_id=telemetry.device_id,
+            device_id=context.device_id,
             ts=datetime.now(tz=timezone.utc),
-            level=level,
+            level=context.level,
             summary=llm_result["summary"],
-            reason=reason,
-            last_temp_c=reading.temp_c,
-            window_avg_c=window_avg,
+            reason=context.reason,
+            last_temp_c=context.temp_c,
+            window_avg_c=context.window_avg_c,
             recommendation=llm_result.get("recommendation"),
+            window_min_c=context.window_min_c,
+            window_max_c=context.window_max_c,
+            window_std_c=context.window_std_c,
+            rise_c=context.rise_c,
         )
+        self._publish_insight(context.device_id, insight)
 
-        self._publish_insight(telemetry.device_id, insight)
-
-    def _prune_old(self, window: Deque[Reading], current_ts: datetime) -> None:
-        """Keep data within configured window."""
-        limit = current_ts - timedelta(minutes=self.settings.window_minutes)
-        while window and window[0].ts < limit:
-            window.popleft()
-
-    def _compute_average(self, window: Deque[Reading]) -> float:
-        if not window:
-            return 0.0
-        return sum(r.temp_c for r in window) / len(window)
-
-    def _should_emit(self, level: str, device_id: str, ts: datetime) -> bool:
-        if level != "ALERT":
-            if level == "WARN":
-                return True
-            self._last_alert.pop(device_id, None)
-            return True
-
-        cooldown = timedelta(seconds=self.settings.insight_alert_cooldown)
-        last = self._last_alert.get(device_id)
-        if last and ts - last < cooldown:
-            return False
-        self._last_alert[device_id] = ts
-        return True
+    def insight_topic(self, device_id: str, level: str) -> str:
+        prefix = self.settings.insight_topic_prefix
+        if self.settings.insight_topic_layout == LAYOUT_LEVEL:
+            # Consumers subscribe to e.g. ``siapsuhu/insight/alert/+`` and the
+            # broker filters; ``siapsuhu/insight/#`` still matches everything.
+            return f"{prefix}/{level.lower()}/{device_id}"
+        return f"{prefix}/{device_id}"
 
     def _publish_insight(self, device_id: str, insight: InsightMessage) -> None:
         payload = insight.json()
-        topic = f"{self.settings.insight_topic_prefix}/{device_id}"
+        topic = self.insight_topic(device_id, insight.level)
         result = self._client.publish(topic, payload=payload, qos=self.settings.publish_qos, retain=self.settings.publish_retain)
         if result.rc != mqtt.MQTT_ERR_SUCCESS:
             logger.error("insight_publish_failed", extra={"rc": result.rc})
-        else:
-            logger.info(
-                "insight_published",
-                extra={
-                    "topic": topic,
-                    "level": insight.level,
-                    "temp_c": insight.last_temp_c,
-                    "avg": insight.window_avg_c,
-                },
-            )
+            return
+        if self.settings.insight_latest_prefix:
+            # Retained, so a consumer that (re)connects gets every device's
+            # current state at once without replaying the insight stream.
+            latest = f"{self.settings.insight_latest_prefix}/{device_id}"
+            result = self._client.publish(latest, payload=payload, qos=self.settings.publish_qos, retain=True)
+            if result.rc != mqtt.MQTT_ERR_SUCCESS:
+                logger.error("insight_latest_publish_failed", extra={"rc": result.rc})
+        logger.info(
+            "insight_published",
+            extra={
+                "topic": topic,
+                "level": insight.level,
+                "temp_c": insight.last_temp_c,
+                "avg": insight.window_avg_c,
+            },
+        )
 
 
-__all__ = ["InsightEngine", "determine_level", "Reading"]
+__all__ = ["InsightEngine", "LAYOUT_FLAT", "LAYOUT_LEVEL", "determine_level", "Reading"]
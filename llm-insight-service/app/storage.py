@@ -0,0 +1,277 @@
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .models import Reading
+
+logger = logging.getLogger(__name__)
+
+Row = Tuple[str, Reading]
+
+LAYOUT_LEGACY = "legacy"
+LAYOUT_V2 = "v2"
+
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA temp_store=MEMORY",
+)
+
+
+def format_ts(reading: Reading) -> str:
+    return reading.ts.isoformat().replace("+00:00", "Z")
+
+
+def ts_ms(reading: Reading) -> int:
+    return round(reading.ts.timestamp() * 1000)
+
+
+def detect_layout(conn: sqlite3.Connection) -> str:
+    """``v2`` once scripts/migrate_readings_v2.py has swapped ``readings`` for a view."""
+    row = conn.execute("SELECT type FROM sqlite_master WHERE name = 'readings'").fetchone()
+    if row is not None and row[0] == "view":
+        return LAYOUT_V2
+    return LAYOUT_LEGACY
+
+
+def connect(db_path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(db_path, isolation_level=None, check_same_thread=False)
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+def connect_readonly(db_path: str) -> sqlite3.Connection:
+    uri = Path(db_path).absolute().as_uri() + "?mode=ro"
+    conn = sqlite3.connect(uri, uri=True, isolation_level=None, check_same_thread=False)
+    conn.execute("PRAGMA query_only=ON")
+    conn.execute("PRAGMA busy_timeout=5000")
+    return conn
+
+
+class ReadPool:
+    """Fixed-size pool of read-only connections for query endpoints.
+
+    In WAL mode readers work on a snapshot and never block the writer.
+    Connections are opened lazily; ``connection`` waits up to ``timeout``
+    seconds for a free one and raises ``TimeoutError`` after that.
+    """
+
+    def __init__(self, db_path: str, size: int, timeout: float = 5.0) -> None:
+        self.db_path = db_path
+        self.size = max(1, size)
+        self.timeout = timeout
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self.acquired = 0
+        self.waited = 0
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            self._idle.put(conn)
+
+    def _acquire(self) -> sqlite3.Connection:
+        with self._lock:
+            self.acquired += 1
+            try:
+                return self._idle.get_nowait()
+            except queue.Empty:
+                pass
+            if self._created < self.size:
+                self._created += 1
+                create = True
+            else:
+                self.waited += 1
+                create = False
+        if create:
+            try:
+                return connect_readonly(self.db_path)
+            except sqlite3.Error:
+                with self._lock:
+                    self._created -= 1
+                raise
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise TimeoutError("no free read connection") from None
+
+    def close(self) -> None:
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "size": self.size,
+                "open": self._created,
+                "idle": self._idle.qsize(),
+                "acquired": self.acquired,
+                "waited": self.waited,
+            }
+
+
+class ReadingWriter:
+    """Buffered SQLite writer with group commit.
+
+    Readings are queued by ``write`` and inserted by a background thread with
+    ``executemany`` in one transaction per batch, flushed every
+    ``batch_size`` rows or ``flush_ms`` after the first buffered row. When the
+    buffer is full, ``write`` blocks for up to ``put_timeout`` seconds
+    (backpressure on the MQTT thread) before dropping the row.
+
+    Inserts are idempotent on ``(device_id, ts)`` in both layouts, so rows
+    already stored (by a QoS 1 redelivery or by Node-RED) are counted as
+    ``duplicates`` instead of being written twice.
+    """
+
+    INSERT_SQL = {
+        # The legacy table has no unique key; idx_readings_device_ts makes the check an index probe.
+        LAYOUT_LEGACY: "INSERT INTO readings(device_id, ts, temp_c, humidity, rssi) SELECT ?1, ?2, ?3, ?4, ?5 "
+        "WHERE NOT EXISTS (SELECT 1 FROM readings WHERE device_id = ?1 AND ts = ?2)",
+        LAYOUT_V2: "INSERT OR IGNORE INTO readings_v2(device_id, ts_ms, temp_c, humidity, rssi) VALUES (?, ?, ?, ?, ?)",
+    }
+
+    def __init__(self, db_path: str, batch_size: int, flush_ms: int, buffer_size: int, put_timeout: float) -> None:
+        self.db_path = db_path
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_ms / 1000.0
+        self.put_timeout = put_timeout
+        self._queue: "queue.Queue[Optional[Row]]" = queue.Queue(maxsize=max(1, buffer_size))
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.written = 0
+        self.batches = 0
+        self.dropped = 0
+        self.failed = 0
+        self.blocked = 0
+        self.duplicates = 0
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        conn = connect(self.db_path)
+        self._thread = threading.Thread(target=self._run, args=(conn,), name="sqlite-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def write(self, device_id: str, reading: Reading) -> bool:
+        row = (device_id, reading)
+        try:
+            self._queue.put_nowait(row)
+            return True
+        except queue.Full:
+            pass
+        with self._lock:
+            self.blocked += 1
+        try:
+            self._queue.put(row, timeout=self.put_timeout)
+            return True
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            logger.warning("sqlite_buffer_full", extra={"device": device_id})
+            return False
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "buffered": self._queue.qsize(),
+                "written": self.written,
+                "batches": self.batches,
+                "blocked": self.blocked,
+                "dropped": self.dropped,
+                "failed": self.failed,
+                "duplicates": self.duplicates,
+            }
+
+    def _run(self, conn: sqlite3.Connection) -> None:
+        try:
+            stopping = False
+            while not stopping:
+                first = self._queue.get()
+                if first is None:
+                    break
+                batch: List[Row] = [first]
+                deadline = time.monotonic() + self.flush_interval
+                while len(batch) < self.batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        row = self._queue.get(timeout=remaining)
+                    except queue.Empty:
+                        break
+                    if row is None:
+                        stopping = True
+                        break
+                    batch.append(row)
+                self._flush(conn, batch)
+        finally:
+            conn.close()
+
+    def _flush(self, conn: sqlite3.Connection, batch: List[Row]) -> None:
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Checked per batch so a cutover by the migration script is
+                # picked up without restarting the service.
+                layout = detect_layout(conn)
+                to_ts = ts_ms if layout == LAYOUT_V2 else format_ts
+                rows = [
+                    (device_id, to_ts(reading), reading.temp_c, reading.humidity, reading.rssi)
+                    for device_id, reading in batch
+                ]
+                changes = conn.total_changes
+                conn.executemany(self.INSERT_SQL[layout], rows)
+                inserted = conn.total_changes - changes
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        except Exception as exc:
+            # Not only sqlite3.Error: if the writer thread died, every later
+            # write() would block the MQTT thread for put_timeout.
+            with self._lock:
+                self.failed += len(batch)
+            logger.error("sqlite_flush_failed", extra={"rows": len(batch), "error": str(exc)})
+            return
+        with self._lock:
+            self.written += inserted
+            self.duplicates += len(batch) - inserted
+            self.batches += 1
+
+
+__all__ = [
+    "LAYOUT_LEGACY",
+    "LAYOUT_V2",
+    "ReadPool",
+    "ReadingWriter",
+    "connect",
+    "connect_readonly",
+    "detect_layout",
+    "format_ts",
+    "ts_ms",
+]
@@ -0,0 +1,219 @@
+import json
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from .history import format_ms, parse_ms
+from .storage import LAYOUT_V2, connect_readonly, detect_layout
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION = 1
+
+# (ts epoch seconds, temp_c, humidity, rssi)
+Sample = Tuple[float, float, float, Optional[int]]
+Snapshot = Dict[str, Any]
+
+
+def encode_snapshot(windows: Dict[str, Sequence[Sample]], emission: Dict[str, Any], saved_at: float) -> bytes:
+    """zlib-compressed JSON with one column list per field and device."""
+    devices = {
+        device_id: {
+            "ts": [sample[0] for sample in samples],
+            "temp_c": [sample[1] for sample in samples],
+            "humidity": [sample[2] for sample in samples],
+            "rssi": [sample[3] for sample in samples],
+        }
+        for device_id, samples in windows.items()
+        if samples
+    }
+    document = {"version": SNAPSHOT_VERSION, "saved_at": saved_at, "windows": devices, "emission": emission}
+    return zlib.compress(json.dumps(document, separators=(",", ":")).encode("utf-8"), 6)
+
+
+def decode_snapshot(data: bytes) -> Snapshot:
+    document = json.loads(zlib.decompress(data))
+    if document.get("version") != SNAPSHOT_VERSION:
+        raise ValueError(f"Unsupported snapshot version {document.get('version')!r}")
+    return document
+
+
+def snapshot_samples(columns: Dict[str, List[Any]]) -> List[Sample]:
+    # Snapshots written before non-finite readings were rejected may still hold some.
+    samples = zip(columns["ts"], columns["temp_c"], columns["humidity"], columns["rssi"])
+    return [sample for sample in samples if math.isfinite(sample[1])]
+
+
+def write_snapshot(path: str, data: bytes) -> None:
+    """Write atomically so a crash mid-write keeps the previous snapshot."""
+    target = Path(path)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp = target.with_name(target.name + ".tmp")
+    with open(tmp, "wb") as handle:
+        handle.write(data)
+        handle.flush()
+        os.fsync(handle.fileno())
+    os.replace(tmp, target)
+
+
+def read_snapshot(path: str) -> Optional[Snapshot]:
+    """Load a snapshot; None when it is missing or unreadable."""
+    try:
+        data = Path(path).read_bytes()
+    except FileNotFoundError:
+        return None
+    except OSError as exc:
+        logger.warning("snapshot_read_failed", extra={"path": path, "error": str(exc)})
+        return None
+    try:
+        return decode_snapshot(data)
+    except (ValueError, KeyError, zlib.error) as exc:
+        logger.warning("snapshot_corrupt", extra={"path": path, "error": str(exc)})
+        return None
+
+
+def _active_devices(conn: sqlite3.Connection, layout: str, since_ms: int) -> Iterator[str]:
+    if layout == LAYOUT_V2:
+        try:
+            rows = conn.execute("SELECT device_id FROM ingest_watermark WHERE max_ts_ms >= ? ORDER BY device_id", (since_ms,)).fetchall()
+        except sqlite3.OperationalError:
+            pass
+        else:
+            yield from (row[0] for row in rows)
+            return
+    table = "readings_v2" if layout == LAYOUT_V2 else "readings"
+    device = ""
+    while True:
+        # MIN() over the leading key column is a single index seek per device.
+        (device,) = conn.execute(f"SELECT MIN(device_id) FROM {table} WHERE device_id > ?", (device,)).fetchone()
+        if device is None:
+            return
+        yield device
+
+
+def recent_samples(
+    db_path: str,
+    since_ms: int,
+    batch_size: int = 200,
+    keep: Callable[[str], bool] = lambda device_id: True,
+) -> Iterator[Tuple[str, List[Sample]]]:
+    """Readings at or after ``since_ms`` per device, oldest first.
+
+    Devices are fetched ``batch_size`` at a time with one query each; the
+    ``device_id IN (...) AND ts >= ?`` range is served by the primary key of
+    ``readings_v2`` (or ``idx_readings_device_ts`` on the legacy table).
+    """
+    conn = connect_readonly(db_path)
+    try:
+        layout = detect_layout(conn)
+        devices = [device for device in _active_devices(conn, layout, since_ms) if keep(device)]
+        for start in range(0, len(devices), max(1, batch_size)):
+            batch = devices[start : start + max(1, batch_size)]
+            marks = ",".join("?" * len(batch))
+            if layout == LAYOUT_V2:
+                rows = conn.execute(
+                    "SELECT device_id, ts_ms, temp_c, humidity, rssi FROM readings_v2 "
+                    f"WHERE device_id IN ({marks}) AND ts_ms >= ? ORDER BY device_id, ts_ms",
+                    (*batch, since_ms),
+                )
+            else:
+                rows = conn.execute(
+                    "SELECT device_id, ts, temp_c, humidity, rssi FROM readings "
+                    f"WHERE device_id IN ({marks}) AND ts >= ? ORDER BY device_id, ts",
+                    (*batch, format_ms(since_ms)),
+                )
+            current: Optional[str] = None
+            samples: List[Sample] = []
+            for device_id, ts, temp_c, humidity, rssi in rows:
+                if device_id != current:
+                    if samples:
+                        yield current, samples  # type: ignore[misc]
+                    current, samples = device_id, []
+                if layout != LAYOUT_V2:
+                    try:
+                        ts = parse_ms(ts)
+                    except ValueError:
+                        continue
+                samples.append((ts / 1000.0, temp_c, humidity, rssi))
+            if samples:
+                yield current, samples  # type: ignore[misc]
+    finally:
+        conn.close()
+
+
+class StateSnapshotter:
+    """Writes ``collect()`` to ``path`` every ``interval_seconds`` and on stop."""
+
+    def __init__(self, path: str, interval_seconds: float, collect: Callable[[], bytes]) -> None:
+        self.path = path
+        self.interval = interval_seconds
+        self.collect = collect
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.saved = 0
+        self.failures = 0
+        self.last_bytes = 0
+        self.last_duration_ms = 0.0
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="state-snapshot", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout)
+        self._thread = None
+        self.save()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.save()
+
+    def save(self) -> bool:
+        started = time.perf_counter()
+        try:
+            data = self.collect()
+            write_snapshot(self.path, data)
+        except Exception as exc:
+            with self._lock:
+                self.failures += 1
+            logger.error("snapshot_write_failed", extra={"path": self.path, "error": str(exc)})
+            return False
+        with self._lock:
+            self.saved += 1
+            self.last_bytes = len(data)
+            self.last_duration_ms = (time.perf_counter() - started) * 1000
+        return True
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "saved": self.saved,
+                "failures": self.failures,
+                "last_bytes": self.last_bytes,
+                "last_duration_ms": round(self.last_duration_ms, 3),
+            }
+
+
+__all__ = [
+    "SNAPSHOT_VERSION",
+    "StateSnapshotter",
+    "decode_snapshot",
+    "encode_snapshot",
+    "read_snapshot",
+    "recent_samples",
+    "snapshot_samples",
+    "write_snapshot",
+]
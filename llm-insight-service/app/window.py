@@ -0,0 +1,345 @@
+import math
+from array import array
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+
+from .models import RSSI_MAX, RSSI_MIN, Reading
+
+RSSI_MISSING = -(2**15)  # rssi is stored as int16; RSSI_MIN..RSSI_MAX fits with room to spare
+
+APPENDED = "appended"
+DUPLICATE = "duplicate"
+REORDERED = "reordered"
+STALE = "stale"
+
+
+@dataclass
+class WindowStats:
+    count: int
+    avg_c: float
+    std_c: float
+    min_c: float
+    max_c: float
+    rise_c: float
+    rise_seconds: float
+
+
+def to_epoch(ts: datetime) -> float:
+    return quantize_epoch(ts.timestamp())
+
+
+def quantize_epoch(value: float) -> float:
+    """Round to whole milliseconds, the precision SQLite stores (``ts_ms``).
+
+    Windows keep timestamps at this precision so a reading replayed from the
+    database (or a snapshot) compares equal to the one already in the window.
+    """
+    return round(value * 1000) / 1000
+
+
+def from_epoch(value: float) -> datetime:
+    return datetime.fromtimestamp(value, tz=timezone.utc)
+
+
+class _SeqQueue:
+    """Array-backed deque of sample sequence numbers (used for monotonic queues)."""
+
+    __slots__ = ("_buf", "_head", "_size")
+
+    def __init__(self, capacity: int) -> None:
+        self._buf = array("q", bytes(8 * capacity))
+        self._head = 0
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def front(self) -> int:
+        return self._buf[self._head]
+
+    def back(self) -> int:
+        return self._buf[(self._head + self._size - 1) % len(self._buf)]
+
+    def push_back(self, seq: int) -> None:
+        if self._size == len(self._buf):
+            self._grow()
+        self._buf[(self._head + self._size) % len(self._buf)] = seq
+        self._size += 1
+
+    def pop_back(self) -> None:
+        self._size -= 1
+
+    def pop_front(self) -> None:
+        self._head = (self._head + 1) % len(self._buf)
+        self._size -= 1
+
+    def _grow(self) -> None:
+        capacity = len(self._buf)
+        items = [self._buf[(self._head + i) % capacity] for i in range(self._size)]
+        self._buf = array("q", items) + array("q", bytes(8 * capacity))
+        self._head = 0
+
+
+class RollingWindow:
+    """Time-bounded ring buffer of readings with O(1) amortized statistics.
+
+    Samples are stored column-wise in ``array`` buffers (epoch-second
+    timestamps, temperature, humidity, rssi) that grow on demand up to
+    ``capacity``; once full, the oldest sample is overwritten. Running sum /
+    sum-of-squares give the mean and standard deviation, monotonic queues give
+    min and max, and a third monotonic queue restricted to the delta horizon
+    gives the lowest recent reading, i.e. the largest rise ending at the latest
+    sample.
+    """
+
+    __slots__ = (
+        "span",
+        "delta_horizon",
+        "capacity",
+        "_ts",
+        "_temp",
+        "_humidity",
+        "_rssi",
+        "_head",
+        "_size",
+        "_seq",
+        "_sum",
+        "_sumsq",
+        "_min",
+        "_max",
+        "_horizon_min",
+    )
+
+    def __init__(self, span: timedelta, delta_horizon: timedelta, capacity: int = 360, initial_capacity: int = 16) -> None:
+        self.span = span.total_seconds()
+        self.delta_horizon = delta_horizon.total_seconds()
+        self.capacity = max(1, capacity)
+        size = min(initial_capacity, self.capacity)
+        self._ts = array("d", bytes(8 * size))
+        self._temp = array("d", bytes(8 * size))
+        self._humidity = array("d", bytes(8 * size))
+        self._rssi = array("h", [RSSI_MISSING]) * size
+        self._head = 0
+        self._size = 0
+        self._seq = 0  # sequence number of the next appended sample
+        self._sum = 0.0
+        self._sumsq = 0.0
+        self._min = _SeqQueue(4)
+        self._max = _SeqQueue(4)
+        self._horizon_min = _SeqQueue(4)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _index(self, seq: int) -> int:
+        """Physical slot of sample ``seq`` (must still be inside the window)."""
+        first_seq = self._seq - self._size
+        return (self._head + seq - first_seq) % len(self._ts)
+
+    def _reading_at(self, index: int) -> Reading:
+        rssi = self._rssi[index]
+        return Reading(
+            ts=from_epoch(self._ts[index]),
+            temp_c=self._temp[index],
+            humidity=self._humidity[index],
+            rssi=None if rssi == RSSI_MISSING else rssi,
+        )
+
+    @property
+    def last(self) -> Optional[Reading]:
+        if not self._size:
+            return None
+        return self._reading_at(self._index(self._seq - 1))
+
+    @property
+    def last_ts(self) -> Optional[float]:
+        if not self._size:
+            return None
+        return self._ts[self._index(self._seq - 1)]
+
+    def samples(self) -> List[Tuple[float, float, float, Optional[int]]]:
+        """Stored ``(ts, temp_c, humidity, rssi)`` samples, oldest first."""
+        capacity = len(self._ts)
+        result = []
+        for offset in range(self._size):
+            index = (self._head + offset) % capacity
+            rssi = self._rssi[index]
+            result.append((self._ts[index], self._temp[index], self._humidity[index], None if rssi == RSSI_MISSING else rssi))
+        return result
+
+    def prune(self, current_ts: datetime) -> None:
+        """Drop readings older than the window span relative to ``current_ts``."""
+        self.prune_epoch(to_epoch(current_ts))
+
+    def prune_epoch(self, current_ts: float) -> None:
+        limit = current_ts - self.span
+        ts = self._ts
+        while self._size and ts[self._head] < limit:
+            self._evict_oldest()
+
+    def _evict_oldest(self) -> None:
+        first_seq = self._seq - self._size
+        temp = self._temp[self._head]
+        self._sum -= temp
+        self._sumsq -= temp * temp
+        self._head = (self._head + 1) % len(self._ts)
+        self._size -= 1
+        for queue in (self._min, self._max, self._horizon_min):
+            if queue and queue.front() == first_seq:
+                queue.pop_front()
+        if not self._size:
+            self._sum = 0.0
+            self._sumsq = 0.0
+
+    def _grow(self) -> None:
+        old = len(self._ts)
+        new = min(old * 2, self.capacity)
+        order = [(self._head + i) % old for i in range(self._size)]
+        self._ts = array("d", (self._ts[i] for i in order)) + array("d", bytes(8 * (new - old)))
+        self._temp = array("d", (self._temp[i] for i in order)) + array("d", bytes(8 * (new - old)))
+        self._humidity = array("d", (self._humidity[i] for i in order)) + array("d", bytes(8 * (new - old)))
+        self._rssi = array("h", (self._rssi[i] for i in order)) + array("h", [RSSI_MISSING]) * (new - old)
+        self._head = 0
+
+    def append(self, reading: Reading) -> None:
+        self.push(to_epoch(reading.ts), reading.temp_c, reading.humidity, reading.rssi)
+
+    def add(self, reading: Reading) -> str:
+        """Insert ``reading`` by timestamp and report what happened.
+
+        Newer readings prune the window and are appended (``APPENDED``). A
+        reading whose timestamp is already stored is dropped (``DUPLICATE``);
+        a late one still inside the window span is inserted in order
+        (``REORDERED``); anything older is dropped (``STALE``). Since the
+        window is bounded, so is the duplicate-detection state.
+        """
+        return self.add_epoch(to_epoch(reading.ts), reading.temp_c, reading.humidity, reading.rssi)
+
+    def add_epoch(self, ts: float, temp: float, humidity: float, rssi: Optional[int]) -> str:
+        """``add`` for a sample given as epoch seconds and plain values."""
+        ts = quantize_epoch(ts)
+        last_ts = self.last_ts
+        if last_ts is None or ts > last_ts:
+            self.prune_epoch(ts)
+            self.push(ts, temp, humidity, rssi)
+            return APPENDED
+        if ts == last_ts:
+            return DUPLICATE
+        if ts < last_ts - self.span:
+            return STALE
+        position = self._bisect(ts)
+        if position < self._size and self._ts[(self._head + position) % len(self._ts)] == ts:
+            return DUPLICATE
+        if position == 0 and self._size == len(self._ts) == self.capacity:
+            return STALE
+        self._insert_at(position, ts, temp, humidity, rssi)
+        return REORDERED
+
+    def _bisect(self, ts: float) -> int:
+        """Logical position of the first stored sample with timestamp >= ``ts``."""
+        low, high = 0, self._size
+        capacity = len(self._ts)
+        while low < high:
+            middle = (low + high) // 2
+            if self._ts[(self._head + middle) % capacity] < ts:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _insert_at(self, position: int, ts: float, temp: float, humidity: float, rssi: Optional[int]) -> None:
+        """Rebuild the window with a late sample spliced in; O(n) but rare."""
+        capacity = len(self._ts)
+        order = [(self._head + i) % capacity for i in range(self._size)]
+        samples = [(self._ts[i], self._temp[i], self._humidity[i], self._rssi[i]) for i in order]
+        samples.insert(position, (ts, temp, humidity, RSSI_MISSING if rssi is None else rssi))
+        self._head = 0
+        self._size = 0
+        self._sum = 0.0
+        self._sumsq = 0.0
+        self._min = _SeqQueue(4)
+        self._max = _SeqQueue(4)
+        self._horizon_min = _SeqQueue(4)
+        for sample_ts, sample_temp, sample_humidity, sample_rssi in samples:
+            self.push(sample_ts, sample_temp, sample_humidity, None if sample_rssi == RSSI_MISSING else sample_rssi)
+
+    def push(self, ts: float, temp: float, humidity: float, rssi: Optional[int]) -> None:
+        if self._size == len(self._ts):
+            if len(self._ts) < self.capacity:
+                self._grow()
+            else:
+                self._evict_oldest()
+        index = (self._head + self._size) % len(self._ts)
+        self._ts[index] = ts
+        self._temp[index] = temp
+        self._humidity[index] = humidity
+        # Warm start replays SQLite rows that never passed the decoder; keep
+        # an implausible rssi out of the int16 column rather than raising.
+        self._rssi[index] = rssi if rssi is not None and RSSI_MIN <= rssi <= RSSI_MAX else RSSI_MISSING
+        self._size += 1
+        seq = self._seq
+        self._seq += 1
+        self._sum += temp
+        self._sumsq += temp * temp
+
+        temps = self._temp
+        queue = self._min
+        while queue and temps[self._index(queue.back())] >= temp:
+            queue.pop_back()
+        queue.push_back(seq)
+        queue = self._max
+        while queue and temps[self._index(queue.back())] <= temp:
+            queue.pop_back()
+        queue.push_back(seq)
+
+        queue = self._horizon_min
+        limit = ts - self.delta_horizon
+        while queue and self._ts[self._index(queue.front())] < limit:
+            queue.pop_front()
+        while queue and temps[self._index(queue.back())] >= temp:
+            queue.pop_back()
+        queue.push_back(seq)
+
+    def rise_baseline(self) -> Optional[Reading]:
+        """Lowest reading inside the delta horizon before the latest one, if lower."""
+        queue = self._horizon_min
+        if not queue or queue.front() == self._seq - 1:
+            return None
+        return self._reading_at(self._index(queue.front()))
+
+    def stats(self) -> WindowStats:
+        count = self._size
+        if not count:
+            return WindowStats(0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0)
+        avg = self._sum / count
+        variance = max(self._sumsq / count - avg * avg, 0.0)
+        rise_c = rise_seconds = 0.0
+        queue = self._horizon_min
+        if queue and queue.front() != self._seq - 1:
+            last = self._index(self._seq - 1)
+            baseline = self._index(queue.front())
+            rise_c = self._temp[last] - self._temp[baseline]
+            rise_seconds = self._ts[last] - self._ts[baseline]
+        return WindowStats(
+            count=count,
+            avg_c=avg,
+            std_c=math.sqrt(variance),
+            min_c=self._temp[self._index(self._min.front())],
+            max_c=self._temp[self._index(self._max.front())],
+            rise_c=rise_c,
+            rise_seconds=rise_seconds,
+        )
+
+
+__all__ = [
+    "APPENDED",
+    "DUPLICATE",
+    "REORDERED",
+    "STALE",
+    "RollingWindow",
+    "WindowStats",
+    "from_epoch",
+    "quantize_epoch",
+    "to_epoch",
+]
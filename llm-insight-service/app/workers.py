@@ -0,0 +1,133 @@
+import logging
+import threading
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+Job = Callable[[], None]
+
+
+class DeviceWorkerPool:
+    """Bounded job queue executed by a fixed set of worker threads.
+
+    Jobs submitted for the same device run one at a time and in submission
+    order, while jobs for different devices may run concurrently up to
+    ``max_workers``.
+    """
+
+    def __init__(self, max_workers: int, max_pending: int, name: str = "insight-worker") -> None:
+        self.max_workers = max(1, max_workers)
+        self.max_pending = max(1, max_pending)
+        self._name = name
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._idle = threading.Condition(self._lock)
+        self._pending: Dict[str, Deque[Job]] = {}
+        self._ready: Deque[str] = deque()
+        self._scheduled: Set[str] = set()
+        self._size = 0
+        self._running = 0
+        self._threads: List[threading.Thread] = []
+        self._stopping = False
+        self.submitted = 0
+        self.rejected = 0
+        self.forced = 0
+        self.completed = 0
+        self.failed = 0
+
+    def start(self) -> None:
+        with self._cond:
+            if self._threads:
+                return
+            self._stopping = False
+            for index in range(self.max_workers):
+                thread = threading.Thread(target=self._run, name=f"{self._name}-{index}", daemon=True)
+                self._threads.append(thread)
+                thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+            threads, self._threads = self._threads, []
+        for thread in threads:
+            thread.join(timeout)
+
+    def submit(self, device_id: str, job: Job, force: bool = False) -> bool:
+        """Queue ``job`` behind earlier jobs of ``device_id``; False when the queue is full.
+
+        ``force`` queues past ``max_pending`` (counted as ``forced``); meant
+        for cheap jobs that must keep their place in the device's order.
+        """
+        with self._cond:
+            if self._stopping or (self._size >= self.max_pending and not force):
+                self.rejected += 1
+                return False
+            if self._size >= self.max_pending:
+                self.forced += 1
+            self._pending.setdefault(device_id, deque()).append(job)
+            self._size += 1
+            self.submitted += 1
+            if device_id not in self._scheduled:
+                self._scheduled.add(device_id)
+                self._ready.append(device_id)
+                self._cond.notify()
+            return True
+
+    def join(self, timeout: Optional[float] = None) -> bool:
+        """Block until every queued job has finished."""
+        with self._idle:
+            return self._idle.wait_for(lambda: self._size == 0 and self._running == 0, timeout)
+
+    def stats(self) -> Dict[str, int]:
+        with self._cond:
+            return {
+                "workers": self.max_workers,
+                "queued": self._size,
+                "running": self._running,
+                "devices_pending": len(self._scheduled),
+                "submitted": self.submitted,
+                "rejected": self.rejected,
+                "forced": self.forced,
+                "completed": self.completed,
+                "failed": self.failed,
+            }
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._ready and not self._stopping:
+                    self._cond.wait()
+                if self._stopping:
+                    return
+                device_id = self._ready.popleft()
+                job = self._pending[device_id].popleft()
+                self._size -= 1
+                self._running += 1
+
+            try:
+                job()
+                failed = False
+            except Exception as exc:
+                failed = True
+                logger.exception("insight_job_failed", extra={"device": device_id, "error": str(exc)})
+
+            with self._cond:
+                self._running -= 1
+                if failed:
+                    self.failed += 1
+                else:
+                    self.completed += 1
+                if self._pending[device_id]:
+                    # Re-queue at the back so one busy device cannot starve the others.
+                    self._ready.append(device_id)
+                    self._cond.notify()
+                else:
+                    del self._pending[device_id]
+                    self._scheduled.discard(device_id)
+                if self._size == 0 and self._running == 0:
+                    self._idle.notify_all()
+
+
+__all__ = ["DeviceWorkerPool"]
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""Mikrobenchmark decoder telemetry: jalur pydantic lama vs TelemetryDecoder.
+
+Jalankan dari folder llm-insight-service:
+    python -m benchmarks.bench_decoder --messages 100000
+"""
+import argparse
+import json
+import time
+
+from app.decoder import TelemetryDecoder
+from app.models import Reading, TelemetryMessage
+
+
+def legacy_decode(payload: bytes):
+    telemetry = TelemetryMessage.parse_obj(json.loads(payload.decode("utf-8")))
+    return telemetry.device_id, Reading(
+        ts=telemetry.ts,
+        temp_c=telemetry.temp_c,
+        humidity=telemetry.humidity,
+        rssi=telemetry.rssi,
+    )
+
+
+def build_payloads(count: int):
+    payloads = []
+    for index in range(count):
+        payloads.append(
+            json.dumps(
+                {
+                    "device_id": f"24A5BCFF{index % 500:04d}",
+                    "ts": f"2024-07-05T08:{(index // 60) % 60:02d}:{index % 60:02d}Z",
+                    "temp_c": 25.0 + (index % 100) / 10,
+                    "humidity": 55.5,
+                    "rssi": -60,
+                    "fw": "siap-suhu-1.0.0",
+                }
+            ).encode()
+        )
+    return payloads
+
+
+def run(label: str, fn, payloads) -> None:
+    started = time.perf_counter()
+    for payload in payloads:
+        fn(payload)
+    elapsed = time.perf_counter() - started
+    print(f"{label:<22}: {len(payloads) / elapsed:12,.0f} msg/s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=100_000)
+    args = parser.parse_args()
+
+    payloads = build_payloads(args.messages)
+    decoder = TelemetryDecoder()
+    run("pydantic (lama)", legacy_decode, payloads)
+    run("TelemetryDecoder", decoder.decode, payloads)
+    print(f"decoder stats: {decoder.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""Mikrobenchmark evaluasi aturan per reading (RuleBook/RuleSet).
+
+Membandingkan aturan yang dikompilasi menjadi closure dengan interpretasi
+dict JSON di setiap panggilan, untuk beberapa jumlah aturan. Semua aturan
+dibuat tidak cocok agar setiap reading mengevaluasi seluruh aturan (kasus
+terburuk), sehingga waktu per reading seharusnya naik linear terhadap jumlah
+aturan. Bagian kedua mengukur resolusi device ke grup glob: panggilan pertama
+per device mencocokkan pola, berikutnya diambil dari cache.
+
+Jalankan dari folder llm-insight-service:
+    python -m benchmarks.bench_rules --readings 200000 --rules 3 30 300
+"""
+import argparse
+import operator
+import time
+
+from app.rules import METRICS, CompiledRules, RuleSet, compile_rule, default_rule_set
+
+OPERATORS = {"gt": operator.gt, "gte": operator.ge, "lt": operator.lt, "lte": operator.le}
+
+
+def build_specs(count: int):
+    # Thresholds far above any reading so no rule matches.
+    metrics = ("current", "avg", "max", "rise", "humidity")
+    specs = []
+    for index in range(count):
+        when = {"current": {"gt": -50.0}}
+        when.setdefault(metrics[index % len(metrics)], {})["gte"] = 1000.0 + index
+        specs.append({"name": f"rule-{index}", "level": "ALERT" if index % 2 else "WARN", "when": when})
+    return specs
+
+
+def interpret(specs, values):
+    """Baseline: walk the configuration on every reading."""
+    named = dict(zip(METRICS, values))
+    for spec in specs:
+        if all(OPERATORS[op](named[metric], limit) for metric, bounds in spec["when"].items() for op, limit in bounds.items()):
+            return spec["level"]
+    return "OK"
+
+
+def build_readings(count: int):
+    return [(20.0 + (index % 100) / 10, 25.0, 20.0, 30.0, (index % 7) / 10, 30.0, 55.0) for index in range(count)]
+
+
+def timed(fn, items) -> float:
+    started = time.perf_counter()
+    for item in items:
+        fn(item)
+    return (time.perf_counter() - started) / len(items) * 1e9
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--readings", type=int, default=200_000)
+    parser.add_argument("--rules", type=int, nargs="+", default=[3, 30, 300])
+    parser.add_argument("--devices", type=int, default=10_000)
+    parser.add_argument("--groups", type=int, default=100)
+    args = parser.parse_args()
+
+    readings = build_readings(args.readings)
+    defaults = default_rule_set(30.0, 35.0, 5.0)
+    print(f"{'aturan':>7} {'compiled ns/reading':>20} {'ns/aturan':>10} {'interpretasi ns/reading':>24}")
+    print(f"{'default':>7} {timed(defaults.evaluate, readings):20,.0f}")
+    for count in args.rules:
+        specs = build_specs(count)
+        rule_set = RuleSet("bench", [compile_rule(spec, spec["name"]) for spec in specs])
+        compiled = timed(rule_set.evaluate, readings)
+        sample = readings[: max(1, args.readings // max(1, count // 3))]
+        interpreted = timed(lambda values: interpret(specs, values), sample)
+        print(f"{count:>7} {compiled:20,.0f} {compiled / count:10,.1f} {interpreted:24,.0f}")
+
+    document = {
+        "groups": [
+            {"name": f"group-{index}", "devices": [f"site{index}-*"], "rules": build_specs(3)} for index in range(args.groups)
+        ]
+    }
+    rules = CompiledRules(document, defaults)
+    devices = [f"site{index % (args.groups + 10)}-{index}" for index in range(args.devices)]
+    first = timed(rules.resolve, devices)
+    cached = timed(rules.resolve, devices)
+    print(f"resolusi {args.groups} grup glob: pertama {first:,.0f} ns/device, cache {cached:,.0f} ns/device")
+    print(f"cache: {rules.resolve.cache_info()}")
+
+
+if __name__ == "__main__":
+    main()
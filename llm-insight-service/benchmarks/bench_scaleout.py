@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""Benchmark skala horizontal InsightEngine dengan partisi hash device.
+
+Setiap proses menjalankan satu InsightEngine (WORKER_INDEX=i, WORKER_COUNT=N)
+dan menerima seluruh aliran pesan seperti subscriber MQTT sungguhan. Pesan
+milik worker lain dibuang dari topiknya saja tanpa decode. Publish insight
+dimatikan.
+
+Tanpa ``--broker`` pesan diumpankan langsung ke ``_on_message``: paho dan
+jaringan dilewati, sehingga biaya menerima pesan milik worker lain (socket,
+parsing paket MQTT, ack QoS 1) tidak terukur dan hasilnya batas atas. Dengan
+``--broker host:port`` setiap worker subscribe lewat paho ke broker sungguhan
+dan proses utama mem-publish seluruh pesan; di sini terlihat bahwa tiap
+worker tetap membayar penerimaan seluruh aliran, dan broker mengirim setiap
+pesan N kali.
+
+Jalankan dari folder llm-insight-service:
+    python -m benchmarks.bench_scaleout --devices 2000 --readings 50 --workers 1 2 4
+    python -m benchmarks.bench_scaleout --broker localhost:1883 --workers 1 2 4
+
+``wall`` bergantung pada jumlah core yang tersedia. ``cpu`` memakai waktu CPU
+worker paling sibuk, sehingga menunjukkan kapasitas bila tiap worker punya
+core sendiri.
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import threading
+import time
+from types import SimpleNamespace
+from typing import Optional, Tuple
+
+
+def build_messages(devices: int, readings: int):
+    messages = []
+    for step in range(readings):
+        for index in range(devices):
+            device_id = f"24A5BCFF{index:04d}"
+            payload = {
+                "device_id": device_id,
+                "ts": f"2024-07-05T08:{step // 12:02d}:{(step % 12) * 5:02d}Z",
+                "temp_c": 25.0 + (index % 7) / 10,
+                "humidity": 55.5,
+                "rssi": -60,
+                "fw": "siap-suhu-1.0.0",
+            }
+            messages.append(SimpleNamespace(topic=f"siapsuhu/telemetry/{device_id}", payload=json.dumps(payload).encode()))
+    return messages
+
+
+def worker(index: int, count: int, devices: int, readings: int, barrier, results) -> None:
+    from app.config import Settings
+    from app.service import InsightEngine
+
+    logging.disable(logging.CRITICAL)
+    engine = InsightEngine(Settings(WORKER_INDEX=index, WORKER_COUNT=count))
+    engine._publish_insight = lambda device_id, insight: None
+    messages = build_messages(devices, readings)
+    barrier.wait()
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    for message in messages:
+        engine._on_message(None, None, message)
+    results.put((time.perf_counter() - wall, time.process_time() - cpu, len(engine._states)))
+
+
+def broker_worker(index: int, count: int, host: str, port: int, total: int, barrier, results) -> None:
+    from app.config import Settings
+    from app.service import InsightEngine
+
+    logging.disable(logging.CRITICAL)
+    engine = InsightEngine(
+        Settings(WORKER_INDEX=index, WORKER_COUNT=count, MQTT_HOST=host, MQTT_PORT=port, MQTT_CLIENT_ID="bench-scaleout")
+    )
+    engine._publish_insight = lambda device_id, insight: None
+    subscribed = threading.Event()
+    done = threading.Event()
+    received = 0
+    started = [0.0, 0.0]
+
+    def on_message(client, userdata, message):
+        nonlocal received
+        if received == 0:
+            started[:] = [time.perf_counter(), time.process_time()]
+        engine._on_message(client, userdata, message)
+        received += 1
+        if received >= total:
+            done.set()
+
+    client = engine._client
+    client.on_message = on_message
+    client.on_subscribe = lambda *args: subscribed.set()
+    client.connect(host, port)
+    client.loop_start()
+    subscribed.wait(10)
+    barrier.wait()
+    done.wait()
+    results.put((time.perf_counter() - started[0], time.process_time() - started[1], len(engine._states)))
+    client.loop_stop()
+    client.disconnect()
+
+
+def publish_all(host: str, port: int, devices: int, readings: int) -> None:
+    import paho.mqtt.client as mqtt
+
+    client = mqtt.Client(client_id="bench-scaleout-publisher", clean_session=True)
+    client.connect(host, port)
+    client.loop_start()
+    info = None
+    for message in build_messages(devices, readings):
+        info = client.publish(message.topic, message.payload, qos=1)
+    if info is not None:
+        info.wait_for_publish()
+    client.loop_stop()
+    client.disconnect()
+
+
+def run(count: int, devices: int, readings: int, broker: Optional[Tuple[str, int]] = None) -> None:
+    results = multiprocessing.Queue()
+    if broker is None:
+        barrier = multiprocessing.Barrier(count)
+        processes = [
+            multiprocessing.Process(target=worker, args=(index, count, devices, readings, barrier, results))
+            for index in range(count)
+        ]
+    else:
+        # The publisher joins the barrier so it starts only once every worker is subscribed.
+        barrier = multiprocessing.Barrier(count + 1)
+        processes = [
+            multiprocessing.Process(
+                target=broker_worker, args=(index, count, *broker, devices * readings, barrier, results)
+            )
+            for index in range(count)
+        ]
+    for process in processes:
+        process.start()
+    if broker is not None:
+        barrier.wait()
+        publish_all(*broker, devices, readings)
+    outcomes = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    total = devices * readings
+    wall = max(outcome[0] for outcome in outcomes)
+    cpu = max(outcome[1] for outcome in outcomes)
+    owned = sorted(outcome[2] for outcome in outcomes)
+    print(
+        f"workers={count}: wall {total / wall:10,.0f} msg/s | cpu {total / cpu:10,.0f} msg/s | "
+        f"device/worker {owned[0]}-{owned[-1]}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--devices", type=int, default=2000)
+    parser.add_argument("--readings", type=int, default=50)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--broker", help="host:port broker MQTT; tanpa ini paho dan jaringan dilewati")
+    args = parser.parse_args()
+    broker = None
+    if args.broker:
+        host, _, port = args.broker.rpartition(":")
+        broker = (host or "localhost", int(port))
+    print(f"core tersedia: {multiprocessing.cpu_count()}")
+    for count in args.workers:
+        run(count, args.devices, args.readings, broker)
+
+
+if __name__ == "__main__":
+    main()
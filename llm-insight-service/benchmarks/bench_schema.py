@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""Bandingkan layout `readings` lama (ts TEXT + index) dengan `readings_v2` (WITHOUT ROWID, ts_ms).
+
+Jalankan dari folder llm-insight-service:
+    python -m benchmarks.bench_schema --devices 50 --hours 24
+"""
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+MIGRATIONS = Path(__file__).resolve().parents[2] / "db" / "migrations"
+BASE = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def generate_rows(devices: int, hours: int):
+    step = 5
+    for offset in range(0, hours * 3600, step):
+        ts = BASE + timedelta(seconds=offset)
+        for device in range(devices):
+            yield f"dev-{device:04d}", ts, round(random.uniform(20, 35), 2), round(random.uniform(40, 70), 2), -60
+
+
+def setup(path: str, layout: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript((MIGRATIONS / "001_init.sql").read_text())
+    if layout == "v2":
+        conn.executescript((MIGRATIONS / "002_readings_v2.sql").read_text())
+    return conn
+
+
+def insert(conn: sqlite3.Connection, layout: str, rows) -> float:
+    if layout == "v2":
+        sql = "INSERT INTO readings_v2(device_id, ts_ms, temp_c, humidity, rssi) VALUES (?, ?, ?, ?, ?)"
+        data = [(d, round(ts.timestamp() * 1000), t, h, r) for d, ts, t, h, r in rows]
+    else:
+        sql = "INSERT INTO readings(device_id, ts, temp_c, humidity, rssi) VALUES (?, ?, ?, ?, ?)"
+        data = [(d, ts.isoformat().replace("+00:00", "Z"), t, h, r) for d, ts, t, h, r in rows]
+    started = time.perf_counter()
+    for start in range(0, len(data), 1000):
+        conn.execute("BEGIN")
+        conn.executemany(sql, data[start : start + 1000])
+        conn.execute("COMMIT")
+    return time.perf_counter() - started
+
+
+def range_queries(conn: sqlite3.Connection, layout: str, devices: int, hours: int, count: int) -> float:
+    rng = random.Random(1)
+    started = time.perf_counter()
+    for _ in range(count):
+        device = f"dev-{rng.randrange(devices):04d}"
+        start = BASE + timedelta(seconds=rng.randrange(max(1, (hours - 1) * 3600)))
+        end = start + timedelta(hours=1)
+        if layout == "v2":
+            conn.execute(
+                "SELECT ts_ms, temp_c, humidity FROM readings_v2 WHERE device_id = ? AND ts_ms >= ? AND ts_ms < ?",
+                (device, round(start.timestamp() * 1000), round(end.timestamp() * 1000)),
+            ).fetchall()
+        else:
+            conn.execute(
+                "SELECT ts, temp_c, humidity FROM readings WHERE device_id = ? AND ts >= ? AND ts < ?",
+                (device, start.isoformat().replace("+00:00", "Z"), end.isoformat().replace("+00:00", "Z")),
+            ).fetchall()
+    return (time.perf_counter() - started) / count
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--devices", type=int, default=50)
+    parser.add_argument("--hours", type=int, default=24)
+    parser.add_argument("--queries", type=int, default=500)
+    args = parser.parse_args()
+
+    random.seed(0)
+    rows = list(generate_rows(args.devices, args.hours))
+    print(f"{len(rows):,} baris, {args.devices} device, {args.hours} jam")
+    with tempfile.TemporaryDirectory() as tmp:
+        for layout in ("legacy", "v2"):
+            path = os.path.join(tmp, f"{layout}.db")
+            conn = setup(path, layout)
+            insert_seconds = insert(conn, layout, rows)
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            query_seconds = range_queries(conn, layout, args.devices, args.hours, args.queries)
+            conn.close()
+            size_mb = os.path.getsize(path) / 1e6
+            print(
+                f"{layout:<7} insert {len(rows) / insert_seconds:10,.0f} baris/s | "
+                f"range 1 jam {query_seconds * 1000:7.2f} ms | ukuran {size_mb:7.1f} MB"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""Bandingkan memori per device: deque berisi dataclass Reading vs RollingWindow berbasis array.
+
+Jalankan dari folder llm-insight-service:
+    python -m benchmarks.bench_window_memory --devices 2000 --samples 180
+"""
+import argparse
+import gc
+import tracemalloc
+from collections import deque
+from datetime import datetime, timedelta, timezone
+
+from app.models import Reading
+from app.window import RollingWindow
+
+BASE = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def fill_deques(devices: int, samples: int):
+    buffers = {}
+    for device in range(devices):
+        window = deque()
+        for step in range(samples):
+            window.append(
+                Reading(ts=BASE + timedelta(seconds=5 * step), temp_c=25.0 + step * 0.01, humidity=55.5, rssi=-60)
+            )
+        buffers[f"dev-{device}"] = window
+    return buffers
+
+
+def fill_windows(devices: int, samples: int):
+    buffers = {}
+    base = BASE.timestamp()
+    for device in range(devices):
+        window = RollingWindow(span=timedelta(minutes=15), delta_horizon=timedelta(seconds=120))
+        for step in range(samples):
+            window.push(base + 5 * step, 25.0 + step * 0.01, 55.5, -60)
+        buffers[f"dev-{device}"] = window
+    return buffers
+
+
+def measure(builder, devices: int, samples: int) -> float:
+    gc.collect()
+    tracemalloc.start()
+    buffers = builder(devices, samples)
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del buffers
+    return current / devices
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--devices", type=int, default=2000)
+    parser.add_argument("--samples", type=int, default=180, help="Sampel per device (15 menit @5 detik = 180)")
+    args = parser.parse_args()
+
+    before = measure(fill_deques, args.devices, args.samples)
+    after = measure(fill_windows, args.devices, args.samples)
+    print(f"devices={args.devices} samples/device={args.samples}")
+    print(f"deque[Reading]  : {before:10.0f} bytes/device")
+    print(f"RollingWindow   : {after:10.0f} bytes/device")
+    print(f"reduction       : {before / after:10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
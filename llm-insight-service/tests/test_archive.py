@@ -0,0 +1,72 @@
+from app.archive import DAY_MS, RetentionJob, decode_segment, encode_segment, read_segment, segment_path
+from app.history import HistoryReader
+from app.storage import ReadPool
+from tests.test_history import BASE_MS, make_v2_db
+
+
+def insert_rows(conn, device_id, rows):
+    conn.executemany(
+        "INSERT OR IGNORE INTO readings_v2(device_id, ts_ms, temp_c, humidity, rssi) VALUES (?, ?, ?, ?, ?)",
+        [(device_id, *row) for row in rows],
+    )
+
+
+def test_segment_roundtrip_is_lossless():
+    rows = [(BASE_MS + index * 5_000, 25.0 + index / 7, 55.5 - index / 3, None if index % 3 else -60 - index) for index in range(500)]
+    encoded = encode_segment(rows)
+    assert decode_segment(encoded) == rows
+    assert len(encoded) < 500 * 28 / 2
+    assert decode_segment(encode_segment([])) == []
+
+
+def test_retention_moves_old_days_and_history_stays_complete(tmp_path):
+    conn = make_v2_db(tmp_path)
+    day0 = BASE_MS - BASE_MS % DAY_MS
+    rows = [(day0 + index * 600_000, 20.0 + index % 10, 50.0, -55) for index in range(3 * 144)]  # 3 days, every 10 min
+    insert_rows(conn, "dev", rows)
+    insert_rows(conn, "old", rows[:10])
+    archive_dir = str(tmp_path / "archive")
+    reader = HistoryReader(ReadPool(str(tmp_path / "siapsuhu.db"), size=2), page_size=50, archive_dir=archive_dir)
+    before = list(reader.stream(None, day0, day0 + 3 * DAY_MS))
+
+    job = RetentionJob(str(tmp_path / "siapsuhu.db"), archive_dir, retention_days=1, chunk_size=40)
+    result = job.run_once(now_ms=day0 + 3 * DAY_MS + 1_000)
+    assert result == {"days": 3, "rows": 2 * 144 + 10}
+    assert conn.execute("SELECT COUNT(*) FROM readings_v2").fetchone()[0] == 144
+    assert len(read_segment(segment_path(archive_dir, "dev", day0 + DAY_MS))) == 144
+    assert job.stats()["rows_deleted"] == 2 * 144 + 10
+
+    assert list(reader.stream(None, day0, day0 + 3 * DAY_MS)) == before
+    # Keyset pagination crosses the archive/hot boundary without gaps.
+    page = list(reader.stream("dev", day0, day0 + 3 * DAY_MS, limit=200))
+    rest = list(reader.stream("dev", day0, day0 + 3 * DAY_MS, after=page[-1]["ts"]))
+    assert page + rest == before[: 3 * 144]
+    # Sub-minute buckets fold raw rows, including archived ones.
+    buckets = list(reader.stream("dev", day0, day0 + DAY_MS, bucket=30_000))
+    assert len(buckets) == 144
+
+
+def test_late_rows_for_archived_days_are_visible_and_folded_in(tmp_path):
+    conn = make_v2_db(tmp_path)
+    day0 = BASE_MS - BASE_MS % DAY_MS
+    insert_rows(conn, "dev", [(day0 + 1_000, 20.0, 50.0, None), (day0 + 3_000, 22.0, 50.0, None)])
+    archive_dir = str(tmp_path / "archive")
+    job = RetentionJob(str(tmp_path / "siapsuhu.db"), archive_dir, retention_days=1)
+    job.run_once(now_ms=day0 + 2 * DAY_MS)
+
+    insert_rows(conn, "dev", [(day0 + 2_000, 21.0, 50.0, None)])
+    reader = HistoryReader(ReadPool(str(tmp_path / "siapsuhu.db"), size=1), archive_dir=archive_dir)
+    assert [row["temp_c"] for row in reader.stream("dev", day0, day0 + DAY_MS)] == [20.0, 21.0, 22.0]
+
+    job.run_once(now_ms=day0 + 2 * DAY_MS)
+    assert [row[1] for row in read_segment(segment_path(archive_dir, "dev", day0))] == [20.0, 21.0, 22.0]
+    assert conn.execute("SELECT COUNT(*) FROM readings_v2").fetchone()[0] == 0
+
+
+def test_segment_paths_stay_inside_the_archive_dir(tmp_path):
+    archive_dir = (tmp_path / "archive").resolve()
+    paths = {device_id: segment_path(str(archive_dir), device_id, BASE_MS) for device_id in ["..", ".", "...", "../x", "a.b"]}
+    for path in paths.values():
+        assert path.resolve().parent.parent == archive_dir
+    assert len({path.parent.name for path in paths.values()}) == len(paths)
+    assert paths["a.b"].parent.name == "a.b"
@@ -0,0 +1,188 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from app.config import Settings
+from app.decoder import TelemetryDecoder, decode_with_pydantic, encode_binary_batch
+from app.service import InsightEngine
+
+VALID = {
+    "device_id": "24A5BCFF1122",
+    "ts": "2024-07-05T08:30:12Z",
+    "temp_c": 31.4,
+    "humidity": 58.2,
+    "rssi": -62,
+    "fw": "siap-suhu-1.0.0",
+}
+
+
+def variant(**changes):
+    data = dict(VALID)
+    for key, value in changes.items():
+        if value is KeyError:
+            data.pop(key)
+        else:
+            data[key] = value
+    return json.dumps(data).encode()
+
+
+CORPUS = [
+    json.dumps(VALID).encode(),
+    variant(ts="2024-07-05T08:30:12.5Z"),
+    variant(ts="2024-07-05T08:30:12.123456Z"),
+    variant(ts="2024-07-05T08:30:12.1234567Z"),
+    variant(ts="2024-07-05T08:30:12+07:00"),
+    variant(ts="2024-07-05 08:30:12"),
+    variant(ts="2024-02-30T08:30:12Z"),
+    variant(ts="2024-07-05T24:00:00Z"),
+    variant(ts="not-a-date"),
+    variant(ts=1720168212),
+    variant(ts=1720168212.25),
+    variant(ts=True),
+    variant(ts=None),
+    variant(ts=KeyError),
+    variant(device_id="  dev-1  "),
+    variant(device_id="   "),
+    variant(device_id=""),
+    variant(device_id=12345),
+    variant(device_id=None),
+    variant(device_id=KeyError),
+    variant(temp_c=25),
+    variant(temp_c="25.5"),
+    variant(temp_c="hot"),
+    variant(temp_c=True),
+    variant(temp_c=None),
+    variant(temp_c=KeyError),
+    variant(temp_c=[25.0]),
+    variant(humidity=10**30),
+    variant(rssi=None),
+    variant(rssi=KeyError),
+    variant(rssi=-60.7),
+    variant(rssi="-60"),
+    variant(rssi="strong"),
+    variant(rssi=False),
+    variant(rssi=3_000_000_000),
+    variant(rssi=5),
+    variant(rssi=-200),
+    variant(fw=None),
+    variant(fw=100),
+    variant(fw=["x"]),
+    variant(extra="ignored"),
+    b'{"device_id": "d", "ts": "2024-07-05T08:30:12Z", "temp_c": NaN, "humidity": Infinity}',
+    b'{"device_id": "d", "ts": "2024-07-05T08:30:12Z", "temp_c": 1e400, "humidity": 50}',
+    b'{"device_id": "d", "ts": "2024-07-05T08:30:12Z", "temp_c": 123456789012345678901234567890, "humidity": 50}',
+    b'{"device_id": "d\\ud800", "ts": "2024-07-05T08:30:12Z", "temp_c": 1, "humidity": 50}',
+    b'[["device_id", "d"], ["ts", "2024-07-05T08:30:12Z"], ["temp_c", 1], ["humidity", 2]]',
+    b"[]",
+    b"42",
+    b"null",
+    b"{not json",
+    b"\xff\xfe",
+    b"",
+]
+
+
+def reference(payload):
+    return decode_with_pydantic(json.loads(payload.decode("utf-8")))
+
+
+def outcome(fn, payload):
+    try:
+        return ("ok", fn(payload))
+    except Exception:
+        return ("error", None)
+
+
+@pytest.mark.parametrize("payload", CORPUS)
+def test_fast_decoder_matches_pydantic(payload):
+    decoder = TelemetryDecoder()
+    expected = outcome(reference, payload)
+    actual = outcome(decoder.decode, payload)
+    assert actual[0] == expected[0]
+    if expected[0] == "ok":
+        exp_id, exp_reading = expected[1]
+        act_id, act_reading = actual[1]
+        assert act_id == exp_id
+        assert act_reading.ts == exp_reading.ts
+        assert act_reading.ts.utcoffset() == exp_reading.ts.utcoffset()
+        assert act_reading.rssi == exp_reading.rssi
+        for field in ("temp_c", "humidity"):
+            a, e = getattr(act_reading, field), getattr(exp_reading, field)
+            assert a == e or (a != a and e != e)
+
+
+def test_firmware_payload_takes_fast_path():
+    decoder = TelemetryDecoder()
+    decoder.decode(json.dumps(VALID).encode())
+    decoder.decode(variant(temp_c="25.5"))
+    assert decoder.stats()["fast"] == 1
+    assert decoder.stats()["fallback"] == 1
+
+
+def test_compact_json_batch_is_sorted_by_timestamp():
+    payload = json.dumps(
+        {
+            "device_id": "dev-1",
+            "fw": "siap-suhu-1.0.0",
+            "base_ts": "2024-07-05T08:30:00Z",
+            "samples": [[10000, 26.0, 55.0, -61], [0, 25.0, 54.0], [5000, 25.5, 54.5, -60]],
+        }
+    ).encode()
+    decoded = TelemetryDecoder().decode_many(payload)
+    assert [reading.temp_c for _, reading in decoded] == [25.0, 25.5, 26.0]
+    assert decoded[0][1].rssi is None
+    assert decoded[2][1].ts.isoformat() == "2024-07-05T08:30:10+00:00"
+
+
+def test_binary_batch_round_trip():
+    base = 1720168200.0
+    payload = encode_binary_batch("dev-2", base, [(5000, 25.51, 60.25, -60), (0, 24.99, 61.0, None)])
+    decoded = TelemetryDecoder().decode_many(payload)
+    assert [device_id for device_id, _ in decoded] == ["dev-2", "dev-2"]
+    assert [reading.temp_c for _, reading in decoded] == [24.99, 25.51]
+    assert decoded[0][1].rssi is None
+    assert decoded[1][1].ts.timestamp() == base + 5
+
+
+def test_invalid_sample_rejects_batch():
+    payload = json.dumps({"device_id": "dev-1", "base_ts": 1720168200, "samples": [[0, "hot", 50.0]]}).encode()
+    with pytest.raises(ValueError):
+        TelemetryDecoder().decode_many(payload)
+    with pytest.raises(Exception):
+        TelemetryDecoder().decode_many(encode_binary_batch("dev", 0.0, [(0, 25.0, 50.0, -60)])[:-2])
+
+
+@pytest.mark.parametrize(
+    "payload",
+    [
+        variant(temp_c=float("nan")),
+        variant(temp_c=float("inf")),
+        variant(humidity=float("-inf")),
+        json.dumps({"device_id": "dev-1", "base_ts": 1720168200, "samples": [[0, float("nan"), 50.0]]}).encode(),
+    ],
+)
+def test_non_finite_readings_are_rejected(payload):
+    # A single NaN would otherwise poison the window's running sums until it empties.
+    with pytest.raises(ValueError):
+        TelemetryDecoder().decode_many(payload)
+
+
+def test_out_of_range_rssi_is_rejected_and_never_stops_ingest():
+    compact = {"device_id": "dev", "base_ts": 1720168200, "samples": [[0, 25.0, 50.0, 3_000_000_000]]}
+    with pytest.raises(ValueError):
+        TelemetryDecoder().decode_many(json.dumps(compact).encode())
+    with pytest.raises(ValueError):
+        TelemetryDecoder().decode_many(encode_binary_batch("dev", 1720168200.0, [(0, 25.0, 50.0, 20)]))
+
+    engine = InsightEngine(Settings())
+    engine._publish_insight = lambda device_id, insight: None
+    engine._on_message(None, None, SimpleNamespace(topic="siapsuhu/telemetry/dev", payload=variant(rssi=3_000_000_000)))
+    engine._process_reading = lambda device_id, reading: 1 / 0
+    engine._on_message(None, None, SimpleNamespace(topic="siapsuhu/telemetry/dev", payload=json.dumps(VALID).encode()))
+    assert engine.stats()["ingest"]["failed"] == 1
+
+    # Rows replayed from SQLite skip the decoder; the int16 column keeps them as missing.
+    window = engine._new_window()
+    window.add_epoch(1720168200.0, 25.0, 50.0, 3_000_000_000)
+    assert window.samples()[0][3] is None
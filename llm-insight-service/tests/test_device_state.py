@@ -0,0 +1,171 @@
+import math
+import sys
+import threading
+import tracemalloc
+from collections import Counter
+from datetime import timedelta
+from types import SimpleNamespace
+
+from app.config import Settings
+from app.device_state import DeviceStateTable
+from app.models import Reading
+from app.service import InsightEngine
+from app.window import RollingWindow, from_epoch
+
+BASE = 1704110400.0
+
+
+def run_threads(count, target):
+    barrier = threading.Barrier(count)
+    errors = []
+
+    def body(index):
+        barrier.wait()
+        try:
+            target(index)
+        except Exception as exc:  # pragma: no cover - surfaced by the assert below
+            errors.append(exc)
+
+    previous = sys.getswitchinterval()
+    sys.setswitchinterval(1e-5)
+    try:
+        threads = [threading.Thread(target=body, args=(index,)) for index in range(count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(previous)
+    assert errors == []
+
+
+def test_concurrent_updates_keep_every_window_consistent():
+    table = DeviceStateTable(lambda: RollingWindow(timedelta(days=1), timedelta(seconds=120), capacity=10_000), stripes=8)
+    threads, devices, per_thread = 12, 24, 200
+
+    def hammer(index):
+        for step in range(per_thread):
+            device_id = f"dev-{(index + step) % devices}"
+            # Interleaved timestamps from different threads exercise the
+            # reorder path as well as plain appends.
+            ts = BASE + step * threads + index
+            with table.locked(device_id) as state:
+                state.window.add_epoch(ts, 20.0 + (step % 7), 50.0, None)
+
+    run_threads(threads, hammer)
+
+    expected = Counter(f"dev-{(index + step) % devices}" for index in range(threads) for step in range(per_thread))
+    assert len(table) == devices
+    for device_id, count in expected.items():
+        window = table.get(device_id).window
+        samples = window.samples()
+        assert len(samples) == count
+        assert [sample[0] for sample in samples] == sorted(sample[0] for sample in samples)
+        stats = window.stats()
+        temps = [sample[1] for sample in samples]
+        assert math.isclose(stats.avg_c, sum(temps) / len(temps))
+        assert (stats.min_c, stats.max_c) == (min(temps), max(temps))
+    assert table.stats()["acquired"] == threads * per_thread
+
+
+def test_stripes_spread_devices():
+    table = DeviceStateTable(stripes=16)
+    for index in range(1600):
+        with table.locked(f"sensor-{index}"):
+            pass
+    stats = table.stats()
+    assert stats["tracked"] == 1600
+    assert stats["largest_stripe"] < 200
+    assert "sensor-7" in table and "missing" not in table
+
+
+def test_concurrent_alerts_respect_cooldown_once_per_device():
+    engine = InsightEngine(Settings(STATE_STRIPES=4))
+    engine._summarizer = SimpleNamespace(summarize=lambda context: {"summary": "ok", "recommendation": "ok"})
+    published = []
+    engine._publish_insight = lambda device_id, insight: published.append((device_id, insight.level))
+    engine._workers.start()
+    devices = [f"dev-{index}" for index in range(8)]
+
+    def ingest(index):
+        for step in range(20):
+            # Every thread sends distinct ALERT readings for every device,
+            # all inside one cooldown period.
+            ts = from_epoch(BASE + step * 0.5 + index * 0.01)
+            for device_id in devices:
+                engine._process_reading(device_id, Reading(ts=ts, temp_c=40.0, humidity=50.0, rssi=None))
+
+    try:
+        run_threads(8, ingest)
+        assert engine._workers.join(timeout=10)
+    finally:
+        engine._workers.stop()
+    assert Counter(published) == {(device_id, "ALERT"): 1 for device_id in devices}
+    emission = engine._emission.stats()
+    ingest_stats = engine._ingest_stats()
+    appended = 8 * 20 * len(devices) - ingest_stats["duplicate"] - ingest_stats["reordered"] - ingest_stats["stale"]
+    assert emission["emitted_alert"] == len(devices)
+    assert emission["suppressed_cooldown"] == appended - len(devices)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_capacity_evicts_least_recently_used():
+    table = DeviceStateTable(stripes=1, max_devices=3)
+    for device_id in ("a", "b", "c"):
+        with table.locked(device_id):
+            pass
+    with table.locked("a"):
+        pass  # refreshes "a", so "b" is now the least recently used
+    with table.locked("d"):
+        pass
+    assert sorted(table) == ["a", "c", "d"]
+    assert table.stats()["evicted_capacity"] == 1
+
+
+def test_idle_devices_expire_a_few_per_access():
+    clock = FakeClock()
+    table = DeviceStateTable(stripes=1, idle_ttl=60.0, clock=clock)
+    for index in range(10):
+        with table.locked(f"old-{index}"):
+            pass
+    clock.now = 61.0
+    with table.locked("fresh"):
+        pass
+    assert len(table) == 11 - DeviceStateTable.EXPIRE_BATCH
+    for _ in range(10):
+        with table.locked("fresh"):
+            pass
+    assert list(table) == ["fresh"]
+    assert table.stats()["evicted_idle"] == 10
+
+
+def test_device_id_flood_keeps_memory_flat():
+    engine = InsightEngine(Settings(STATE_STRIPES=8, STATE_MAX_DEVICES=512))
+    engine._workers = SimpleNamespace(submit=lambda device_id, job: True)
+    counter = iter(range(10**9))
+
+    def flood(count):
+        for _ in range(count):
+            index = next(counter)
+            ts = from_epoch(BASE + index)
+            engine._process_reading(f"rogue-{index}", Reading(ts=ts, temp_c=25.0, humidity=50.0, rssi=None))
+
+    tracemalloc.start()
+    try:
+        flood(5_000)
+        baseline, _ = tracemalloc.get_traced_memory()
+        flood(20_000)
+        current, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    stats = engine._states.stats()
+    assert stats["tracked"] <= 512
+    assert stats["evicted_capacity"] == 25_000 - stats["tracked"]
+    assert current - baseline < 64 * 1024
@@ -0,0 +1,42 @@
+from datetime import datetime, timedelta, timezone
+
+from app.emission import EmissionPolicy
+
+BASE = datetime(2024, 1, 1, 12, 0, tzinfo=timezone.utc)
+
+
+def make_policy():
+    return EmissionPolicy(temp_epsilon=0.5, avg_epsilon=0.3, heartbeat_seconds=60, alert_cooldown_seconds=120)
+
+
+def at(seconds):
+    return BASE + timedelta(seconds=seconds)
+
+
+def test_unchanged_readings_are_suppressed_until_heartbeat():
+    policy = make_policy()
+    assert policy.decide("dev", "OK", 25.0, 25.0, at(0)) == "transition"
+    assert policy.decide("dev", "OK", 25.1, 25.0, at(5)) is None
+    assert policy.decide("dev", "OK", 25.2, 25.1, at(30)) is None
+    assert policy.decide("dev", "OK", 25.2, 25.1, at(60)) == "heartbeat"
+    stats = policy.stats()
+    assert stats["emitted"] == 2
+    assert stats["suppressed_unchanged"] == 2
+
+
+def test_level_transition_and_significant_change_emit():
+    policy = make_policy()
+    policy.decide("dev", "OK", 25.0, 25.0, at(0))
+    assert policy.decide("dev", "OK", 25.6, 25.1, at(5)) == "change"
+    assert policy.decide("dev", "OK", 25.6, 25.5, at(10)) == "change"
+    assert policy.decide("dev", "WARN", 30.1, 25.6, at(15)) == "transition"
+
+
+def test_alert_cooldown_is_kept():
+    policy = make_policy()
+    assert policy.decide("dev", "ALERT", 36.0, 30.0, at(0)) == "alert"
+    assert policy.decide("dev", "ALERT", 37.0, 31.0, at(60)) is None
+    assert policy.decide("dev", "ALERT", 37.0, 31.0, at(120)) == "alert"
+    assert policy.decide("dev", "OK", 25.0, 29.0, at(130)) == "transition"
+    assert policy.decide("dev", "ALERT", 36.0, 30.0, at(135)) == "alert"
+    assert policy.stats()["suppressed_cooldown"] == 1
@@ -0,0 +1,123 @@
+import sqlite3
+from pathlib import Path
+
+from app import main
+from app.history import HistoryReader, bucket_size
+from app.storage import ReadPool
+from fastapi.testclient import TestClient
+
+MIGRATIONS = Path(__file__).resolve().parents[2] / "db" / "migrations"
+BASE_MS = 1704110400000  # 2024-01-01T12:00:00Z
+
+
+def make_v2_db(tmp_path, name="siapsuhu.db"):
+    conn = sqlite3.connect(str(tmp_path / name), isolation_level=None)
+    for name in ("001_init.sql", "002_readings_v2.sql", "003_rollups.sql", "004_ingest_watermark.sql", "005_archive_state.sql"):
+        conn.executescript((MIGRATIONS / name).read_text())
+    conn.executescript(
+        "DROP TABLE readings; CREATE VIEW readings AS SELECT device_id, ts_ms AS ts, temp_c, humidity, rssi FROM readings_v2;"
+    )
+    return conn
+
+
+def insert(conn, rows):
+    conn.executemany(
+        "INSERT OR IGNORE INTO readings_v2(device_id, ts_ms, temp_c, humidity, rssi) VALUES (?, ?, ?, ?, NULL)", rows
+    )
+
+
+def test_trigger_maintains_rollups_for_out_of_order_and_duplicate_rows(tmp_path):
+    conn = make_v2_db(tmp_path)
+    insert(conn, [("dev", BASE_MS + 30_000, 26.0, 60.0), ("dev", BASE_MS, 24.0, 50.0), ("dev", BASE_MS + 70_000, 30.0, 70.0)])
+    insert(conn, [("dev", BASE_MS, 99.0, 99.0)])  # duplicate key is ignored and must not be counted
+
+    minutes = conn.execute(
+        "SELECT bucket_ms, count, temp_sum, temp_min, temp_max, temp_last FROM readings_1m ORDER BY bucket_ms"
+    ).fetchall()
+    assert minutes == [(BASE_MS, 2, 50.0, 24.0, 26.0, 26.0), (BASE_MS + 60_000, 1, 30.0, 30.0, 30.0, 30.0)]
+    hour = conn.execute("SELECT count, temp_max, temp_last, humidity_last FROM readings_1h").fetchall()
+    assert hour == [(3, 30.0, 30.0, 70.0)]
+
+
+def test_backfill_matches_trigger(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "siapsuhu.db"), isolation_level=None)
+    for name in ("001_init.sql", "002_readings_v2.sql"):
+        conn.executescript((MIGRATIONS / name).read_text())
+    rows = [("dev", BASE_MS + index * 7_000, 20.0 + index % 5, 50.0 + index % 3) for index in range(100)]
+    insert(conn, rows)
+    conn.executescript((MIGRATIONS / "003_rollups.sql").read_text())
+    backfilled = conn.execute("SELECT * FROM readings_1m ORDER BY bucket_ms").fetchall()
+
+    fresh = make_v2_db(tmp_path, "fresh.db")
+    insert(fresh, rows)
+    assert fresh.execute("SELECT * FROM readings_1m ORDER BY bucket_ms").fetchall() == backfilled
+
+
+def test_legacy_layout_serves_raw_rows(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "siapsuhu.db"), isolation_level=None)
+    conn.executescript((MIGRATIONS / "001_init.sql").read_text())
+    conn.execute(
+        "INSERT INTO readings(device_id, ts, temp_c, humidity, rssi) VALUES ('dev', '2024-01-01T12:00:05Z', 25.0, 50.0, -60)"
+    )
+    reader = HistoryReader(ReadPool(str(tmp_path / "siapsuhu.db"), size=1))
+    assert list(reader.stream("dev", BASE_MS, BASE_MS + 60_000)) == [
+        {"device_id": "dev", "ts": "2024-01-01T12:00:05Z", "temp_c": 25.0, "humidity": 50.0, "rssi": -60}
+    ]
+
+
+def test_reader_pages_raw_rows_across_devices(tmp_path):
+    conn = make_v2_db(tmp_path)
+    insert(conn, [(device, BASE_MS + index * 5_000, 25.0, 50.0) for device in ("a", "b") for index in range(7)])
+    reader = HistoryReader(ReadPool(str(tmp_path / "siapsuhu.db"), size=1), page_size=3)
+    end = BASE_MS + 3_600_000
+
+    rows = list(reader.stream(None, BASE_MS, end))
+    assert [(row["device_id"], row["ts"]) for row in rows][:2] == [("a", "2024-01-01T12:00:00.000Z"), ("a", "2024-01-01T12:00:05.000Z")]
+    assert len(rows) == 14
+
+    first = list(reader.stream(None, BASE_MS, end, limit=5))
+    rest = list(reader.stream(None, BASE_MS, end, after_device=first[-1]["device_id"], after=first[-1]["ts"]))
+    assert first + rest == rows
+
+
+def test_reader_buckets_from_rollups_and_raw(tmp_path):
+    conn = make_v2_db(tmp_path)
+    insert(conn, [("dev", BASE_MS + index * 5_000, 20.0 + index % 4, 50.0) for index in range(4 * 720)])
+    reader = HistoryReader(ReadPool(str(tmp_path / "siapsuhu.db"), size=2), page_size=50)
+    end = BASE_MS + 4 * 3_600_000
+
+    assert bucket_size(BASE_MS, end, 4) == 3_600_000
+    hourly = list(reader.stream("dev", BASE_MS, end, bucket=bucket_size(BASE_MS, end, 4)))
+    assert [point["count"] for point in hourly] == [720] * 4
+    assert hourly[0]["temp_min"] == 20.0 and hourly[0]["temp_max"] == 23.0
+    assert hourly[0]["temp_c"] == 21.5
+
+    # 30 s buckets are not rollup-aligned, so raw rows are folded instead.
+    fine = list(reader.stream("dev", BASE_MS, BASE_MS + 120_000, bucket=30_000))
+    assert [point["count"] for point in fine] == [6, 6, 6, 6]
+    assert fine[1]["temp_last"] == 23.0
+
+
+def test_history_endpoint_streams_ndjson_and_csv(tmp_path, monkeypatch):
+    conn = make_v2_db(tmp_path)
+    insert(conn, [("dev", BASE_MS + index * 60_000, 25.0, 50.0) for index in range(3)])
+    monkeypatch.setattr(main, "history_reader", HistoryReader(ReadPool(str(tmp_path / "siapsuhu.db"), size=1)))
+    monkeypatch.setattr(main, "history_cache", None)
+    client = TestClient(main.app)
+
+    response = client.get("/history", params={"device_id": "dev", "from": "2024-01-01T12:00:00Z", "to": "2024-01-01T13:00:00Z"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = response.text.splitlines()
+    assert len(lines) == 3
+    assert '"ts":"2024-01-01T12:01:00.000Z"' in lines[1]
+
+    response = client.get(
+        "/history",
+        params={"device_id": "dev", "from": "2024-01-01T12:00:00Z", "to": "2024-01-01T13:00:00Z", "points": 1, "format": "csv"},
+    )
+    assert response.text.splitlines()[0].startswith("device_id,ts,count,temp_c")
+    assert response.text.splitlines()[1].startswith("dev,2024-01-01T12:00:00.000Z,3,25.0")
+    assert response.headers["x-history-bucket-ms"] == "3600000"
+
+    assert client.get("/history", params={"from": "kemarin"}).status_code == 400
@@ -0,0 +1,91 @@
+from datetime import datetime
+
+from fastapi.testclient import TestClient
+
+from app import main
+from app.history import HistoryReader
+from app.history_cache import HistoryCache
+from app.storage import ReadPool
+from tests.test_history import BASE_MS, insert, make_v2_db
+
+MINUTE = 60_000
+
+
+def make_cache(tmp_path):
+    conn = make_v2_db(tmp_path)
+    reader = HistoryReader(ReadPool(str(tmp_path / "siapsuhu.db"), size=2))
+    return conn, HistoryCache(reader, max_responses=8, max_buckets=100, max_response_bytes=1 << 16)
+
+
+def test_watermark_tracks_versions_and_late_rows(tmp_path):
+    conn, cache = make_cache(tmp_path)
+    assert cache.watermark("dev") == (0, -1, 0)
+    insert(conn, [("dev", BASE_MS, 25.0, 50.0), ("dev", BASE_MS + 5_000, 25.0, 50.0)])
+    assert cache.watermark("dev") == (2, BASE_MS + 5_000, 0)
+    insert(conn, [("dev", BASE_MS + 1_000, 25.0, 50.0), ("dev", BASE_MS + 5_000, 99.0, 99.0)])
+    assert cache.watermark("dev") == (3, BASE_MS + 5_000, 1)
+
+
+def test_closed_buckets_are_reused_and_tail_recomputed(tmp_path):
+    conn, cache = make_cache(tmp_path)
+    insert(conn, [("dev", BASE_MS + index * 10_000, 20.0 + index // 6, 50.0) for index in range(27)])  # 4.5 minutes
+    end = BASE_MS + 5 * MINUTE
+
+    first = cache.buckets("dev", BASE_MS, end, MINUTE, cache.watermark("dev"))
+    assert [point["count"] for point in first] == [6, 6, 6, 6, 3]
+    assert cache.stats()["bucket_hits"] == 0
+
+    insert(conn, [("dev", BASE_MS + 270_000, 24.0, 50.0)])
+    second = cache.buckets("dev", BASE_MS, end, MINUTE, cache.watermark("dev"))
+    assert second[:4] == first[:4]
+    assert second[4]["count"] == 4
+    assert cache.stats()["bucket_hits"] == 4
+
+    # A late reading inside a closed bucket bumps late_version and forces a recompute.
+    insert(conn, [("dev", BASE_MS + 5_000, 30.0, 50.0)])
+    third = cache.buckets("dev", BASE_MS, end, MINUTE, cache.watermark("dev"))
+    assert third[0]["count"] == 7
+    assert third[0]["temp_max"] == 30.0
+
+
+def test_history_endpoint_etag_and_invalidation(tmp_path, monkeypatch):
+    conn, cache = make_cache(tmp_path)
+    insert(conn, [("dev", BASE_MS + index * 10_000, 25.0, 50.0) for index in range(12)])
+    monkeypatch.setattr(main, "history_reader", cache.reader)
+    monkeypatch.setattr(main, "history_cache", cache)
+    client = TestClient(main.app)
+    params = {"device_id": "dev", "from": "2024-01-01T12:00:00Z", "to": "2024-01-01T12:05:00Z", "points": 5}
+
+    response = client.get("/history", params=params)
+    etag = response.headers["etag"]
+    assert len(response.text.splitlines()) == 2
+    assert client.get("/history", params=params).text == response.text
+    assert client.get("/history", params=params, headers={"If-None-Match": etag}).status_code == 304
+    stats = cache.stats()
+    assert stats["hits"] == 1 and stats["not_modified"] == 1
+
+    insert(conn, [("dev", BASE_MS + 130_000, 26.0, 50.0)])
+    response = client.get("/history", params=params, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert len(response.text.splitlines()) == 3
+
+
+def test_default_range_requests_share_one_cache_entry(tmp_path, monkeypatch):
+    conn, cache = make_cache(tmp_path)
+    insert(conn, [("dev", BASE_MS + index * 10_000, 25.0, 50.0) for index in range(12)])
+    monkeypatch.setattr(main, "history_reader", cache.reader)
+    monkeypatch.setattr(main, "history_cache", cache)
+    clock = iter([BASE_MS + 3_600_000 + 1_234, BASE_MS + 3_600_000 + 5_678])
+
+    class FrozenDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return datetime.fromtimestamp(next(clock) / 1000, tz)
+
+    monkeypatch.setattr(main, "datetime", FrozenDatetime)
+    client = TestClient(main.app)
+    first = client.get("/history", params={"device_id": "dev"})
+    second = client.get("/history", params={"device_id": "dev"})
+    assert second.text == first.text and len(first.text.splitlines()) == 12
+    assert cache.stats()["hits"] == 1
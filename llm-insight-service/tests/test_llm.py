@@ -0,0 +1,177 @@
+import json
+import threading
+import time
+from types import SimpleNamespace
+
+from app.cache import TTLCache
+from app.llm import InsightContext, InsightSummarizer
+
+
+class StubModel:
+    def __init__(self, delay=0.0, fail=False):
+        self.delay = delay
+        self.fail = fail
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def generate_content(self, prompt, **kwargs):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("upstream failure")
+        return SimpleNamespace(text=json.dumps({"summary": "ringkas", "recommendation": "aksi"}))
+
+
+def make_summarizer(model, **kwargs):
+    summarizer = InsightSummarizer("", "stub", **kwargs)
+    summarizer.enabled = True
+    summarizer._model = model
+    return summarizer
+
+
+def make_context(device_id="dev", temp=31.02, avg=30.51, humidity=55.2, level="WARN"):
+    return InsightContext(
+        device_id=device_id,
+        level=level,
+        temp_c=temp,
+        window_avg_c=avg,
+        reason="Suhu 31.0°C melebihi ambang WARN 30.0°C.",
+        humidity=humidity,
+    )
+
+
+def test_equivalent_contexts_hit_cache():
+    model = StubModel()
+    summarizer = make_summarizer(model, cache_size=8)
+    assert summarizer.summarize(make_context("a"))["summary"] == "ringkas"
+    assert summarizer.summarize(make_context("b", temp=31.05, avg=30.55, humidity=55.9))["summary"] == "ringkas"
+    summarizer.summarize(make_context("c", temp=32.0))
+    assert model.calls == 2
+    stats = summarizer.cache_stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 2
+
+
+def test_concurrent_requests_share_one_call():
+    model = StubModel(delay=0.1)
+    summarizer = make_summarizer(model, cache_size=8)
+    threads = [threading.Thread(target=summarizer.summarize, args=(make_context(f"dev-{i}"),)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert model.calls == 1
+    assert summarizer.cache_stats()["coalesced"] == 7
+
+
+def test_failures_fall_back_and_are_not_cached():
+    model = StubModel(fail=True)
+    summarizer = make_summarizer(model, cache_size=8)
+    context = make_context()
+    assert summarizer.summarize(context) == InsightSummarizer._fallback(context)
+    summarizer.summarize(context)
+    assert model.calls == 2
+
+
+def test_ttl_and_lru_eviction():
+    now = [0.0]
+    cache = TTLCache(max_entries=2, ttl_seconds=10, clock=lambda: now[0])
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    now[0] = 11
+    assert cache.get("a") is None
+    stats = cache.stats()
+    assert stats["evictions"] == 1
+    assert stats["expirations"] == 1
+
+
+class BatchStubModel:
+    def __init__(self, drop=()):
+        self.drop = set(drop)
+        self.prompts = []
+
+    def generate_content(self, prompt, **kwargs):
+        self.prompts.append(prompt)
+        devices = [line.split(": ", 1)[1] for line in prompt.splitlines() if line.startswith("device_id: ")]
+        items = []
+        for device_id in devices:
+            if device_id in self.drop:
+                items.append({"device_id": device_id, "summary": 42})
+                continue
+            items.append({"device_id": device_id, "summary": f"ringkas {device_id}", "recommendation": "aksi"})
+        return SimpleNamespace(text="```json\n" + json.dumps(items) + "\n```")
+
+
+def test_batch_mode_fans_out_results_and_falls_back_per_item():
+    model = BatchStubModel(drop={"dev-2"})
+    summarizer = make_summarizer(model, batch_size=4, batch_window_ms=200)
+    results = {}
+    contexts = {f"dev-{i}": make_context(f"dev-{i}", temp=31.0 + i) for i in range(4)}
+
+    def run(device_id):
+        results[device_id] = summarizer.summarize(contexts[device_id])
+
+    threads = [threading.Thread(target=run, args=(device_id,)) for device_id in contexts]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    summarizer.close()
+
+    assert len(model.prompts) == 1
+    assert results["dev-0"]["summary"] == "ringkas dev-0"
+    assert results["dev-3"]["summary"] == "ringkas dev-3"
+    assert results["dev-2"] == InsightSummarizer._fallback(contexts["dev-2"])
+    assert summarizer.batch_stats()["missing"] == 1
+
+
+
+def test_half_open_probe_with_missing_batch_item_closes_breaker():
+    now = [0.0]
+    model = BatchStubModel(drop={"dev"})
+    summarizer = make_summarizer(model, batch_size=4, batch_window_ms=10, breaker_failures=3, breaker_reset_seconds=10)
+    summarizer._breaker._clock = lambda: now[0]
+    for _ in range(3):
+        summarizer._breaker.record_failure()
+    assert summarizer.call_stats()["breaker"]["state"] == "open"
+
+    now[0] = 11
+    context = make_context("dev")
+    assert summarizer.summarize(context) == InsightSummarizer._fallback(context)
+    assert summarizer.call_stats()["breaker"]["state"] == "closed"
+    assert summarizer.summarize(make_context("other"))["summary"] == "ringkas other"
+    assert len(model.prompts) == 2
+    summarizer.close()
+
+def test_latency_budget_returns_fallback():
+    model = StubModel(delay=0.5)
+    summarizer = make_summarizer(model, timeout_seconds=0.05)
+    context = make_context()
+    started = time.perf_counter()
+    assert summarizer.summarize(context) == InsightSummarizer._fallback(context)
+    assert time.perf_counter() - started < 0.3
+    assert summarizer.call_stats()["timeouts"] == 1
+    summarizer.close()
+
+
+def test_breaker_opens_then_probes_half_open():
+    now = [0.0]
+    model = StubModel(fail=True)
+    summarizer = make_summarizer(model, breaker_failures=3, breaker_reset_seconds=10)
+    summarizer._breaker._clock = lambda: now[0]
+    for _ in range(5):
+        summarizer.summarize(make_context())
+    assert model.calls == 3
+    assert summarizer.call_stats()["breaker"]["state"] == "open"
+    assert summarizer.call_stats()["breaker"]["short_circuited"] == 2
+
+    now[0] = 11
+    model.fail = False
+    assert summarizer.summarize(make_context())["summary"] == "ringkas"
+    assert model.calls == 4
+    assert summarizer.call_stats()["breaker"]["state"] == "closed"
+    assert summarizer.call_stats()["latency"]["count"] == 4
@@ -0,0 +1,54 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from app.config import Settings
+from app.partition import Partition
+from app.service import InsightEngine
+
+TOPICS = ("siapsuhu/telemetry/#", "siapsuhu/telemetry-batch/#")
+
+
+def test_every_device_has_exactly_one_owner():
+    partitions = [Partition(index, 4) for index in range(4)]
+    devices = [f"24A5BCFF{index:04d}" for index in range(1000)]
+    owners = [sum(partition.owns(device) for partition in partitions) for device in devices]
+    assert owners == [1] * len(devices)
+    shares = [sum(partition.owns(device) for device in devices) for partition in partitions]
+    assert min(shares) > 200
+    with pytest.raises(ValueError):
+        Partition(4, 4)
+
+
+def test_topic_prefilter():
+    partition = Partition(0, 2, TOPICS)
+    assert partition.topic_device("siapsuhu/telemetry/dev-1") == "dev-1"
+    assert partition.topic_device("siapsuhu/telemetry-batch/dev-1") == "dev-1"
+    assert partition.topic_device("siapsuhu/telemetry") is None
+    foreign = next(f"dev-{index}" for index in range(100) if not partition.owns(f"dev-{index}"))
+    assert partition.skip_topic(f"siapsuhu/telemetry/{foreign}")
+    assert not partition.skip_topic("siapsuhu/other")
+    assert partition.stats()["skipped"] == 1
+
+
+def test_engine_processes_only_owned_devices():
+    engine = InsightEngine(Settings(WORKER_INDEX=1, WORKER_COUNT=2))
+    engine._publish_insight = lambda device_id, insight: None
+    assert engine._client._client_id == b"siap-suhu-llm-1"
+    devices = [f"dev-{index}" for index in range(20)]
+    for device in devices:
+        payload = {"device_id": device, "ts": "2024-01-01T12:00:00Z", "temp_c": 25.0, "humidity": 50.0}
+        engine._on_message(None, None, SimpleNamespace(topic=f"siapsuhu/telemetry/{device}", payload=json.dumps(payload).encode()))
+    # A payload whose device_id does not match its topic is still filtered, and counted:
+    # the worker owning the payload's device skipped it by topic, so it is lost.
+    stray = next(device for device in devices if not engine._partition.owns(device))
+    owned = next(device for device in devices if engine._partition.owns(device))
+    payload = {"device_id": stray, "ts": "2024-01-01T12:00:05Z", "temp_c": 25.0, "humidity": 50.0}
+    engine._on_message(None, None, SimpleNamespace(topic=f"siapsuhu/telemetry/{owned}", payload=json.dumps(payload).encode()))
+
+    assert sorted(engine._states) == sorted(device for device in devices if engine._partition.owns(device))
+    stats = engine.stats()
+    assert stats["partition"]["skipped"] == 20 - len(engine._states)
+    assert stats["ingest"]["foreign"] == 1
+    assert stats["ingest"]["mismatched"] == 1
@@ -1,6 +1,12 @@
+import json
 from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
 
-from app.service import Reading, determine_level
+import pytest
+
+from app.config import Settings
+from app.rules import CompiledRules, RuleBook, RuleConfigError, default_rule_set
+from app.service import InsightEngine, Reading, determine_level
 
 
 def make_reading(temp, seconds=0):
@@ -42,3 +48,146 @@ def test_level_no_alert_when_delta_slow():
     current = make_reading(34.5)
     level, reason = determine_level(current, previous, 30, 35, 5)
     assert level == "WARN"
+
+
+def test_determine_level_does_not_recompile_the_default_rules(monkeypatch):
+    determine_level(make_reading(25.0), None, 30.5, 35.5, 5.5)
+    monkeypatch.setattr("app.rules.compile_rule", lambda spec, where: pytest.fail("default rules recompiled"))
+    for temp in (25.0, 31.0, 36.0):
+        determine_level(make_reading(temp), None, 30.5, 35.5, 5.5)
+    assert default_rule_set(30.5, 35.5, 5.5) is default_rule_set(30.5, 35.5, 5.5)
+
+
+DEFAULTS = default_rule_set(30, 35, 5)
+COLD_ROOM = {
+    "groups": [
+        {
+            "name": "cold-storage",
+            "devices": ["cold-*", "freezer-01"],
+            "rules": [
+                {"name": "cold-warn", "level": "WARN", "when": {"current": {"gte": -15}}},
+                {"name": "cold-alert", "level": "ALERT", "when": {"current": {"gte": -10}}, "reason": "Freezer {current:.1f}°C."},
+            ],
+        },
+        {
+            "name": "server-room",
+            "devices": ["srv-*"],
+            "rules": [
+                {"name": "humid", "level": "WARN", "when": {"humidity": {"gt": 70}}},
+                {"name": "hot-and-rising", "level": "ALERT", "when": {"avg": {"gte": 27}, "rise": {"gte": 2}, "max": {"lt": 60}}},
+            ],
+        },
+    ]
+}
+
+
+def metrics(current, avg=None, rise=0.0, humidity=50.0):
+    avg = current if avg is None else avg
+    return (current, avg, min(current, avg), max(current, avg), rise, 30.0, humidity)
+
+
+def test_groups_resolve_by_exact_id_then_glob_then_default():
+    rules = CompiledRules(COLD_ROOM, DEFAULTS)
+    assert rules.resolve("freezer-01").name == "cold-storage"
+    assert rules.resolve("cold-7").name == "cold-storage"
+    assert rules.resolve("srv-a").name == "server-room"
+    assert rules.resolve("lobby") is DEFAULTS
+    rules.resolve("cold-7")
+    assert rules.resolve.cache_info().hits == 1
+
+
+def test_group_rules_pick_the_most_severe_match():
+    rules = CompiledRules(COLD_ROOM, DEFAULTS)
+    cold = rules.resolve("cold-1")
+    assert cold.evaluate(metrics(-20.0)).level == "OK"
+    assert cold.evaluate(metrics(-12.0)).level == "WARN"
+    rule = cold.evaluate(metrics(-8.0))
+    assert (rule.level, rule.reason(metrics(-8.0))) == ("ALERT", "Freezer -8.0°C.")
+
+    server = rules.resolve("srv-1")
+    assert server.evaluate(metrics(28.0, avg=27.5, rise=1.0)).level == "OK"
+    assert server.evaluate(metrics(28.0, avg=27.5, rise=2.5)).level == "ALERT"
+    assert server.evaluate(metrics(22.0, humidity=80.0)).level == "WARN"
+    assert server.evaluate(metrics(22.0, humidity=None)).level == "OK"
+
+
+@pytest.mark.parametrize(
+    "document",
+    [
+        {"groups": [{"name": "x", "devices": ["a"], "rules": [{"level": "PANIC", "when": {"current": {"gte": 1}}}]}]},
+        {"groups": [{"name": "x", "devices": ["a"], "rules": [{"level": "WARN", "when": {"pressure": {"gte": 1}}}]}]},
+        {"groups": [{"name": "x", "devices": ["a"], "rules": [{"level": "WARN", "when": {"current": {"approx": 1}}}]}]},
+        {"groups": [{"name": "x", "devices": ["a"], "rules": [{"level": "WARN", "when": {"current": {"gte": 1}}, "reason": "{oops}"}]}]},
+        {"groups": [{"name": "x", "devices": ["a"], "rules": [{"level": "WARN", "when": {"current": {"gte": 1}}, "reason": "{current[0]}"}]}]},
+        {"groups": [{"name": "x", "devices": ["a"], "rules": [{"level": "WARN", "when": {"current": {"gte": 1}}, "reason": "{current.x}"}]}]},
+        {"groups": [{"name": "x", "rules": []}]},
+    ],
+)
+def test_invalid_configuration_is_rejected_at_load(document):
+    with pytest.raises(RuleConfigError):
+        CompiledRules(document, DEFAULTS)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_rule_file_hot_reloads_and_keeps_last_good_rules(tmp_path):
+    path = tmp_path / "rules.json"
+    clock = FakeClock()
+    book = RuleBook(str(path), DEFAULTS, reload_seconds=5.0, clock=clock)
+    assert book.for_device("cold-1") is DEFAULTS
+
+    path.write_text(json.dumps(COLD_ROOM))
+    assert book.for_device("cold-1") is DEFAULTS  # not checked again yet
+    clock.now = 5.0
+    assert book.for_device("cold-1").name == "cold-storage"
+
+    path.write_text("{ not json")
+    clock.now = 10.0
+    assert book.for_device("cold-1").name == "cold-storage"
+    assert book.stats()["reload_failed"] == 1
+
+    clock.now = 15.0
+    book.for_device("cold-1")
+    assert book.stats()["reload_failed"] == 2  # the broken file is retried, not remembered as loaded
+
+    path.unlink()
+    clock.now = 20.0
+    assert book.for_device("cold-1") is DEFAULTS
+    assert book.stats()["reloads"] == 2
+
+
+def test_bad_reason_template_never_escapes_the_rule_book(tmp_path):
+    path = tmp_path / "rules.json"
+    bad = {"groups": [{"name": "x", "devices": ["a"], "rules": [{"level": "WARN", "when": {"current": {"gte": 1}}, "reason": "{current[0]}"}]}]}
+    path.write_text(json.dumps(bad))
+    clock = FakeClock()
+    book = RuleBook(str(path), DEFAULTS, reload_seconds=5.0, clock=clock)  # startup must not crash
+    assert book.for_device("a") is DEFAULTS and book.stats()["reload_failed"] == 1
+
+    path.write_text(json.dumps(COLD_ROOM))
+    clock.now = 5.0
+    assert book.for_device("cold-1").name == "cold-storage"
+    path.write_text(json.dumps(bad) + " ")
+    clock.now = 10.0
+    assert book.for_device("cold-1").name == "cold-storage"
+    assert book.stats()["reload_failed"] == 2
+
+
+def test_engine_applies_device_group_rules(tmp_path):
+    path = tmp_path / "rules.json"
+    path.write_text(json.dumps(COLD_ROOM))
+    engine = InsightEngine(Settings(RULES_PATH=str(path)))
+    engine._workers = SimpleNamespace(submit=lambda device_id, job: job() or True)
+    engine._summarizer = SimpleNamespace(summarize=lambda context: {"summary": "ok", "recommendation": "ok"})
+    published = []
+    engine._publish_insight = lambda device_id, insight: published.append((device_id, insight.level, insight.reason))
+    engine._process_reading("cold-1", make_reading(-5.0))
+    engine._process_reading("lobby", make_reading(-5.0))
+    assert published == [("cold-1", "ALERT", "Freezer -5.0°C."), ("lobby", "OK", "Suhu dalam rentang aman.")]
+    assert engine._rules.stats()["groups"] == 2
@@ -0,0 +1,118 @@
+import sqlite3
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import pytest
+
+from app.models import Reading
+from app.storage import ReadingWriter, ReadPool
+
+MIGRATION = Path(__file__).resolve().parents[2] / "db" / "migrations" / "001_init.sql"
+BASE = datetime(2024, 1, 1, 12, 0, tzinfo=timezone.utc)
+
+
+def make_db(tmp_path):
+    db_path = str(tmp_path / "siapsuhu.db")
+    conn = sqlite3.connect(db_path)
+    conn.executescript(MIGRATION.read_text())
+    conn.close()
+    return db_path
+
+
+def cut_over(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.executescript((MIGRATION.parent / "002_readings_v2.sql").read_text())
+    conn.executescript(
+        "DROP TABLE readings; CREATE VIEW readings AS SELECT device_id, ts_ms AS ts, temp_c, humidity, rssi FROM readings_v2;"
+    )
+    conn.close()
+
+
+def test_writer_group_commits_batches(tmp_path):
+    db_path = make_db(tmp_path)
+    writer = ReadingWriter(db_path, batch_size=50, flush_ms=50, buffer_size=1000, put_timeout=1.0)
+    writer.start()
+    for index in range(120):
+        reading = Reading(ts=BASE + timedelta(seconds=5 * index), temp_c=25.0, humidity=50.0, rssi=None)
+        assert writer.write(f"dev-{index % 3}", reading)
+    writer.stop()
+
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("SELECT COUNT(*) FROM readings").fetchone()[0] == 120
+    assert conn.execute("SELECT ts FROM readings ORDER BY ts LIMIT 1").fetchone()[0] == "2024-01-01T12:00:00Z"
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    conn.close()
+    stats = writer.stats()
+    assert stats["written"] == 120
+    assert stats["batches"] <= 4
+
+
+def test_writer_drops_after_backpressure_timeout(tmp_path):
+    writer = ReadingWriter(make_db(tmp_path), batch_size=10, flush_ms=10, buffer_size=2, put_timeout=0.01)
+    reading = Reading(ts=BASE, temp_c=25.0, humidity=50.0, rssi=None)
+    assert writer.write("dev", reading)
+    assert writer.write("dev", reading)
+    assert not writer.write("dev", reading)
+    assert writer.stats()["dropped"] == 1
+
+
+def test_writer_skips_rows_node_red_already_stored_in_legacy_table(tmp_path):
+    db_path = make_db(tmp_path)
+    conn = sqlite3.connect(db_path)
+    conn.execute(
+        "INSERT INTO readings(device_id, ts, temp_c, humidity, rssi) VALUES ('dev', '2024-01-01T12:00:00Z', 25.0, 50.0, -60)"
+    )
+    conn.commit()
+    conn.close()
+    writer = ReadingWriter(db_path, batch_size=10, flush_ms=10, buffer_size=100, put_timeout=1.0)
+    writer.start()
+    for seconds in (0, 5, 5):
+        writer.write("dev", Reading(ts=BASE + timedelta(seconds=seconds), temp_c=25.0, humidity=50.0, rssi=-60))
+    writer.stop()
+
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("SELECT COUNT(*) FROM readings").fetchone()[0] == 2
+    conn.close()
+    assert writer.stats()["written"] == 1 and writer.stats()["duplicates"] == 2
+
+
+def test_writer_survives_a_failing_batch(tmp_path):
+    writer = ReadingWriter(make_db(tmp_path), batch_size=1, flush_ms=10, buffer_size=100, put_timeout=1.0)
+    writer.start()
+    writer.write("dev", Reading(ts=None, temp_c=25.0, humidity=50.0, rssi=None))  # not a sqlite3.Error
+    writer.write("dev", Reading(ts=BASE, temp_c=25.0, humidity=50.0, rssi=None))
+    writer.stop()
+    assert writer.stats()["failed"] == 1 and writer.stats()["written"] == 1
+
+
+def test_writer_targets_v2_table_after_cutover(tmp_path):
+    db_path = make_db(tmp_path)
+    cut_over(db_path)
+
+    writer = ReadingWriter(db_path, batch_size=10, flush_ms=10, buffer_size=100, put_timeout=1.0)
+    writer.start()
+    reading = Reading(ts=BASE, temp_c=25.0, humidity=50.0, rssi=-60)
+    writer.write("dev", reading)
+    writer.write("dev", reading)
+    writer.stop()
+
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("SELECT device_id, ts_ms FROM readings_v2").fetchall() == [("dev", 1704110400000)]
+    conn.close()
+
+
+def test_read_pool_is_read_only_and_bounded(tmp_path):
+    pool = ReadPool(make_db(tmp_path), size=1, timeout=0.01)
+    with pool.connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM readings").fetchone()[0] == 0
+        with pytest.raises(sqlite3.OperationalError):
+            conn.execute("INSERT INTO readings(device_id, ts, temp_c, humidity) VALUES ('dev', 'x', 1, 1)")
+        with pytest.raises(TimeoutError):
+            with pool.connection():
+                pass
+    with pool.connection():
+        pass
+    stats = pool.stats()
+    assert stats["open"] == 1
+    assert stats["waited"] == 1
+    pool.close()
@@ -0,0 +1,129 @@
+import json
+import sqlite3
+from types import SimpleNamespace
+
+from app.config import Settings
+from app.history import format_ms
+from app.models import Reading
+from app.service import InsightEngine
+from app.warmstart import decode_snapshot, encode_snapshot, read_snapshot, recent_samples, write_snapshot
+from app.window import from_epoch
+from tests.test_history import BASE_MS, MIGRATIONS, insert, make_v2_db
+
+NOW = BASE_MS / 1000 + 600
+
+
+def make_engine(tmp_path, **overrides):
+    settings = Settings(DB_PATH=str(tmp_path / "siapsuhu.db"), STATE_SNAPSHOT_PATH=str(tmp_path / "state.json.z"), **overrides)
+    engine = InsightEngine(settings)
+    engine._summarizer = SimpleNamespace(summarize=lambda context: {"summary": "ok", "recommendation": "ok"})
+    return engine
+
+
+def feed(engine, device_id, seconds, temp_c):
+    ts = BASE_MS + seconds * 1000
+    payload = {"device_id": device_id, "ts": format_ms(ts), "temp_c": temp_c, "humidity": 50.0}
+    engine._on_message(None, None, SimpleNamespace(payload=json.dumps(payload).encode()))
+
+
+def test_snapshot_round_trip_and_corrupt_file(tmp_path):
+    data = encode_snapshot({"dev": [(1.0, 25.0, 50.0, None), (2.0, 26.0, 51.0, -60)], "idle": []}, {"last": {}}, 3.0)
+    document = decode_snapshot(data)
+    assert document["windows"] == {"dev": {"ts": [1.0, 2.0], "temp_c": [25.0, 26.0], "humidity": [50.0, 51.0], "rssi": [None, -60]}}
+    assert document["saved_at"] == 3.0
+
+    path = tmp_path / "state.json.z"
+    write_snapshot(str(path), data)
+    assert read_snapshot(str(path)) == document
+    path.write_bytes(b"not a snapshot")
+    assert read_snapshot(str(path)) is None
+    assert read_snapshot(str(tmp_path / "missing")) is None
+
+
+def test_recent_samples_batches_devices_v2(tmp_path):
+    conn = make_v2_db(tmp_path)
+    rows = [(f"dev-{device}", BASE_MS + second * 1000, 20.0 + second, 50.0) for device in range(5) for second in range(0, 100, 10)]
+    insert(conn, rows)
+    insert(conn, [("old", BASE_MS - 3_600_000, 20.0, 50.0)])
+
+    result = dict(recent_samples(str(tmp_path / "siapsuhu.db"), BASE_MS + 50_000, batch_size=2, keep=lambda device: device != "dev-3"))
+    assert sorted(result) == ["dev-0", "dev-1", "dev-2", "dev-4"]
+    assert [sample[0] for sample in result["dev-0"]] == [(BASE_MS + second * 1000) / 1000 for second in range(50, 100, 10)]
+
+
+def test_recent_samples_legacy_layout(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "siapsuhu.db"), isolation_level=None)
+    conn.executescript((MIGRATIONS / "001_init.sql").read_text())
+    conn.executemany(
+        "INSERT INTO readings(device_id, ts, temp_c, humidity, rssi) VALUES (?, ?, ?, 50.0, -70)",
+        [("dev", "2024-01-01T11:59:00.000Z", 24.0), ("dev", "2024-01-01T12:00:10.000Z", 25.0)],
+    )
+    assert list(recent_samples(str(tmp_path / "siapsuhu.db"), BASE_MS)) == [("dev", [(BASE_MS / 1000 + 10, 25.0, 50.0, -70)])]
+
+
+def test_restart_keeps_alert_cooldown_and_window(tmp_path):
+    first = make_engine(tmp_path)
+    published = []
+    first._publish_insight = lambda device_id, insight: published.append(insight.level)
+    first._workers.start()
+    try:
+        feed(first, "dev", 0, 25.0)
+        feed(first, "dev", 30, 36.0)
+        assert first._workers.join(timeout=5)
+    finally:
+        first._workers.stop()
+    first._snapshotter.save()
+    assert published == ["OK", "ALERT"]
+
+    second = make_engine(tmp_path)
+    second._publish_insight = lambda device_id, insight: published.append(insight.level)
+    result = second.warm_start(now=BASE_MS / 1000 + 60)
+    assert result["snapshot_devices"] == 1 and result["emission_devices"] == 1
+    assert second._states.get("dev").window.stats().count == 2
+    second._workers.start()
+    try:
+        feed(second, "dev", 60, 36.5)  # still inside the ALERT cooldown
+        assert second._workers.join(timeout=5)
+    finally:
+        second._workers.stop()
+    assert published == ["OK", "ALERT"]
+    assert second._emission.stats()["suppressed_cooldown"] == 1
+
+
+def test_warm_start_merges_database_rows_after_snapshot(tmp_path):
+    conn = make_v2_db(tmp_path)
+    insert(conn, [("dev", BASE_MS + second * 1000, 25.0, 50.0) for second in range(0, 300, 30)])
+    engine = make_engine(tmp_path)
+    write_snapshot(engine._snapshot_path, encode_snapshot({"dev": [(BASE_MS / 1000, 25.0, 50.0, None)]}, {}, 0.0))
+
+    result = engine.warm_start(now=NOW)
+    assert result["db_devices"] == 1 and result["db_rows"] == 10
+    assert engine._states.get("dev").window.stats().count == 10  # the snapshot sample is a duplicate
+
+
+def test_warm_start_respects_partition(tmp_path):
+    conn = make_v2_db(tmp_path)
+    insert(conn, [(f"dev-{index}", BASE_MS, 25.0, 50.0) for index in range(20)])
+    engine = make_engine(tmp_path, WORKER_INDEX=1, WORKER_COUNT=2)
+    engine.warm_start(now=NOW)
+    assert engine._states and all(engine._partition.owns(device) for device in engine._states)
+    assert engine._snapshot_path.endswith(".1")
+
+
+def test_sub_millisecond_timestamps_are_not_replayed_twice(tmp_path):
+    # publish_dummy-style timestamps carry microseconds; SQLite keeps ts_ms.
+    readings = [(BASE_MS / 1000 + second * 5 + 0.000437, 25.0 + second % 3) for second in range(20)]
+    first = make_engine(tmp_path)
+    first._workers = SimpleNamespace(submit=lambda device_id, job: True)
+    for ts, temp in readings:
+        first._process_reading("dev", Reading(ts=from_epoch(ts), temp_c=temp, humidity=50.0, rssi=None))
+    first._snapshotter.save()
+    conn = make_v2_db(tmp_path)
+    insert(conn, [("dev", round(ts * 1000), temp, 50.0) for ts, temp in readings])
+
+    second = make_engine(tmp_path)
+    result = second.warm_start(now=readings[-1][0] + 1)
+    assert result["db_rows"] == 20
+    window = second._states.get("dev").window
+    assert window.stats().count == 20
+    assert second._ingest_stats()["reordered"] == 0
@@ -0,0 +1,82 @@
+import random
+import statistics
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.service import Reading, determine_level
+from app.window import APPENDED, DUPLICATE, REORDERED, STALE, RollingWindow
+
+BASE = datetime(2024, 1, 1, 12, 0, tzinfo=timezone.utc)
+
+
+def make_reading(temp, seconds):
+    return Reading(ts=BASE + timedelta(seconds=seconds), temp_c=temp, humidity=50.0, rssi=-60)
+
+
+def test_stats_match_full_scan():
+    rng = random.Random(7)
+    window = RollingWindow(span=timedelta(minutes=1), delta_horizon=timedelta(seconds=20))
+    history = []
+    for step in range(500):
+        reading = make_reading(rng.uniform(20.0, 40.0), step * 5)
+        window.prune(reading.ts)
+        window.append(reading)
+        history.append(reading)
+        live = [r for r in history if r.ts >= reading.ts - timedelta(minutes=1)]
+        horizon = [r for r in live if r.ts >= reading.ts - timedelta(seconds=20)]
+        stats = window.stats()
+        temps = [r.temp_c for r in live]
+        assert stats.count == len(live)
+        assert stats.avg_c == pytest.approx(statistics.fmean(temps))
+        assert stats.std_c == pytest.approx(statistics.pstdev(temps), abs=1e-6)
+        assert stats.min_c == min(temps)
+        assert stats.max_c == max(temps)
+        assert stats.rise_c == pytest.approx(max(reading.temp_c - min(r.temp_c for r in horizon), 0.0))
+
+
+def test_gradual_rise_triggers_delta_alert():
+    window = RollingWindow(span=timedelta(minutes=15), delta_horizon=timedelta(seconds=120))
+    for step, temp in enumerate([26.0, 28.0, 30.0, 32.0]):
+        current = make_reading(temp, step * 5)
+        window.prune(current.ts)
+        window.append(current)
+    level, reason = determine_level(current, window.rise_baseline(), 33, 35, 5)
+    assert level == "ALERT"
+    assert "naik 6.0" in reason
+    assert window.stats().rise_seconds == 15
+
+
+def test_no_baseline_when_latest_is_lowest():
+    window = RollingWindow(span=timedelta(minutes=15), delta_horizon=timedelta(seconds=120))
+    for step, temp in enumerate([30.0, 29.0, 28.0]):
+        window.append(make_reading(temp, step * 5))
+    assert window.rise_baseline() is None
+    assert window.stats().rise_c == 0.0
+
+
+def test_capacity_overwrites_oldest_sample():
+    window = RollingWindow(span=timedelta(hours=1), delta_horizon=timedelta(seconds=120), capacity=4, initial_capacity=2)
+    for step, temp in enumerate([40.0, 20.0, 21.0, 22.0, 23.0, 24.0]):
+        window.append(make_reading(temp, step * 5))
+    stats = window.stats()
+    assert stats.count == 4
+    assert stats.max_c == 24.0
+    assert stats.min_c == 21.0
+    assert window.last == make_reading(24.0, 25)
+
+
+def test_duplicates_and_late_readings():
+    window = RollingWindow(span=timedelta(minutes=1), delta_horizon=timedelta(seconds=20))
+    for seconds in (0, 10, 20):
+        assert window.add(make_reading(25.0 + seconds / 10, seconds)) == APPENDED
+    assert window.add(make_reading(27.0, 20)) == DUPLICATE
+    assert window.add(make_reading(26.0, 10)) == DUPLICATE
+    assert window.add(make_reading(20.0, 5)) == REORDERED
+    assert window.add(make_reading(20.0, -60)) == STALE
+    stats = window.stats()
+    assert stats.count == 4
+    assert stats.min_c == 20.0
+    assert window.last == make_reading(27.0, 20)
+    assert window.add(make_reading(27.5, 80)) == APPENDED
+    assert len(window) == 2
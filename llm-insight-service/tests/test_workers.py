@@ -0,0 +1,169 @@
+import json
+import threading
+import time
+from types import SimpleNamespace
+
+from app.config import Settings
+from app.service import InsightEngine
+from app.workers import DeviceWorkerPool
+
+
+def test_jobs_for_same_device_run_in_order():
+    pool = DeviceWorkerPool(max_workers=4, max_pending=100)
+    seen = []
+    pool.start()
+    try:
+        for index in range(20):
+            pool.submit("dev-1", lambda index=index: (time.sleep(0.001), seen.append(index)))
+        assert pool.join(timeout=5)
+    finally:
+        pool.stop()
+    assert seen == list(range(20))
+
+
+def test_concurrency_is_capped():
+    pool = DeviceWorkerPool(max_workers=2, max_pending=100)
+    lock = threading.Lock()
+    active = {"now": 0, "peak": 0}
+
+    def job():
+        with lock:
+            active["now"] += 1
+            active["peak"] = max(active["peak"], active["now"])
+        time.sleep(0.01)
+        with lock:
+            active["now"] -= 1
+
+    pool.start()
+    try:
+        for index in range(10):
+            pool.submit(f"dev-{index}", job)
+        assert pool.join(timeout=5)
+    finally:
+        pool.stop()
+    assert active["peak"] == 2
+
+
+def test_submit_rejects_when_full():
+    pool = DeviceWorkerPool(max_workers=1, max_pending=2)
+    assert pool.submit("a", lambda: None)
+    assert pool.submit("b", lambda: None)
+    assert not pool.submit("c", lambda: None)
+    assert pool.stats()["rejected"] == 1
+
+
+def test_forced_job_waits_behind_its_device():
+    pool = DeviceWorkerPool(max_workers=1, max_pending=1)
+    seen = []
+    assert pool.submit("a", lambda: seen.append("queued"))
+    assert not pool.submit("a", lambda: None)
+    assert pool.submit("a", lambda: seen.append("forced"), force=True)
+    pool.start()
+    try:
+        assert pool.join(timeout=5)
+    finally:
+        pool.stop()
+    assert seen == ["queued", "forced"]
+    assert pool.stats()["forced"] == 1
+
+
+class SlowSummarizer:
+    def __init__(self, delay):
+        self.delay = delay
+
+    def summarize(self, context):
+        time.sleep(self.delay)
+        return {"summary": "ok", "recommendation": "ok"}
+
+
+def test_ingest_does_not_wait_for_llm():
+    engine = InsightEngine(Settings(LLM_MAX_CONCURRENCY=2))
+    engine._summarizer = SlowSummarizer(0.2)
+    published = []
+    engine._publish_insight = lambda device_id, insight: published.append(device_id)
+    engine._workers.start()
+    try:
+        started = time.perf_counter()
+        for index in range(5):
+            payload = {
+                "device_id": f"dev-{index}",
+                "ts": "2024-01-01T12:00:00Z",
+                "temp_c": 31.0,
+                "humidity": 50.0,
+            }
+            engine._on_message(None, None, SimpleNamespace(payload=json.dumps(payload).encode()))
+        assert time.perf_counter() - started < 0.2
+        assert engine._workers.join(timeout=5)
+    finally:
+        engine._workers.stop()
+    assert sorted(published) == [f"dev-{index}" for index in range(5)]
+
+
+def test_redelivered_reading_does_not_publish_twice():
+    engine = InsightEngine(Settings())
+    engine._summarizer = SlowSummarizer(0)
+    published = []
+    engine._publish_insight = lambda device_id, insight: published.append(insight.level)
+    engine._workers.start()
+    payload = json.dumps(
+        {"device_id": "dev", "ts": "2024-01-01T12:00:00Z", "temp_c": 36.0, "humidity": 50.0}
+    ).encode()
+    try:
+        engine._on_message(None, None, SimpleNamespace(payload=payload))
+        engine._on_message(None, None, SimpleNamespace(payload=payload))
+        assert engine._workers.join(timeout=5)
+    finally:
+        engine._workers.stop()
+    assert published == ["ALERT"]
+    assert engine._ingest_counters["duplicate"] == 1
+
+
+class RecordingClient:
+    def __init__(self):
+        self.published = []
+
+    def publish(self, topic, payload, qos, retain):
+        self.published.append((topic, retain))
+        return SimpleNamespace(rc=0)
+
+
+def test_insights_are_published_to_level_and_latest_topics():
+    engine = InsightEngine(Settings(MQTT_INSIGHT_TOPIC_LAYOUT="level"))
+    engine._client = RecordingClient()
+    engine._summarizer = SlowSummarizer(0)
+    engine._workers.start()
+    try:
+        for ts, temp in (("2024-01-01T12:00:00Z", 25.0), ("2024-01-01T12:00:05Z", 36.0)):
+            payload = json.dumps({"device_id": "dev", "ts": ts, "temp_c": temp, "humidity": 50.0}).encode()
+            engine._on_message(None, None, SimpleNamespace(payload=payload))
+        assert engine._workers.join(timeout=5)
+    finally:
+        engine._workers.stop()
+    assert engine._client.published == [
+        ("siapsuhu/insight/ok/dev", False),
+        ("siapsuhu/latest/dev", True),
+        ("siapsuhu/insight/alert/dev", False),
+        ("siapsuhu/latest/dev", True),
+    ]
+
+
+def test_flat_layout_is_the_default():
+    engine = InsightEngine(Settings())
+    assert engine.insight_topic("dev", "ALERT") == "siapsuhu/insight/dev"
+
+
+def test_fallback_for_full_queue_keeps_device_order():
+    engine = InsightEngine(Settings(LLM_MAX_CONCURRENCY=1, LLM_QUEUE_SIZE=1))
+    engine._summarizer = SlowSummarizer(0)
+    published = []
+    engine._publish_insight = lambda device_id, insight: published.append(insight.level)
+    for second, temp in ((0, 31.0), (5, 40.0)):
+        payload = {"device_id": "dev", "ts": f"2024-01-01T12:00:0{second}Z", "temp_c": temp, "humidity": 50.0}
+        engine._on_message(None, None, SimpleNamespace(topic="siapsuhu/telemetry/dev", payload=json.dumps(payload).encode()))
+    assert published == []  # the ALERT fallback queued behind the WARN instead of overtaking it
+    engine._workers.start()
+    try:
+        assert engine._workers.join(timeout=5)
+    finally:
+        engine._workers.stop()
+    assert published == ["WARN", "ALERT"]
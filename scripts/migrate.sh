@@ -11,10 +11,21 @@ fi
 
 mkdir -p "$(dirname "$DB_PATH")"
 
+# Catat migrasi yang sudah dijalankan agar tiap file hanya dieksekusi sekali
+# (setelah cutover v2, `readings` berupa view sehingga 001 tidak boleh diulang).
+sqlite3 "$DB_PATH" "CREATE TABLE IF NOT EXISTS schema_migrations (name TEXT PRIMARY KEY, applied_at TEXT NOT NULL);"
+
 for migration in "${MIGRATIONS_DIR}"/*.sql; do
   [ -e "$migration" ] || continue
+  name="$(basename "$migration")"
+  applied="$(sqlite3 "$DB_PATH" "SELECT COUNT(*) FROM schema_migrations WHERE name = '${name}';")"
+  if [ "$applied" != "0" ]; then
+    continue
+  fi
   echo "Menjalankan migrasi ${migration}"
   sqlite3 "$DB_PATH" < "$migration"
+  sqlite3 "$DB_PATH" "INSERT INTO schema_migrations(name, applied_at) VALUES ('${name}', strftime('%Y-%m-%dT%H:%M:%SZ', 'now'));"
 done
 
 echo "Migrasi selesai -> ${DB_PATH}"
+echo "Untuk memindahkan data ke layout readings_v2 jalankan: python3 scripts/migrate_readings_v2.py --db ${DB_PATH}"
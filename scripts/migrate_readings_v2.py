@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""Migrasi online tabel `readings` (ts TEXT + rowid) ke `readings_v2` (WITHOUT ROWID, ts_ms INTEGER).
+
+Data disalin per potongan rowid dalam transaksi pendek sehingga penulis lain
+(Node-RED / LLM Insight Service) tetap bisa menulis di sela-selanya. Progres
+disimpan di tabel `migration_state`, jadi script aman dihentikan lalu dijalankan
+ulang. Setelah semua data tersalin, tabel lama diganti nama menjadi
+`readings_legacy` dan `readings` menjadi view kompatibilitas (dengan trigger
+INSTEAD OF INSERT) di atas `readings_v2`.
+"""
+import argparse
+import sqlite3
+import time
+from pathlib import Path
+
+MIGRATION_SQL = Path(__file__).resolve().parents[1] / "db" / "migrations" / "002_readings_v2.sql"
+STATE_KEY = "readings_v2.copied_rowid"
+DONE_KEY = "readings_v2.cutover"
+
+TS_MS_SQL = "CAST(round((julianday({column}) - 2440587.5) * 86400000.0) AS INTEGER)"
+
+COPY_SQL = (
+    "INSERT OR IGNORE INTO readings_v2(device_id, ts_ms, temp_c, humidity, rssi) "
+    f"SELECT device_id, {TS_MS_SQL.format(column='ts')}, temp_c, humidity, rssi FROM readings "
+    "WHERE rowid > ? AND rowid <= ? AND julianday(ts) IS NOT NULL"
+)
+
+VIEW_SQL = """
+CREATE VIEW readings AS
+SELECT device_id,
+       strftime('%Y-%m-%dT%H:%M:%fZ', ts_ms / 1000.0, 'unixepoch') AS ts,
+       temp_c,
+       humidity,
+       rssi
+FROM readings_v2
+"""
+
+TRIGGER_SQL = f"""
+CREATE TRIGGER readings_insert INSTEAD OF INSERT ON readings
+BEGIN
+    INSERT OR IGNORE INTO readings_v2(device_id, ts_ms, temp_c, humidity, rssi)
+    VALUES (NEW.device_id, {TS_MS_SQL.format(column='NEW.ts')}, NEW.temp_c, NEW.humidity, NEW.rssi);
+END
+"""
+
+
+def get_state(conn: sqlite3.Connection, key: str, default: str) -> str:
+    row = conn.execute("SELECT value FROM migration_state WHERE name = ?", (key,)).fetchone()
+    return row[0] if row else default
+
+
+def set_state(conn: sqlite3.Connection, key: str, value: str) -> None:
+    conn.execute(
+        "INSERT INTO migration_state(name, value) VALUES (?, ?) ON CONFLICT(name) DO UPDATE SET value = excluded.value",
+        (key, value),
+    )
+
+
+def copy_chunk(conn: sqlite3.Connection, start: int, end: int) -> None:
+    conn.execute(COPY_SQL, (start, end))
+    set_state(conn, STATE_KEY, str(end))
+
+
+def migrate(db_path: str, chunk_size: int, pause: float) -> None:
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA busy_timeout=5000")
+    conn.executescript(MIGRATION_SQL.read_text())
+
+    if get_state(conn, DONE_KEY, "0") == "1":
+        print("readings sudah memakai layout v2, tidak ada yang dikerjakan.")
+        return
+    kind = conn.execute("SELECT type FROM sqlite_master WHERE name = 'readings'").fetchone()
+    if kind is None or kind[0] != "table":
+        raise SystemExit("Tabel readings tidak ditemukan; jalankan migrasi 001 terlebih dahulu.")
+
+    copied = int(get_state(conn, STATE_KEY, "0"))
+    while True:
+        max_rowid = conn.execute("SELECT COALESCE(MAX(rowid), 0) FROM readings").fetchone()[0]
+        if max_rowid - copied <= chunk_size:
+            break
+        end = copied + chunk_size
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            copy_chunk(conn, copied, end)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        copied = end
+        print(f"disalin hingga rowid {copied}/{max_rowid}")
+        time.sleep(pause)
+
+    # Cutover: copy the tail and swap in the compatibility view atomically.
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        max_rowid = conn.execute("SELECT COALESCE(MAX(rowid), 0) FROM readings").fetchone()[0]
+        copy_chunk(conn, copied, max_rowid)
+        skipped = conn.execute("SELECT COUNT(*) FROM readings WHERE julianday(ts) IS NULL").fetchone()[0]
+        conn.execute("ALTER TABLE readings RENAME TO readings_legacy")
+        conn.execute(VIEW_SQL)
+        conn.execute(TRIGGER_SQL)
+        set_state(conn, DONE_KEY, "1")
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    total = conn.execute("SELECT COUNT(*) FROM readings_v2").fetchone()[0]
+    print(f"Cutover selesai: {total} baris di readings_v2, {skipped} baris dengan ts tidak valid dilewati.")
+    print("Tabel lama disimpan sebagai readings_legacy; hapus manual bila sudah tidak diperlukan.")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default="./data/sqlite/siapsuhu.db", help="Lokasi file SQLite")
+    parser.add_argument("--chunk-size", type=int, default=20000, help="Jumlah rowid per transaksi")
+    parser.add_argument("--pause", type=float, default=0.05, help="Jeda antar potongan (detik)")
+    args = parser.parse_args()
+    migrate(args.db, args.chunk_size, args.pause)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,45 +3,93 @@
 import argparse
 import json
 import random
+import struct
 import time
 from datetime import datetime, timezone
 
 import paho.mqtt.client as mqtt
 
 
-def build_payload(device_id: str) -> str:
+# Format batch biner (lihat llm-insight-service/app/decoder.py).
+BATCH_MAGIC = b"SSB1"
+BATCH_HEADER = struct.Struct("!dH")
+BATCH_SAMPLE = struct.Struct("!IhHb")
+RSSI_NONE = 127
+
+
+def sample_reading():
     base_temp = random.uniform(24.0, 29.0)
     temp = base_temp + random.uniform(-1.5, 4.5)
     humidity = random.uniform(40.0, 70.0)
+    return round(temp, 2), round(humidity, 2), random.randint(-70, -40)
+
+
+def iso_now(now: datetime) -> str:
+    return now.isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+
+def build_payload(device_id: str) -> str:
+    temp, humidity, rssi = sample_reading()
     payload = {
         "device_id": device_id,
         "ts": datetime.now(timezone.utc).isoformat().replace("+00:00", "Z"),
-        "temp_c": round(temp, 2),
-        "humidity": round(humidity, 2),
-        "rssi": random.randint(-70, -40),
+        "temp_c": temp,
+        "humidity": humidity,
+        "rssi": rssi,
         "fw": "siap-suhu-sim"
     }
     return json.dumps(payload)
 
 
+def build_batch_payload(device_id: str, samples, fmt: str):
+    """samples: list of (datetime, temp, humidity, rssi) yang dibuffer perangkat."""
+    base = samples[0][0]
+    offsets = [(int((ts - base).total_seconds() * 1000), temp, humidity, rssi) for ts, temp, humidity, rssi in samples]
+    if fmt == "binary":
+        raw_id = device_id.encode("utf-8")
+        parts = [BATCH_MAGIC, bytes([len(raw_id)]), raw_id, BATCH_HEADER.pack(base.timestamp(), len(offsets))]
+        for offset_ms, temp, humidity, rssi in offsets:
+            parts.append(BATCH_SAMPLE.pack(offset_ms, round(temp * 100), round(humidity * 100), RSSI_NONE if rssi is None else rssi))
+        return b"".join(parts)
+    payload = {
+        "device_id": device_id,
+        "fw": "siap-suhu-sim",
+        "base_ts": iso_now(base),
+        "samples": [list(sample) for sample in offsets],
+    }
+    return json.dumps(payload, separators=(",", ":"))
+
+
 def main() -> None:
     parser = argparse.ArgumentParser(description="Publish data telemetry dummy Siap Suhu")
     parser.add_argument("--host", default="127.0.0.1", help="Alamat broker MQTT")
     parser.add_argument("--port", type=int, default=1883, help="Port broker MQTT")
     parser.add_argument("--device", default="SIM-001", help="Device ID yang digunakan")
-    parser.add_argument("--interval", type=float, default=5.0, help="Interval publish (detik)")
+    parser.add_argument("--interval", type=float, default=5.0, help="Interval sampling (detik)")
+    parser.add_argument("--batch", type=int, default=1, help="Jumlah sampel per pesan (>1 = mode batch)")
+    parser.add_argument("--format", choices=["compact", "binary"], default="compact", help="Format payload batch")
     args = parser.parse_args()
 
     client = mqtt.Client()
     client.connect(args.host, args.port, keepalive=30)
     client.loop_start()
-    topic = f"siapsuhu/telemetry/{args.device}"
+    batching = args.batch > 1
+    topic = f"siapsuhu/telemetry-batch/{args.device}" if batching else f"siapsuhu/telemetry/{args.device}"
     print(f"Mulai publish ke {topic} -> {args.host}:{args.port}")
+    buffered = []
     try:
         while True:
-            payload = build_payload(args.device)
-            client.publish(topic, payload=payload, qos=1, retain=False)
-            print(payload)
+            if not batching:
+                payload = build_payload(args.device)
+                client.publish(topic, payload=payload, qos=1, retain=False)
+                print(payload)
+            else:
+                buffered.append((datetime.now(timezone.utc), *sample_reading()))
+                if len(buffered) >= args.batch:
+                    payload = build_batch_payload(args.device, buffered, args.format)
+                    client.publish(topic, payload=payload, qos=1, retain=False)
+                    print(f"batch {len(buffered)} sampel, {len(payload)} byte ({args.format})")
+                    buffered = []
             time.sleep(args.interval)
     except KeyboardInterrupt:
         print("Berhenti.")
@@ -1,3 +1,5 @@
+from typing import List
+
 from pydantic import BaseSettings, Field
 
 
@@ -7,15 +9,53 @@ class Settings(BaseSettings):
     mqtt_user: str = Field("", alias="MQTT_USER")
     mqtt_pass: str = Field("", alias="MQTT_PASS")
     mqtt_keepalive: int = Field(60, alias="MQTT_KEEPALIVE")
-    mqtt_topic: str = Field("siapsuhu/insight/#", alias="MQTT_INSIGHT_TOPIC")
+    # Comma-separated filters; empty derives them from the engine's topic
+    # prefix and layout (both services read the same .env).
+    mqtt_topic: str = Field("", alias="NOTIFIER_INSIGHT_TOPICS")
+    # Older setups set this to the notifier's filter ("siapsuhu/insight/#"); the
+    # engine reads the same name as its publish prefix ("siapsuhu/insight").
+    legacy_mqtt_topic: str = Field("", alias="MQTT_INSIGHT_TOPIC")
+    insight_topic_layout: str = Field("flat", alias="MQTT_INSIGHT_TOPIC_LAYOUT", regex="^(flat|level)$")
+    # Retained latest insight per device published by the engine (all levels);
+    # it feeds the /status, /top, /alerts and /stale view. Empty disables it.
+    insight_latest_prefix: str = Field("siapsuhu/latest", alias="MQTT_INSIGHT_LATEST_TOPIC")
     mqtt_reconnect_initial: float = Field(1.0, alias="MQTT_RECONNECT_INITIAL")
     mqtt_reconnect_max: float = Field(30.0, alias="MQTT_RECONNECT_MAX")
 
     telegram_bot_token: str = Field("", alias="TELEGRAM_BOT_TOKEN")
     telegram_chat_id: str = Field("", alias="TELEGRAM_CHAT_ID")
     notifier_cooldown: int = Field(120, alias="NOTIFIER_ALERT_COOLDOWN_SECONDS")
+    notifier_max_devices: int = Field(10000, alias="NOTIFIER_MAX_DEVICES")
+    notifier_idle_ttl_seconds: float = Field(3600.0, alias="NOTIFIER_IDLE_TTL_SECONDS")
+    # Telegram allows about 20 messages per minute into one group and 30 per
+    # second per bot overall.
+    notifier_chat_rate_per_minute: float = Field(20.0, alias="NOTIFIER_CHAT_RATE_PER_MINUTE")
+    notifier_chat_burst: int = Field(3, alias="NOTIFIER_CHAT_BURST")
+    notifier_global_rate_per_second: float = Field(30.0, alias="NOTIFIER_GLOBAL_RATE_PER_SECOND")
+    notifier_coalesce_seconds: float = Field(2.0, alias="NOTIFIER_COALESCE_SECONDS")
+    notifier_digest_max: int = Field(20, alias="NOTIFIER_DIGEST_MAX")
+    notifier_queue_size: int = Field(1000, alias="NOTIFIER_QUEUE_SIZE")
+    notifier_send_retries: int = Field(3, alias="NOTIFIER_SEND_RETRIES")
 
     status_history_size: int = Field(10, alias="NOTIFIER_STATUS_HISTORY_SIZE")
+    # The engine re-publishes at least every INSIGHT_HEARTBEAT_SECONDS (300) while a device reports.
+    notifier_stale_seconds: float = Field(900.0, alias="NOTIFIER_STALE_SECONDS")
+
+    @property
+    def mqtt_topics(self) -> List[str]:
+        configured = self.mqtt_topic
+        prefix = "siapsuhu/insight"
+        if not configured and self.legacy_mqtt_topic:
+            if any(char in self.legacy_mqtt_topic for char in "+#"):
+                configured = self.legacy_mqtt_topic
+            else:
+                prefix = self.legacy_mqtt_topic.rstrip("/")
+        if configured:
+            return [topic.strip() for topic in configured.split(",") if topic.strip()]
+        if self.insight_topic_layout == "level":
+            # The broker then only forwards WARN/ALERT insights.
+            return [f"{prefix}/warn/+", f"{prefix}/alert/+"]
+        return [f"{prefix}/#"]
 
     class Config:
         env_file = ".env"
@@ -0,0 +1,82 @@
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Generic, Iterator, Optional, Tuple, TypeVar
+
+V = TypeVar("V")
+
+
+class DeviceMap(Generic[V]):
+    """Per-device map bounded by a device cap and an idle TTL.
+
+    Entries are kept in least-recently-used order. Inserting beyond
+    ``max_devices`` evicts the least recently used device, and each ``get`` or
+    ``set`` also drops at most ``EXPIRE_BATCH`` of the oldest devices once they
+    have been idle for ``idle_ttl`` seconds, so eviction cost is amortized over
+    normal traffic instead of a periodic sweep. ``0`` disables either bound.
+    Not thread-safe; callers hold their own lock.
+    """
+
+    EXPIRE_BATCH = 2
+
+    def __init__(self, max_devices: int = 0, idle_ttl: float = 0.0, clock: Callable[[], float] = time.monotonic) -> None:
+        self.max_devices = max(0, max_devices)
+        self.idle_ttl = idle_ttl
+        self._clock = clock
+        self._entries: "OrderedDict[str, Tuple[float, V]]" = OrderedDict()
+        self.evicted_idle = 0
+        self.evicted_capacity = 0
+
+    def get(self, device_id: str) -> Optional[V]:
+        now = self._clock()
+        entry = self._entries.get(device_id)
+        if entry is not None:
+            self._entries[device_id] = (now, entry[1])
+            self._entries.move_to_end(device_id)
+        self._expire(now)
+        return entry[1] if entry is not None else None
+
+    def set(self, device_id: str, value: V) -> None:
+        now = self._clock()
+        if device_id in self._entries:
+            self._entries.move_to_end(device_id)
+        else:
+            self._expire(now)
+            if self.max_devices and len(self._entries) >= self.max_devices:
+                self._entries.popitem(last=False)
+                self.evicted_capacity += 1
+        self._entries[device_id] = (now, value)
+
+    def pop(self, device_id: str) -> Optional[V]:
+        entry = self._entries.pop(device_id, None)
+        return entry[1] if entry is not None else None
+
+    def _expire(self, now: float) -> None:
+        if not self.idle_ttl:
+            return
+        limit = now - self.idle_ttl
+        entries = self._entries
+        for _ in range(self.EXPIRE_BATCH):
+            if not entries or next(iter(entries.values()))[0] > limit:
+                return
+            entries.popitem(last=False)
+            self.evicted_idle += 1
+
+    def __contains__(self, device_id: object) -> bool:
+        return device_id in self._entries
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._entries))
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "tracked": len(self._entries),
+            "max_devices": self.max_devices,
+            "evicted_idle": self.evicted_idle,
+            "evicted_capacity": self.evicted_capacity,
+        }
+
+
+__all__ = ["DeviceMap"]
@@ -0,0 +1,139 @@
+import heapq
+import itertools
+import time
+from collections import Counter
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Tuple
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .service import Insight
+
+# (sort key, version, device_id); an entry is live while its version is the device's current one.
+HeapEntry = Tuple[float, int, str]
+
+
+class LatestStore:
+    """Latest insight per device, indexed for the bot's status queries.
+
+    An update replaces the device's entry, adjusts the per-level counters and
+    pushes one entry onto each of two heaps, hottest ``last_temp_c`` first
+    and oldest ``ts`` first, plus a third hottest-first heap for ALERT
+    insights. Superseded heap entries are dropped lazily when a query reaches
+    them, and the heaps are rebuilt once they hold more than twice the live
+    devices, so every update is O(log n) amortized and a query pops only what
+    it returns. Insights older
+    than the stored one (e.g. a retained message arriving after a live one)
+    are ignored. Beyond ``max_devices`` the device seen longest ago is
+    evicted; ``0`` disables the bound. Not thread-safe; the notifier only
+    touches it from the event loop.
+    """
+
+    COMPACT_SLACK = 64
+
+    def __init__(self, max_devices: int = 0, clock: Callable[[], float] = time.time) -> None:
+        self.max_devices = max(0, max_devices)
+        self._clock = clock
+        self._entries: Dict[str, Tuple[int, "Insight"]] = {}
+        self._levels: Counter = Counter()
+        self._hottest: List[HeapEntry] = []
+        self._alerts: List[HeapEntry] = []
+        self._oldest: List[HeapEntry] = []
+        self._versions = itertools.count()
+        self.updates = 0
+        self.ignored = 0
+        self.evicted = 0
+
+    def update(self, insight: "Insight") -> bool:
+        device_id = insight.device_id
+        current = self._entries.get(device_id)
+        if current is not None:
+            if insight.ts <= current[1].ts:
+                self.ignored += 1
+                return False
+            self._levels[current[1].level] -= 1
+        elif self.max_devices and len(self._entries) >= self.max_devices:
+            self._evict_oldest()
+        version = next(self._versions)
+        self._entries[device_id] = (version, insight)
+        self._levels[insight.level] += 1
+        if insight.level == "ALERT":
+            heapq.heappush(self._alerts, (-insight.last_temp_c, version, device_id))
+        heapq.heappush(self._hottest, (-insight.last_temp_c, version, device_id))
+        heapq.heappush(self._oldest, (insight.ts.timestamp(), version, device_id))
+        self.updates += 1
+        if len(self._hottest) > 2 * len(self._entries) + self.COMPACT_SLACK:
+            self._compact()
+        return True
+
+    def get(self, device_id: str) -> Optional["Insight"]:
+        entry = self._entries.get(device_id)
+        return entry[1] if entry is not None else None
+
+    def levels(self) -> Dict[str, int]:
+        return {level: count for level, count in self._levels.items() if count}
+
+    def hottest(self, limit: int) -> List["Insight"]:
+        return self._head(self._hottest, limit)
+
+    def alerts(self, limit: int) -> List["Insight"]:
+        """Devices whose latest insight is ALERT, hottest first."""
+        return self._head(self._alerts, limit)
+
+    def stale(self, older_than: float, limit: int) -> List["Insight"]:
+        """Devices whose latest insight is more than ``older_than`` seconds old, longest silent first."""
+        cutoff = self._clock() - older_than
+        return self._head(self._oldest, limit, stop=lambda entry: entry[0] >= cutoff)
+
+    def _head(self, heap: List[HeapEntry], limit: int, stop: Optional[Callable[[HeapEntry], bool]] = None) -> List["Insight"]:
+        picked: List[HeapEntry] = []
+        while heap and len(picked) < limit:
+            entry = heap[0]
+            if not self._live(entry):
+                heapq.heappop(heap)
+                continue
+            if stop is not None and stop(entry):
+                break
+            picked.append(heapq.heappop(heap))
+        for entry in picked:
+            heapq.heappush(heap, entry)
+        return [self._entries[entry[2]][1] for entry in picked]
+
+    def _live(self, entry: HeapEntry) -> bool:
+        current = self._entries.get(entry[2])
+        return current is not None and current[0] == entry[1]
+
+    def _evict_oldest(self) -> None:
+        while self._oldest:
+            entry = heapq.heappop(self._oldest)
+            if self._live(entry):
+                _, insight = self._entries.pop(entry[2])
+                self._levels[insight.level] -= 1
+                self.evicted += 1
+                return
+
+    def _compact(self) -> None:
+        self._hottest = [(-insight.last_temp_c, version, device_id) for device_id, (version, insight) in self._entries.items()]
+        self._oldest = [(insight.ts.timestamp(), version, device_id) for device_id, (version, insight) in self._entries.items()]
+        self._alerts = [entry for entry in self._hottest if self._entries[entry[2]][1].level == "ALERT"]
+        heapq.heapify(self._hottest)
+        heapq.heapify(self._oldest)
+        heapq.heapify(self._alerts)
+
+    def __contains__(self, device_id: object) -> bool:
+        return device_id in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "tracked": len(self._entries),
+            "max_devices": self.max_devices,
+            "levels": self.levels(),
+            "updates": self.updates,
+            "ignored": self.ignored,
+            "evicted": self.evicted,
+            "heap_entries": len(self._hottest) + len(self._oldest) + len(self._alerts),
+        }
+
+
+__all__ = ["LatestStore"]
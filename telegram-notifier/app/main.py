@@ -1,7 +1,7 @@
 import logging
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Query
 
 from .config import Settings
 from .service import TelegramNotifier
@@ -32,3 +32,21 @@ app = FastAPI(
 @app.get("/healthz")
 async def healthz():
     return {"status": "ok"}
+
+
+@app.get("/metrics")
+async def metrics():
+    return notifier.stats()
+
+
+@app.get("/status")
+async def status(top: int = Query(10, ge=1, le=100), limit: int = Query(50, ge=1, le=1000)):
+    return notifier.status_view(top=top, limit=limit)
+
+
+@app.get("/status/{device_id}")
+async def device_status(device_id: str):
+    insight = notifier.device_status(device_id)
+    if insight is None:
+        raise HTTPException(status_code=404, detail=f"Device {device_id} belum pernah mengirim insight")
+    return insight
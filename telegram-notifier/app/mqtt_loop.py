@@ -0,0 +1,120 @@
+import asyncio
+import logging
+import threading
+from typing import Callable, Dict, Optional
+
+import paho.mqtt.client as mqtt
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncioMqttLoop:
+    """Drives a paho client from an asyncio event loop instead of ``loop_start``.
+
+    The client socket is registered with ``add_reader``/``add_writer`` and a
+    one-second task calls ``loop_misc`` for keepalive, so ``on_connect``,
+    ``on_message`` and ``on_disconnect`` all run on the event loop thread and
+    can touch loop-owned state without locks. Only the blocking TCP connect
+    runs in a worker thread; socket registrations it triggers are marshalled
+    back to the loop. Paho does not reconnect by itself without its thread,
+    so ``run`` reconnects with exponential backoff after every disconnect.
+    """
+
+    MISC_INTERVAL = 1.0
+
+    def __init__(
+        self,
+        client: mqtt.Client,
+        loop: asyncio.AbstractEventLoop,
+        reconnect_initial: float = 1.0,
+        reconnect_max: float = 30.0,
+    ) -> None:
+        self._client = client
+        self._loop = loop
+        self.reconnect_initial = reconnect_initial
+        self.reconnect_max = reconnect_max
+        self._loop_thread: Optional[int] = None
+        self._misc: Optional["asyncio.Task[None]"] = None
+        self._task: Optional["asyncio.Task[None]"] = None
+        self._closed = asyncio.Event()
+        self._closed.set()
+        self.connects = 0
+        self.connect_failures = 0
+        client.on_socket_open = self._on_socket_open
+        client.on_socket_close = self._on_socket_close
+        client.on_socket_register_write = self._on_socket_register_write
+        client.on_socket_unregister_write = self._on_socket_unregister_write
+
+    def start(self, host: str, port: int, keepalive: int) -> None:
+        if self._task is None:
+            self._loop_thread = threading.get_ident()
+            self._task = self._loop.create_task(self.run(host, port, keepalive), name="mqtt-connect")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # Runs on the loop, so DISCONNECT is queued and the socket closed here.
+        self._client.disconnect()
+        if self._misc is not None:
+            self._misc.cancel()
+            self._misc = None
+
+    async def run(self, host: str, port: int, keepalive: int) -> None:
+        delay = self.reconnect_initial
+        while True:
+            try:
+                logger.info("telegram_notifier_connect_mqtt", extra={"host": host, "port": port})
+                await asyncio.to_thread(self._client.connect, host, port, keepalive)
+            except Exception as exc:  # pragma: no cover - network failure path
+                self.connect_failures += 1
+                logger.warning("telegram_notifier_mqtt_failed", extra={"error": str(exc), "next_retry": delay})
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.reconnect_max)
+                continue
+            self.connects += 1
+            delay = self.reconnect_initial
+            await self._closed.wait()
+            await asyncio.sleep(delay)
+
+    def _call_on_loop(self, fn: Callable[..., object], *args: object) -> None:
+        if threading.get_ident() == self._loop_thread:
+            fn(*args)
+        else:
+            self._loop.call_soon_threadsafe(fn, *args)
+
+    def _on_socket_open(self, client, userdata, sock) -> None:
+        self._call_on_loop(self._opened, sock)
+
+    def _opened(self, sock) -> None:
+        self._closed.clear()
+        self._loop.add_reader(sock, self._client.loop_read)
+        if self._misc is None or self._misc.done():
+            self._misc = self._loop.create_task(self._misc_loop(), name="mqtt-misc")
+
+    def _on_socket_close(self, client, userdata, sock) -> None:
+        self._call_on_loop(self._released, sock)
+
+    def _released(self, sock) -> None:
+        self._loop.remove_reader(sock)
+        self._closed.set()
+
+    def _on_socket_register_write(self, client, userdata, sock) -> None:
+        self._call_on_loop(self._loop.add_writer, sock, self._client.loop_write)
+
+    def _on_socket_unregister_write(self, client, userdata, sock) -> None:
+        self._call_on_loop(self._loop.remove_writer, sock)
+
+    async def _misc_loop(self) -> None:
+        while self._client.loop_misc() == mqtt.MQTT_ERR_SUCCESS:
+            await asyncio.sleep(self.MISC_INTERVAL)
+
+    def stats(self) -> Dict[str, object]:
+        return {"connected": not self._closed.is_set(), "connects": self.connects, "connect_failures": self.connect_failures}
+
+
+__all__ = ["AsyncioMqttLoop"]
@@ -0,0 +1,204 @@
+import asyncio
+import logging
+import time
+from array import array
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Generic, List, Optional, Sequence, Tuple, TypeVar
+
+from telegram.error import RetryAfter
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class TokenBucket:
+    """``rate`` tokens per second with room for ``burst``; ``reserve`` returns the wait before sending."""
+
+    def __init__(self, rate: float, burst: float, clock: Callable[[], float] = time.monotonic) -> None:
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self._clock = clock
+        self._tokens = self.burst
+        self._updated = clock()
+
+    def reserve(self) -> float:
+        """Take one token, possibly going into debt; return the seconds until it is covered."""
+        now = self._clock()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        self._tokens -= 1.0
+        return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+
+class LatencyTracker:
+    """Fixed-size ring of recent enqueue-to-delivery latencies with percentile snapshots."""
+
+    def __init__(self, size: int = 512) -> None:
+        self._samples = array("d", bytes(8 * size))
+        self._count = 0
+
+    def record(self, seconds: float) -> None:
+        self._samples[self._count % len(self._samples)] = seconds
+        self._count += 1
+
+    def percentiles(self) -> Dict[str, float]:
+        samples = sorted(self._samples[: min(self._count, len(self._samples))])
+        if not samples:
+            return {"count": 0}
+
+        def pick(quantile: float) -> float:
+            return round(samples[min(len(samples) - 1, int(quantile * len(samples)))] * 1000, 1)
+
+        return {"count": len(samples), "p50_ms": pick(0.50), "p95_ms": pick(0.95), "p99_ms": pick(0.99), "max_ms": pick(1.0)}
+
+
+class SendQueue(Generic[T]):
+    """Single outbound queue for one chat, paced by token buckets.
+
+    ``put`` must run on the event loop, where the MQTT callbacks also run.
+    The queue keeps one entry per ``key`` (device): a newer
+    item replaces the queued one in place unless ``severity`` ranks it lower,
+    so a pending ALERT is never downgraded to a WARN. The sender waits
+    ``coalesce_seconds`` after the first queued item, then sends up to
+    ``digest_max`` entries as one message rendered by ``render``; entries that
+    pile up while it waits for a token join the next message. A 429 is retried
+    after the ``retry_after`` Telegram asks for. At most ``max_size`` devices
+    are queued; the oldest entry is dropped when full.
+    """
+
+    def __init__(
+        self,
+        send: Callable[[str], Awaitable[None]],
+        render: Callable[[Sequence[T]], str],
+        key: Callable[[T], str],
+        buckets: Sequence[TokenBucket],
+        severity: Optional[Callable[[T], int]] = None,
+        max_size: int = 1000,
+        coalesce_seconds: float = 2.0,
+        digest_max: int = 20,
+        max_retries: int = 3,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._send = send
+        self._render = render
+        self._key = key
+        self._severity = severity
+        self._buckets = list(buckets)
+        self.max_size = max(1, max_size)
+        self.coalesce_seconds = coalesce_seconds
+        self.digest_max = max(1, digest_max)
+        self.max_retries = max_retries
+        self._clock = clock
+        self._pending: "OrderedDict[str, Tuple[float, T]]" = OrderedDict()
+        self._wakeup = asyncio.Event()
+        self._task: Optional["asyncio.Task[None]"] = None
+        self._latency = LatencyTracker()
+        self.enqueued = 0
+        self.dropped = 0
+        self.sent = 0
+        self.digests = 0
+        self.coalesced = 0
+        self.retries = 0
+        self.failed = 0
+
+    def put(self, item: T) -> None:
+        self.enqueued += 1
+        key = self._key(item)
+        queued = self._pending.get(key)
+        if queued is not None:
+            # Keep the original enqueue time so latency covers the whole wait.
+            if self._severity is None or self._severity(item) >= self._severity(queued[1]):
+                self._pending[key] = (queued[0], item)
+            self.coalesced += 1
+            return
+        if len(self._pending) >= self.max_size:
+            self._pending.popitem(last=False)
+            self.dropped += 1
+        self._pending[key] = (self._clock(), item)
+        self._wakeup.set()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run(), name="telegram-send-queue")
+
+    async def stop(self, timeout: float = 5.0) -> None:
+        """Flush what is queued (bounded by ``timeout``) and stop the sender."""
+        if self._task is None:
+            return
+        task, self._task = self._task, None
+        deadline = self._clock() + timeout
+        while self._pending and self._clock() < deadline and not task.done():
+            await asyncio.sleep(0.05)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    async def _run(self) -> None:
+        while True:
+            if not self._pending:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+            if self.coalesce_seconds > 0:
+                await asyncio.sleep(self.coalesce_seconds)
+            await self._pace()
+            await self.flush_once()
+
+    async def _pace(self) -> None:
+        wait = max(bucket.reserve() for bucket in self._buckets) if self._buckets else 0.0
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    async def flush_once(self) -> bool:
+        """Send one message built from the head of the queue; False if nothing was sent."""
+        batch = self._take()
+        if not batch:
+            return False
+        text = self._render([item for _, item in batch])
+        for attempt in range(self.max_retries + 1):
+            try:
+                await self._send(text)
+                break
+            except RetryAfter as exc:
+                if attempt == self.max_retries:
+                    self.failed += 1
+                    logger.error("telegram_send_gave_up", extra={"items": len(batch), "retry_after": exc.retry_after})
+                    return False
+                self.retries += 1
+                logger.warning("telegram_rate_limited", extra={"retry_after": exc.retry_after})
+                await asyncio.sleep(float(exc.retry_after))
+            except Exception as exc:
+                self.failed += 1
+                logger.error("telegram_send_failed", extra={"error": str(exc), "items": len(batch)})
+                return False
+        now = self._clock()
+        for queued_at, _ in batch:
+            self._latency.record(now - queued_at)
+        self.sent += 1
+        if len(batch) > 1:
+            self.digests += 1
+        return True
+
+    def _take(self) -> List[Tuple[float, T]]:
+        batch = [self._pending.popitem(last=False)[1] for _ in range(min(self.digest_max, len(self._pending)))]
+        # Insights that rode along in a message instead of needing their own.
+        self.coalesced += max(0, len(batch) - 1)
+        return batch
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "depth": len(self._pending),
+            "enqueued": self.enqueued,
+            "dropped": self.dropped,
+            "messages_sent": self.sent,
+            "digests": self.digests,
+            "coalesced": self.coalesced,
+            "retries": self.retries,
+            "failed": self.failed,
+            "latency": self._latency.percentiles(),
+        }
+
+
+__all__ = ["LatencyTracker", "SendQueue", "TokenBucket"]
@@ -1,22 +1,26 @@
 import asyncio
 import json
 import logging
-import threading
-import time
 from collections import deque
 from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
-from typing import Deque, Dict, Optional
+from typing import Deque, Dict, List, Optional, Sequence
 
 import paho.mqtt.client as mqtt
 from telegram import Update
 from telegram.ext import Application, CommandHandler, ContextTypes
 
 from .config import Settings
+from .devices import DeviceMap
+from .latest import LatestStore
+from .mqtt_loop import AsyncioMqttLoop
+from .outbox import SendQueue, TokenBucket
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
+SEVERITY = {"OK": 0, "WARN": 1, "ALERT": 2}
+
 
 @dataclass
 class Insight:
@@ -30,6 +34,9 @@ class Insight:
 
 
 class TelegramNotifier:
+    # Most devices listed by one bot reply, well under Telegram's 4096-character limit.
+    COMMAND_LIMIT = 20
+
     def __init__(self, settings: Settings) -> None:
         self.settings = settings
         self.loop: Optional[asyncio.AbstractEventLoop] = None
@@ -39,27 +46,48 @@ class TelegramNotifier:
         self._client.on_connect = self._on_connect
         self._client.on_message = self._on_message
         self._client.on_disconnect = self._on_disconnect
-        self._client.reconnect_delay_set(settings.mqtt_reconnect_initial, settings.mqtt_reconnect_max)
+        self._mqtt_loop: Optional[AsyncioMqttLoop] = None
 
         self._history: Deque[Insight] = deque(maxlen=settings.status_history_size)
-        self._last_sent: Dict[str, datetime] = {}
-        self._lock = threading.Lock()
+        self._latest = LatestStore(settings.notifier_max_devices)
+        self._latest_prefix = settings.insight_latest_prefix.rstrip("/")
+        # Only touched from the event loop: paho callbacks run there too (see AsyncioMqttLoop).
+        self._last_sent: DeviceMap[datetime] = DeviceMap(settings.notifier_max_devices, settings.notifier_idle_ttl_seconds)
 
         self._telegram_app: Optional[Application] = None
         self.enabled = bool(settings.telegram_bot_token and settings.telegram_chat_id)
+        self._outbox: SendQueue[Insight] = SendQueue(
+            send=self._send,
+            render=self._render,
+            key=lambda insight: insight.device_id,
+            severity=lambda insight: SEVERITY.get(insight.level, 0),
+            buckets=(
+                TokenBucket(settings.notifier_chat_rate_per_minute / 60.0, settings.notifier_chat_burst),
+                TokenBucket(settings.notifier_global_rate_per_second, settings.notifier_global_rate_per_second),
+            ),
+            max_size=settings.notifier_queue_size,
+            coalesce_seconds=settings.notifier_coalesce_seconds,
+            digest_max=settings.notifier_digest_max,
+            max_retries=settings.notifier_send_retries,
+        )
 
     async def start(self) -> None:
         self.loop = asyncio.get_running_loop()
         if self.enabled:
             await self._start_bot()
-        await asyncio.to_thread(self._connect_mqtt)
+            self._outbox.start()
+        self._mqtt_loop = AsyncioMqttLoop(
+            self._client, self.loop, self.settings.mqtt_reconnect_initial, self.settings.mqtt_reconnect_max
+        )
+        self._mqtt_loop.start(self.settings.mqtt_host, self.settings.mqtt_port, self.settings.mqtt_keepalive)
 
     async def stop(self) -> None:
-        try:
-            self._client.loop_stop()
-            self._client.disconnect()
-        except Exception:  # pragma: no cover - shutdown path
-            pass
+        if self._mqtt_loop is not None:
+            try:
+                await self._mqtt_loop.stop()
+            except Exception:  # pragma: no cover - shutdown path
+                pass
+        await self._outbox.stop()
         if self.enabled and self._telegram_app is not None:
             if self._telegram_app.updater is not None:
                 await self._telegram_app.updater.stop()
@@ -70,6 +98,9 @@ class TelegramNotifier:
         app = Application.builder().token(self.settings.telegram_bot_token).build()
         app.add_handler(CommandHandler("start", self._command_start))
         app.add_handler(CommandHandler("status", self._command_status))
+        app.add_handler(CommandHandler("top", self._command_top))
+        app.add_handler(CommandHandler("alerts", self._command_alerts))
+        app.add_handler(CommandHandler("stale", self._command_stale))
         await app.initialize()
         await app.start()
         if app.updater is not None:
@@ -77,26 +108,13 @@ class TelegramNotifier:
         self._telegram_app = app
         logger.info("telegram_bot_started")
 
-    def _connect_mqtt(self) -> None:
-        delay = self.settings.mqtt_reconnect_initial
-        while True:
-            try:
-                logger.info(
-                    "telegram_notifier_connect_mqtt",
-                    extra={"host": self.settings.mqtt_host, "port": self.settings.mqtt_port},
-                )
-                self._client.connect(self.settings.mqtt_host, self.settings.mqtt_port, self.settings.mqtt_keepalive)
-                self._client.loop_start()
-                break
-            except Exception as exc:  # pragma: no cover - network failure path
-                logger.warning("telegram_notifier_mqtt_failed", extra={"error": str(exc), "next_retry": delay})
-                time.sleep(delay)
-                delay = min(delay * 2, self.settings.mqtt_reconnect_max)
-
     def _on_connect(self, client, userdata, flags, rc):
         if rc == 0:
-            logger.info("telegram_notifier_connected", extra={"topic": self.settings.mqtt_topic})
-            client.subscribe(self.settings.mqtt_topic, qos=1)
+            topics = self.settings.mqtt_topics
+            if self._latest_prefix:
+                topics = topics + [f"{self._latest_prefix}/+"]
+            logger.info("telegram_notifier_connected", extra={"topics": topics})
+            client.subscribe([(topic, 1) for topic in topics])
         else:  # pragma: no cover - connection error path
             logger.error("telegram_notifier_connect_error", extra={"rc": rc})
 
@@ -122,8 +140,13 @@ class TelegramNotifier:
         if not insight.device_id:
             return
 
-        with self._lock:
-            self._history.appendleft(insight)
+        self._latest.update(insight)
+        if self._latest_prefix and message.topic.startswith(self._latest_prefix + "/"):
+            # Retained per-device state for the status view only; the same
+            # insight also arrives on its level topic when it needs a notification.
+            return
+
+        self._history.appendleft(insight)
 
         if insight.level not in {"WARN", "ALERT"}:
             return
@@ -135,24 +158,65 @@ class TelegramNotifier:
         if not self._can_notify(insight):
             return
 
-        text = self._format_message(insight)
-        if self.loop and self._telegram_app is not None:
-            asyncio.run_coroutine_threadsafe(self._send(text), self.loop)
+        self._outbox.put(insight)
 
     def _can_notify(self, insight: Insight) -> bool:
         cooldown = timedelta(seconds=self.settings.notifier_cooldown)
         last = self._last_sent.get(insight.device_id)
         if last and insight.ts - last < cooldown:
             return False
-        self._last_sent[insight.device_id] = insight.ts
+        self._last_sent.set(insight.device_id, insight.ts)
         return True
 
+    def stats(self) -> Dict[str, Dict[str, object]]:
+        return {
+            "last_sent": self._last_sent.stats(),
+            "history": {"size": len(self._history)},
+            "latest": self._latest.stats(),
+            "send_queue": self._outbox.stats(),
+            "mqtt": self._mqtt_loop.stats() if self._mqtt_loop is not None else {"connected": False},
+        }
+
+    def status_view(self, top: int = 10, limit: int = 50) -> Dict[str, object]:
+        return {
+            "devices": len(self._latest),
+            "levels": self._latest.levels(),
+            "top": [self.insight_json(item) for item in self._latest.hottest(top)],
+            "alerts": [self.insight_json(item) for item in self._latest.alerts(limit)],
+            "stale": [self.insight_json(item) for item in self._latest.stale(self.settings.notifier_stale_seconds, limit)],
+            "stale_after_seconds": self.settings.notifier_stale_seconds,
+        }
+
+    def device_status(self, device_id: str) -> Optional[Dict[str, object]]:
+        insight = self._latest.get(device_id)
+        return self.insight_json(insight) if insight is not None else None
+
+    @staticmethod
+    def insight_json(insight: Insight) -> Dict[str, object]:
+        return {
+            "device_id": insight.device_id,
+            "level": insight.level,
+            "summary": insight.summary,
+            "recommendation": insight.recommendation,
+            "last_temp_c": insight.last_temp_c,
+            "window_avg_c": insight.window_avg_c,
+            "ts": _format_ts(insight.ts),
+        }
+
     async def _send(self, text: str) -> None:
+        # Errors (including 429 RetryAfter) are handled by the send queue.
         assert self._telegram_app is not None
-        try:
-            await self._telegram_app.bot.send_message(chat_id=self.settings.telegram_chat_id, text=text)
-        except Exception as exc:  # pragma: no cover - network failure path
-            logger.error("telegram_send_failed", extra={"error": str(exc)})
+        await self._telegram_app.bot.send_message(chat_id=self.settings.telegram_chat_id, text=text)
+
+    def _render(self, insights: Sequence[Insight]) -> str:
+        if len(insights) == 1:
+            return self._format_message(insights[0])
+        lines = [f"🔔 Siap Suhu — {len(insights)} device perlu perhatian"]
+        for insight in sorted(insights, key=lambda item: (item.level != "ALERT", item.device_id)):
+            lines.append(
+                f"• {insight.device_id} — {insight.level} {insight.last_temp_c:.1f}°C (rata2 {insight.window_avg_c:.1f}°C)"
+            )
+        return "\n".join(lines)
 
     def _format_message(self, insight: Insight) -> str:
         recommendation = insight.recommendation or "Pantau kondisi perangkat."
@@ -185,20 +249,72 @@ class TelegramNotifier:
         if update.message is None:
             return
         await update.message.reply_text(
-            "Halo! Notifikasi Siap Suhu aktif. Gunakan /status untuk ringkasan terakhir.")
+            "Halo! Notifikasi Siap Suhu aktif. Gunakan /status untuk ringkasan terakhir, "
+            "/status <device> untuk detail device, /top, /alerts, dan /stale.")
 
     async def _command_status(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         if update.message is None:
             return
-        if not self._history:
+        if context.args:
+            device_id = context.args[0]
+            insight = self._latest.get(device_id)
+            if insight is None:
+                await update.message.reply_text(f"Device {device_id} belum pernah mengirim insight.")
+                return
+            await update.message.reply_text(self._format_message(insight) + f"\nWaktu: {_format_ts(insight.ts)}")
+            return
+        if not self._latest and not self._history:
             await update.message.reply_text("Belum ada insight yang diterima.")
             return
-        lines = ["Ringkasan insight terbaru:"]
+        levels = self._latest.levels()
+        counts = ", ".join(f"{level} {levels.get(level, 0)}" for level in ("OK", "WARN", "ALERT"))
+        lines = [f"Ringkasan {len(self._latest)} device: {counts}.", "Insight WARN/ALERT terbaru:"]
         for item in list(self._history)[:5]:
-            lines.append(
-                f"{item.ts.isoformat().replace('+00:00', 'Z')} • {item.device_id} • {item.level} • {item.last_temp_c:.1f}°C"
-            )
+            lines.append(self._status_line(item))
+        lines.append("Detail: /status <device>, /top, /alerts, /stale")
         await update.message.reply_text("\n".join(lines))
 
+    async def _command_top(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        if update.message is None:
+            return
+        try:
+            limit = max(1, min(int(context.args[0]), self.COMMAND_LIMIT)) if context.args else 5
+        except ValueError:
+            limit = 5
+        await update.message.reply_text(
+            self._list_reply(f"{limit} device terpanas:", self._latest.hottest(limit), "Belum ada insight yang diterima.")
+        )
+
+    async def _command_alerts(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        if update.message is None:
+            return
+        count = self._latest.levels().get("ALERT", 0)
+        await update.message.reply_text(
+            self._list_reply(f"{count} device dalam status ALERT:", self._latest.alerts(self.COMMAND_LIMIT), "Tidak ada device dalam status ALERT.")
+        )
+
+    async def _command_stale(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        if update.message is None:
+            return
+        minutes = self.settings.notifier_stale_seconds / 60
+        stale = self._latest.stale(self.settings.notifier_stale_seconds, self.COMMAND_LIMIT)
+        await update.message.reply_text(
+            self._list_reply(
+                f"Device tanpa insight lebih dari {minutes:.0f} menit:", stale, f"Semua device melapor dalam {minutes:.0f} menit terakhir."
+            )
+        )
+
+    def _list_reply(self, title: str, insights: List[Insight], empty: str) -> str:
+        if not insights:
+            return empty
+        return "\n".join([title] + [self._status_line(item) for item in insights])
+
+    def _status_line(self, item: Insight) -> str:
+        return f"{_format_ts(item.ts)} • {item.device_id} • {item.level} • {item.last_temp_c:.1f}°C"
+
+
+def _format_ts(value: datetime) -> str:
+    return value.isoformat().replace("+00:00", "Z")
+
 
 __all__ = ["TelegramNotifier"]
@@ -0,0 +1,72 @@
+import json
+import tracemalloc
+from types import SimpleNamespace
+
+from app.config import Settings
+from app.devices import DeviceMap
+from app.service import TelegramNotifier
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_cap_evicts_least_recently_used():
+    devices = DeviceMap(max_devices=2)
+    devices.set("a", 1)
+    devices.set("b", 2)
+    assert devices.get("a") == 1
+    devices.set("c", 3)
+    assert list(devices) == ["a", "c"]
+    assert devices.stats()["evicted_capacity"] == 1
+
+
+def test_idle_entries_expire_a_few_per_access():
+    clock = FakeClock()
+    devices = DeviceMap(idle_ttl=60.0, clock=clock)
+    for index in range(5):
+        devices.set(f"old-{index}", index)
+    clock.now = 61.0
+    devices.set("fresh", 0)
+    assert len(devices) == 6 - DeviceMap.EXPIRE_BATCH
+    for _ in range(3):
+        devices.get("fresh")
+    assert list(devices) == ["fresh"]
+    assert devices.stats()["evicted_idle"] == 5
+
+
+def alert(device_id):
+    payload = {"device_id": device_id, "level": "ALERT", "summary": "panas", "last_temp_c": 40.0, "ts": "2024-01-01T12:00:00Z"}
+    return SimpleNamespace(topic=f"siapsuhu/insight/alert/{device_id}", payload=json.dumps(payload).encode())
+
+
+def test_device_id_flood_keeps_cooldown_map_bounded():
+    notifier = TelegramNotifier(Settings(NOTIFIER_MAX_DEVICES=256))
+    notifier.enabled = True  # no bot attached, so nothing is actually sent
+
+    tracemalloc.start()
+    try:
+        for index in range(2_000):
+            notifier._on_message(None, None, alert(f"rogue-{index}"))
+        baseline, _ = tracemalloc.get_traced_memory()
+        for index in range(2_000, 20_000):
+            notifier._on_message(None, None, alert(f"rogue-{index}"))
+        current, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    stats = notifier.stats()["last_sent"]
+    assert stats["tracked"] == 256
+    assert stats["evicted_capacity"] == 20_000 - 256
+    assert current - baseline < 64 * 1024
+
+
+def test_cooldown_still_applies_to_tracked_devices():
+    notifier = TelegramNotifier(Settings())
+    notifier.enabled = True
+    insight = SimpleNamespace(device_id="dev", ts=notifier._parse_ts("2024-01-01T12:00:00Z"))
+    assert notifier._can_notify(insight)
+    assert not notifier._can_notify(insight)
@@ -0,0 +1,121 @@
+import asyncio
+import json
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+from app.config import Settings
+from app.latest import LatestStore
+from app.service import Insight, TelegramNotifier
+
+BASE = datetime(2024, 1, 1, 12, tzinfo=timezone.utc)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = BASE.timestamp()
+
+    def __call__(self):
+        return self.now
+
+
+def insight(device_id, level="OK", temp=25.0, seconds=0):
+    return Insight(device_id, level, "ringkasan", None, temp, temp, BASE + timedelta(seconds=seconds))
+
+
+def test_levels_and_alerts_follow_each_devices_latest_insight():
+    store = LatestStore()
+    store.update(insight("a", "ALERT", 40.0))
+    store.update(insight("b", "WARN", 33.0))
+    store.update(insight("c", "ALERT", 38.0))
+    assert store.levels() == {"ALERT": 2, "WARN": 1}
+    assert [item.device_id for item in store.alerts(10)] == ["a", "c"]
+
+    store.update(insight("a", "OK", 26.0, seconds=60))
+    assert store.levels() == {"ALERT": 1, "WARN": 1, "OK": 1}
+    assert [item.device_id for item in store.alerts(10)] == ["c"]
+    store.update(insight("b", "ALERT", 45.0, seconds=60))
+    assert [item.device_id for item in store.alerts(1)] == ["b"]
+    assert [item.device_id for item in store.alerts(10)] == ["b", "c"]  # queries do not consume
+    assert not store.update(insight("a", "ALERT", 41.0, seconds=30))  # older than what is stored
+    assert store.get("a").level == "OK"
+
+
+def test_hottest_skips_superseded_readings():
+    store = LatestStore()
+    for index in range(10):
+        store.update(insight(f"dev-{index}", temp=20.0 + index))
+    store.update(insight("dev-9", temp=15.0, seconds=60))
+    store.update(insight("dev-0", temp=50.0, seconds=60))
+    assert [item.device_id for item in store.hottest(3)] == ["dev-0", "dev-8", "dev-7"]
+    assert [item.device_id for item in store.hottest(3)] == ["dev-0", "dev-8", "dev-7"]  # queries do not consume
+    assert len(store.hottest(100)) == 10
+
+
+def test_stale_lists_devices_that_stopped_reporting():
+    clock = FakeClock()
+    store = LatestStore(clock=clock)
+    for index in range(5):
+        store.update(insight(f"dev-{index}", seconds=index * 100))
+    clock.now = BASE.timestamp() + 950
+    assert [item.device_id for item in store.stale(900, 10)] == ["dev-0"]
+    store.update(insight("dev-0", seconds=940))
+    clock.now = BASE.timestamp() + 1150
+    assert [item.device_id for item in store.stale(900, 10)] == ["dev-1", "dev-2"]
+    assert [item.device_id for item in store.stale(900, 1)] == ["dev-1"]
+
+
+def test_capacity_evicts_the_device_seen_longest_ago_and_heaps_stay_bounded():
+    store = LatestStore(max_devices=100)
+    for step in range(50):
+        for index in range(100):
+            store.update(insight(f"dev-{index}", "ALERT" if index % 10 == 0 else "OK", temp=float(step), seconds=step))
+    assert store.stats()["heap_entries"] <= 3 * (2 * 100 + LatestStore.COMPACT_SLACK)
+    store.update(insight("new", "WARN", seconds=100))
+    assert "dev-0" not in store and len(store) == 100
+    assert store.levels() == {"ALERT": 9, "OK": 90, "WARN": 1}
+    assert store.stats()["evicted"] == 1
+
+
+def message(topic, device_id, level, temp=30.0, ts="2024-01-01T12:00:00Z"):
+    payload = {"device_id": device_id, "level": level, "summary": "ringkasan", "last_temp_c": temp, "window_avg_c": temp, "ts": ts}
+    return SimpleNamespace(topic=topic, payload=json.dumps(payload).encode())
+
+
+def test_latest_topic_feeds_the_status_view_without_notifying():
+    notifier = TelegramNotifier(Settings())
+    notifier._on_message(None, None, message("siapsuhu/latest/dev-ok", "dev-ok", "OK", 25.0))
+    notifier._on_message(None, None, message("siapsuhu/latest/dev-hot", "dev-hot", "ALERT", 41.0))
+    notifier._on_message(None, None, message("siapsuhu/insight/alert/dev-hot", "dev-hot", "ALERT", 41.0))
+    assert [item.device_id for item in notifier._history] == ["dev-hot"]
+
+    view = notifier.status_view(top=1)
+    assert view["devices"] == 2 and view["levels"] == {"OK": 1, "ALERT": 1}
+    assert [item["device_id"] for item in view["top"]] == ["dev-hot"]
+    assert [item["device_id"] for item in view["alerts"]] == ["dev-hot"]
+    assert notifier.device_status("dev-ok")["ts"] == "2024-01-01T12:00:00Z"
+    assert notifier.device_status("missing") is None
+
+
+def test_bot_commands_answer_from_the_store():
+    notifier = TelegramNotifier(Settings())
+    for index, level in enumerate(["OK", "WARN", "ALERT"]):
+        notifier._on_message(None, None, message(f"siapsuhu/latest/dev-{index}", f"dev-{index}", level, 30.0 + index))
+    replies = []
+
+    async def reply_text(text):
+        replies.append(text)
+
+    def run(command, *args):
+        update = SimpleNamespace(message=SimpleNamespace(reply_text=reply_text))
+        asyncio.run(command(update, SimpleNamespace(args=list(args))))
+        return replies[-1]
+
+    assert run(notifier._command_status).startswith("Ringkasan 3 device: OK 1, WARN 1, ALERT 1.")
+    assert "Device: dev-1" in run(notifier._command_status, "dev-1")
+    assert "belum pernah" in run(notifier._command_status, "dev-9")
+    assert run(notifier._command_top, "2").splitlines()[1:] == [
+        "2024-01-01T12:00:00Z • dev-2 • ALERT • 32.0°C",
+        "2024-01-01T12:00:00Z • dev-1 • WARN • 31.0°C",
+    ]
+    assert run(notifier._command_alerts).splitlines()[0] == "1 device dalam status ALERT:"
+    assert len(run(notifier._command_stale).splitlines()) == 1 + 3  # the 2024 insights are long stale
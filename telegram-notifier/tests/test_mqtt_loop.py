@@ -0,0 +1,100 @@
+import asyncio
+import json
+import threading
+
+from app.config import Settings
+from app.service import TelegramNotifier
+
+
+def encode_length(length):
+    encoded = bytearray()
+    while True:
+        byte, length = length % 128, length // 128
+        encoded.append(byte | (0x80 if length else 0))
+        if not length:
+            return bytes(encoded)
+
+
+async def read_packet(reader):
+    header = (await reader.readexactly(1))[0]
+    length, shift = 0, 0
+    while True:
+        byte = (await reader.readexactly(1))[0]
+        length |= (byte & 0x7F) << shift
+        shift += 7
+        if not byte & 0x80:
+            break
+    return header >> 4, await reader.readexactly(length)
+
+
+def publish_packet(topic, payload):
+    body = len(topic).to_bytes(2, "big") + topic.encode() + payload
+    return b"\x30" + encode_length(len(body)) + body
+
+
+class FakeBroker:
+    """Just enough MQTT 3.1.1 to accept one client, ack its subscription and push insights."""
+
+    def __init__(self, insights):
+        self.insights = insights
+        self.subscribed = asyncio.Event()
+        self.disconnected = asyncio.Event()
+        self.topics = []
+
+    async def handle(self, reader, writer):
+        await read_packet(reader)  # CONNECT
+        writer.write(b"\x20\x02\x00\x00")
+        packet_type, body = await read_packet(reader)
+        assert packet_type == 8  # SUBSCRIBE
+        position = 2
+        while position < len(body):
+            size = int.from_bytes(body[position : position + 2], "big")
+            self.topics.append(body[position + 2 : position + 2 + size].decode())
+            position += 3 + size
+        writer.write(b"\x90" + encode_length(2 + len(self.topics)) + body[:2] + b"\x01" * len(self.topics))
+        for insight in self.insights:
+            writer.write(publish_packet(f"siapsuhu/insight/{insight['level'].lower()}/{insight['device_id']}", json.dumps(insight).encode()))
+        await writer.drain()
+        self.subscribed.set()
+        try:
+            while (await read_packet(reader))[0] != 14:  # until DISCONNECT
+                pass
+        except asyncio.IncompleteReadError:
+            pass
+        self.disconnected.set()
+        writer.close()
+
+
+def test_callbacks_run_on_the_event_loop_thread():
+    insights = [
+        {"device_id": f"dev-{index}", "level": "ALERT", "summary": "panas", "last_temp_c": 36.0, "window_avg_c": 30.0, "ts": f"2024-01-01T12:00:0{index}Z"}
+        for index in range(3)
+    ]
+
+    async def scenario():
+        broker = FakeBroker(insights)
+        server = await asyncio.start_server(broker.handle, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        notifier = TelegramNotifier(Settings(MQTT_HOST="127.0.0.1", MQTT_PORT=port, MQTT_INSIGHT_TOPIC_LAYOUT="level"))
+        threads = []
+        handle = notifier._on_message
+        notifier._on_message = lambda *args: (threads.append(threading.get_ident()), handle(*args))
+        notifier._client.on_message = notifier._on_message
+        await notifier.start()
+        try:
+            await asyncio.wait_for(broker.subscribed.wait(), 5)
+            while len(notifier._history) < len(insights):
+                await asyncio.sleep(0.01)
+            assert notifier.stats()["mqtt"]["connected"] is True
+        finally:
+            await notifier.stop()
+        await asyncio.wait_for(broker.disconnected.wait(), 5)
+        server.close()
+        await server.wait_closed()
+        return broker, notifier, threads
+
+    broker, notifier, threads = asyncio.run(asyncio.wait_for(scenario(), 10))
+    assert broker.topics == ["siapsuhu/insight/warn/+", "siapsuhu/insight/alert/+", "siapsuhu/latest/+"]
+    assert set(threads) == {threading.get_ident()}
+    assert [item.device_id for item in notifier._history] == ["dev-2", "dev-1", "dev-0"]
+    assert notifier.stats()["mqtt"] == {"connected": False, "connects": 1, "connect_failures": 0}
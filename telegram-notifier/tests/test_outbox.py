@@ -0,0 +1,137 @@
+import asyncio
+from datetime import datetime, timezone
+
+from telegram.error import RetryAfter
+
+from app import outbox
+from app.config import Settings
+from app.outbox import SendQueue, TokenBucket
+from app.service import Insight, TelegramNotifier
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_insight(device_id, level="ALERT", temp=40.0):
+    return Insight(device_id, level, "panas", None, temp, 38.0, datetime(2024, 1, 1, tzinfo=timezone.utc))
+
+
+def make_queue(sent, **overrides):
+    async def send(text):
+        sent.append(text)
+
+    options = {"coalesce_seconds": 0.01, "digest_max": 20}
+    options.update(overrides)
+    return SendQueue(
+        send=send,
+        render=lambda items: ",".join(f"{item.device_id}:{item.last_temp_c:.0f}" for item in items),
+        key=lambda item: item.device_id,
+        buckets=(),
+        **options,
+    )
+
+
+def test_token_bucket_paces_after_burst():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=0.5, burst=2, clock=clock)
+    assert bucket.reserve() == 0.0
+    assert bucket.reserve() == 0.0
+    assert bucket.reserve() == 2.0
+    clock.now = 2.0
+    assert bucket.reserve() == 2.0
+
+
+def test_alert_storm_is_sent_as_digests():
+    sent = []
+
+    async def scenario():
+        queue = make_queue(sent)
+        queue.start()
+        for index in range(45):
+            queue.put(make_insight(f"dev-{index:02d}"))
+        queue.put(make_insight("dev-00", temp=41.0))  # newer state for a queued device
+        await queue.stop()
+        return queue.stats()
+
+    stats = asyncio.run(scenario())
+    assert len(sent) == 3
+    assert sent[0].split(",")[0] == "dev-00:41"
+    assert sum(len(text.split(",")) for text in sent) == 45
+    assert stats["depth"] == 0 and stats["digests"] == 3 and stats["coalesced"] == 43
+    assert stats["latency"]["count"] == 45
+
+
+def test_retry_after_is_honored(monkeypatch):
+    slept = []
+    real_sleep = asyncio.sleep
+
+    async def fake_sleep(seconds):
+        slept.append(seconds)
+        await real_sleep(0)
+
+    monkeypatch.setattr(outbox.asyncio, "sleep", fake_sleep)
+    attempts = []
+
+    async def send(text):
+        attempts.append(text)
+        if len(attempts) == 1:
+            raise RetryAfter(7)
+
+    async def scenario():
+        queue = SendQueue(send=send, render=lambda items: "x", key=lambda item: item.device_id, buckets=(), coalesce_seconds=0)
+        queue.put(make_insight("dev"))
+        assert await queue.flush_once()
+        return queue.stats()
+
+    stats = asyncio.run(scenario())
+    assert attempts == ["x", "x"]
+    assert slept == [7.0]
+    assert stats["retries"] == 1 and stats["failed"] == 0 and stats["messages_sent"] == 1
+
+
+def test_full_queue_drops_oldest():
+    sent = []
+
+    async def scenario():
+        queue = make_queue(sent, max_size=3, digest_max=10)
+        for index in range(5):
+            queue.put(make_insight(f"dev-{index}"))
+        await queue.flush_once()
+        return queue.stats()
+
+    stats = asyncio.run(scenario())
+    assert sent == ["dev-2:40,dev-3:40,dev-4:40"]
+    assert stats["dropped"] == 2
+
+
+def test_pending_alert_is_not_replaced_by_a_newer_warn():
+    sent = []
+
+    async def scenario():
+        queue = make_queue(sent, severity=lambda item: {"WARN": 1, "ALERT": 2}[item.level])
+        queue.put(make_insight("dev-1", "ALERT", 41.0))
+        queue.put(make_insight("dev-1", "WARN", 33.0))
+        queue.put(make_insight("dev-2", "WARN", 32.0))
+        queue.put(make_insight("dev-2", "ALERT", 39.0))
+        await queue.flush_once()
+        return queue.stats()
+
+    stats = asyncio.run(scenario())
+    assert sent == ["dev-1:41,dev-2:39"]
+    assert stats["coalesced"] == 3
+
+
+def test_notifier_digest_lists_alerts_first():
+    notifier = TelegramNotifier(Settings())
+    text = notifier._render([make_insight("b", "WARN", 31.0), make_insight("a"), make_insight("c")])
+    assert text.splitlines() == [
+        "🔔 Siap Suhu — 3 device perlu perhatian",
+        "• a — ALERT 40.0°C (rata2 38.0°C)",
+        "• c — ALERT 40.0°C (rata2 38.0°C)",
+        "• b — WARN 31.0°C (rata2 38.0°C)",
+    ]
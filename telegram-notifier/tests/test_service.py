@@ -0,0 +1,26 @@
+from app.config import Settings
+from app.service import TelegramNotifier
+
+
+class RecordingClient:
+    def __init__(self):
+        self.subscriptions = []
+
+    def subscribe(self, topics):
+        self.subscriptions.extend(topics)
+
+
+def test_subscribes_to_warn_alert_and_latest_topics():
+    notifier = TelegramNotifier(Settings(MQTT_INSIGHT_TOPIC_LAYOUT="level"))
+    client = RecordingClient()
+    notifier._on_connect(client, None, {}, 0)
+    assert client.subscriptions == [("siapsuhu/insight/warn/+", 1), ("siapsuhu/insight/alert/+", 1), ("siapsuhu/latest/+", 1)]
+
+
+def test_topic_list_is_configurable():
+    settings = Settings(NOTIFIER_INSIGHT_TOPICS="siapsuhu/insight/alert/+")
+    assert settings.mqtt_topics == ["siapsuhu/insight/alert/+"]
+    assert Settings().mqtt_topics == ["siapsuhu/insight/#"]  # flat layout, as before the level layout existed
+    assert Settings(MQTT_INSIGHT_TOPIC="siapsuhu/insight/+").mqtt_topics == ["siapsuhu/insight/+"]
+    level = Settings(MQTT_INSIGHT_TOPIC="site/insight", MQTT_INSIGHT_TOPIC_LAYOUT="level")  # the engine's prefix
+    assert level.mqtt_topics == ["site/insight/warn/+", "site/insight/alert/+"]